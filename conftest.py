@@ -4,6 +4,10 @@ import pytest
 from selenium import webdriver
 import os
 import allure
+from libs.common.cassette import Cassette
+from libs.common.metrics import HttpMetrics
+from libs.common.token_cache import TokenCache
+from libs.common.transport import HttpTransport
 from libs.utils.misc import Misc
 
 
@@ -35,6 +39,44 @@ def init_method():
     print('Finish test case')
     driver.quit()
 
+
+@pytest.fixture(scope='session', autouse=True)
+def http_timing_summary():
+    """
+    Export the per endpoint HTTP phase latencies of the session, and attach them to the allure report
+    """
+    yield
+    summary = HttpMetrics.export()
+    if summary is not None:
+        allure.attach(summary, "HTTP timing summary", allure.attachment_type.JSON)
+
+
+def pytest_sessionstart(session):
+    """
+    Drop the tokens cached by the previous runs and the worker metrics left by an interrupted session,
+    the controller does it before the xdist workers start
+    """
+    if os.environ.get("PYTEST_XDIST_WORKER") is None:
+        for part in HttpMetrics.worker_parts():
+            os.remove(part)
+        cache = TokenCache.get_instance()
+        if cache is not None:
+            cache.clear()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """
+    Close the shared HTTP connection pools and the recording cassette of this process (controller or xdist worker),
+    the controller merges the cassettes recorded and the HTTP timings exported by the workers, they finish their
+    sessions before it
+    """
+    HttpTransport.shutdown()
+    Cassette.shutdown()
+    if os.environ.get("PYTEST_XDIST_WORKER") is None:
+        Cassette.merge_workers()
+        HttpMetrics.merge_workers()
+
+
 @pytest.hookimpl(hookwrapper=True, tryfirst=True)
 def pytest_runtest_makereport(item, call):
     """
@@ -75,11 +117,13 @@ def pytest_runtest_makereport(item, call):
                 extra = ""
             f.write(report.nodeid + extra + "\n")
 
-        # Add a screenshot of allure Report
+        # Add a screenshot of allure Report, the API tests have no driver
         if "init_method" in item.funcargs:
             current_driver = item.funcargs['init_method'][0]
-        else:
+        elif "init" in item.funcargs:
             current_driver = item.funcargs['init'][0]
+        else:
+            current_driver = None
         if hasattr(current_driver, "get_screenshot_as_png"):
             with allure.step('Add failed screenshot...'):
                 try:
@@ -0,0 +1,225 @@
+import asyncio
+import datetime
+import io
+import ssl
+import time
+import weakref
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from libs.common.metrics import HttpMetrics, RequestTiming
+from libs.common.transport import HttpTransport
+from libs.utils.misc import Misc
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only needed by the async mode
+    aiohttp = None
+
+
+class AsyncLimiter:
+    """
+    Bound the number of requests in flight on an event loop, e.g.
+
+        limiter = AsyncLimiter(200)
+        await asyncio.gather(*[req.send_async(limiter=limiter) for req in requests])
+
+    The semaphore is created lazily on the running loop, so one limiter can be declared at module level.
+    """
+
+    def __init__(self, max_in_flight=100):
+        """
+        :param max_in_flight: the max number of requests which are sent at the same time
+        """
+        self.max_in_flight = max_in_flight
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def __aenter__(self):
+        await self._semaphore().acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore().release()
+
+
+class AsyncHttpTransport:
+    """
+    The asyncio counterpart of HttpTransport, one aiohttp.ClientSession is kept per event loop so the
+    connections are reused by all the ApiRequest.send_async calls on that loop.
+    It shares the [transport] section of config.cfg: pool_maxsize is the connection limit per host and
+    keep_alive is the idle timeout of the kept-alive connections.
+    Call "await AsyncHttpTransport.close()" before the loop is closed, e.g. in the teardown of an async fixture.
+    """
+
+    _sessions = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def session(cls):
+        """
+        get the session of the running event loop, create it if missing
+        :return: aiohttp.ClientSession
+        """
+        if aiohttp is None:
+            raise ImportError("aiohttp is required by the async mode, please install it: pip install aiohttp")
+        loop = asyncio.get_running_loop()
+        session = cls._sessions.get(loop)
+        if session is None or session.closed:
+            config = Misc.load_config_section("transport", HttpTransport.DEFAULTS)
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=config["pool_maxsize"],
+                                             keepalive_timeout=config["keep_alive"])
+            # don't keep cookies between the requests, the same as the sync transport
+            session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                            trace_configs=[cls._trace_config()])
+            cls._sessions[loop] = session
+        return session
+
+    @classmethod
+    async def close(cls):
+        """
+        close the session of the running event loop
+        :return:
+        """
+        session = cls._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    @classmethod
+    async def request(cls, method, url, params=None, data=None, files=None, json=None, headers=None, verify=True,
+                      timeout=None, proxies=None, allow_redirects=True, use_cache=None):
+        """
+        send the request on the running event loop, the arguments are the same as requests.request,
+        use_cache is the same as HttpTransport.request
+        :return: requests.Response, so that it can be wrapped by ApiResponse as the sync one
+        """
+        kwargs = {
+            "params": cls._params(params),
+            "headers": headers,
+            "allow_redirects": allow_redirects,
+            "timeout": cls._timeout(timeout),
+        }
+        if verify is not True:
+            kwargs["ssl"] = cls._ssl(verify)
+        opened = []
+        if files:
+            kwargs["data"] = cls._form(data, files, opened)
+        elif json is not None:
+            kwargs["data"], headers = HttpTransport.encode_json(json, headers)
+            kwargs["headers"] = headers
+        elif data is not None:
+            kwargs["data"] = data
+        if proxies:
+            kwargs["proxy"] = proxies.get(url.split(":", 1)[0])
+
+        cache = HttpTransport.get_instance().cache
+        key = None
+        if cache is not None:
+            key, kwargs["headers"] = cache.prepare(method, url, params, headers, use_cache=use_cache)
+
+        timing = RequestTiming()
+        start = datetime.datetime.now()
+        try:
+            async with cls.session().request(method.upper(), url, trace_request_ctx=timing, **kwargs) as resp:
+                body = await resp.read()
+                response = cls._to_response(resp, body, datetime.datetime.now() - start)
+        except Exception as e:
+            HttpMetrics.record(method, url, timing.finish(), error=e)
+            raise
+        finally:
+            for file in opened:
+                file.close()
+        response.timing = timing.finish()
+        HttpMetrics.record(method, url, timing, status=response.status_code)
+        return response if cache is None else cache.resolve(key, response)
+
+    @staticmethod
+    def _trace_config():
+        """
+        add the phases of the request to the RequestTiming given as trace_request_ctx,
+        aiohttp does not separate the tls handshake, it is counted in connect
+        """
+        trace_config = aiohttp.TraceConfig()
+
+        async def dns_start(session, context, params):
+            context.dns_start = time.perf_counter()
+
+        async def dns_end(session, context, params):
+            context.trace_request_ctx.dns += (time.perf_counter() - context.dns_start) * 1000
+
+        async def connection_start(session, context, params):
+            context.connection_start = time.perf_counter()
+            context.dns_before = context.trace_request_ctx.dns
+
+        async def connection_end(session, context, params):
+            timing = context.trace_request_ctx
+            timing.connect += (time.perf_counter() - context.connection_start) * 1000 - \
+                (timing.dns - context.dns_before)
+
+        async def request_end(session, context, params):
+            context.trace_request_ctx.headers_received()
+
+        trace_config.on_dns_resolvehost_start.append(dns_start)
+        trace_config.on_dns_resolvehost_end.append(dns_end)
+        trace_config.on_connection_create_start.append(connection_start)
+        trace_config.on_connection_create_end.append(connection_end)
+        trace_config.on_request_end.append(request_end)
+        return trace_config
+
+    @staticmethod
+    def _timeout(timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=timeout)
+
+    @staticmethod
+    def _params(params):
+        if not params:
+            return None
+        pairs = []
+        for key, value in params.items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            pairs.extend((key, str(v)) for v in values)
+        return pairs
+
+    @staticmethod
+    def _ssl(verify):
+        if isinstance(verify, str):
+            return ssl.create_default_context(cafile=verify)
+        return False if not verify else None
+
+    @staticmethod
+    def _form(data, files, opened):
+        """
+        aiohttp reads the opened files in chunks while sending, they are closed after the request
+        """
+        form = aiohttp.FormData()
+        if isinstance(data, dict):
+            for key, value in data.items():
+                form.add_field(key, str(value))
+        for upload in files:
+            file = open(upload.path, "rb")
+            opened.append(file)
+            form.add_field(upload.field, file, filename=upload.file_name, content_type=upload.content_type)
+        return form
+
+    @staticmethod
+    def _to_response(resp, body, elapsed):
+        response = Response()
+        response.status_code = resp.status
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.url = str(resp.url)
+        response.reason = resp.reason
+        response._content = body
+        response._content_consumed = True
+        response.raw = io.BytesIO(body)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.elapsed = elapsed
+        return response
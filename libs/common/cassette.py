@@ -0,0 +1,378 @@
+import atexit
+import base64
+import codecs
+import datetime
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import stream_decode_response_unicode
+from libs.common.log import logger
+from libs.common.multipart import MultipartEncoder
+from libs.utils.misc import Misc
+
+
+class CassetteMode:
+    # no cassette, all the requests go to the server
+    Off = "off"
+    # all the requests go to the server, and the responses are recorded, the old cassette is replaced
+    Record = "record"
+    # all the requests are served from the cassette, a request which is not recorded is an error
+    Replay = "replay"
+    # the recorded requests are replayed, the new ones go to the server and are appended to the cassette
+    NewEpisodes = "new_episodes"
+
+
+class Cassette:
+    """
+    Record/replay of the HTTP exchanges at the ApiRequest.send boundary, so the API suites can run offline.
+    The cassette is a JSON lines file (gzip compressed if the path ends with .gz), one exchange per line,
+    it is loaded once into a dict index keyed by the method, url, sorted params and body hash,
+    so every replay lookup is O(1).
+    A key can be recorded several times, e.g. the 304 polling, then the responses are replayed in order
+    and the last one is repeated.
+    The mode and the path are configured in the [cassette] section of config.cfg, or switched by Cassette.use().
+    Under pytest-xdist every worker records into its own part file next to the cassette,
+    e.g. api.jsonl.gw0.record.part.gz, and the controller merges the parts into the cassette at the end of the
+    session by merge_workers(), a cassette switched by use() in the workers is merged by merge_workers(path).
+    The body of a streamed response (ApiRequest.stream) is recorded while the caller reads it, the chunks are
+    spooled to a temporary file and written to the cassette piece by piece when the body is fully read, a body
+    which is not read to the end is not recorded. In the new_episodes mode the recorded bodies are also kept in
+    memory to be replayed.
+    """
+
+    DEFAULTS = {
+        "mode": CassetteMode.Off,
+        # relative to the root directory of the project
+        "path": "resources/cassettes/api.jsonl.gz",
+    }
+
+    # bytes, the streamed body which is being recorded is kept in memory up to this size, then in a temporary file
+    SPOOL_SIZE = 1024 * 1024
+    # bytes, the size of the pieces in which a body is written to the cassette
+    BLOCK_SIZE = 64 * 1024
+
+    _instance = None
+    _configured = False
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path, mode=CassetteMode.Replay):
+        """
+        :param path: the cassette file path
+        :param mode: one of CassetteMode except Off
+        """
+        self.path = path
+        self.mode = mode
+        # the xdist worker id, the worker records into its own part file which is merged at the end of the session
+        self.worker = os.environ.get("PYTEST_XDIST_WORKER")
+        self.record_path = self.part_path(path, self.worker, mode) if self.worker else path
+        self._lock = threading.Lock()
+        # key -> list of the recorded exchanges
+        self._index = {}
+        # key -> the position of the next exchange to replay
+        self._cursors = {}
+        self._writer = None
+        if mode == CassetteMode.Record:
+            self._truncate(self.record_path)
+        else:
+            self._load()
+            if self.worker and mode == CassetteMode.NewEpisodes:
+                self._truncate(self.record_path)
+
+    @classmethod
+    def get_instance(cls):
+        """
+        :return: the cassette configured in config.cfg, or None if the cassette mode is off
+        """
+        with cls._instance_lock:
+            if not cls._configured:
+                config = Misc.load_config_section("cassette", cls.DEFAULTS)
+                cls._instance = cls._create(os.path.join(Misc.get_root_directory(), config["path"]),
+                                            config["mode"])
+                cls._configured = True
+            return cls._instance
+
+    @classmethod
+    def use(cls, path, mode=CassetteMode.Replay):
+        """
+        switch the cassette of the process, e.g. in a session fixture
+        :param path: the cassette file path
+        :param mode: one of CassetteMode, Off to stop using the cassette
+        :return: the cassette, or None if mode is Off
+        """
+        with cls._instance_lock:
+            if cls._instance is not None:
+                cls._instance.close()
+            cls._instance = cls._create(path, mode)
+            cls._configured = True
+            return cls._instance
+
+    @classmethod
+    def shutdown(cls):
+        """
+        close the cassette of the process, it is called at the end of the pytest session
+        :return:
+        """
+        with cls._instance_lock:
+            if cls._instance is not None:
+                cls._instance.close()
+
+    @staticmethod
+    def part_path(path, worker, mode):
+        """
+        :return: the part file of an xdist worker, e.g. resources/cassettes/api.jsonl.gw0.record.part.gz
+        """
+        suffix = ".gz" if path.endswith(".gz") else ""
+        return path[:len(path) - len(suffix)] + "." + worker + "." + mode + ".part" + suffix
+
+    @classmethod
+    def merge_workers(cls, path=None):
+        """
+        merge the part files recorded by the xdist workers into the cassette, it is called by the controller at the
+        end of the pytest session. The cassette is replaced if the parts are recorded in the record mode, otherwise
+        they are appended to it
+        :param path: (optional) the cassette file path, default is the one configured in config.cfg
+        """
+        if path is None:
+            config = Misc.load_config_section("cassette", cls.DEFAULTS)
+            path = os.path.join(Misc.get_root_directory(), config["path"])
+        suffix = ".gz" if path.endswith(".gz") else ""
+        parts = sorted(glob.glob(glob.escape(path[:len(path) - len(suffix)]) + ".*.part" + suffix))
+        if not parts:
+            return
+        replace = any(part.endswith("." + CassetteMode.Record + ".part" + suffix) for part in parts)
+        with cls._open_file(path, "wt" if replace else "at") as target:
+            for part in parts:
+                with cls._open_file(part, "rt") as source:
+                    shutil.copyfileobj(source, target)
+        for part in parts:
+            os.remove(part)
+        logger.info("=== cassette merged: " + path + ", " + str(len(parts)) + " worker parts")
+
+    def close(self):
+        """
+        close the cassette file which is being recorded
+        :return:
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    @classmethod
+    def _create(cls, path, mode):
+        mode = str(mode).lower()
+        if mode == CassetteMode.Off:
+            return None
+        if mode not in (CassetteMode.Record, CassetteMode.Replay, CassetteMode.NewEpisodes):
+            raise ValueError("Invalid cassette mode: " + mode)
+        return cls(path, mode)
+
+    @staticmethod
+    def make_key(method, url, params=None, data=None, json_body=None, files=None):
+        """
+        build the lookup key of a request
+        :return: the sha1 hex digest of the method, url, sorted params and body hash
+        """
+        body = hashlib.sha1()
+        if isinstance(data, MultipartEncoder):
+            data = data.key()
+        if data is not None:
+            if isinstance(data, dict):
+                data = json.dumps(data, sort_keys=True, default=str)
+            body.update(data if isinstance(data, bytes) else str(data).encode("utf-8"))
+        if json_body is not None:
+            body.update(json.dumps(json_body, sort_keys=True, default=str).encode("utf-8"))
+        for upload in files or []:
+            body.update(repr(upload).encode("utf-8"))
+        params = sorted((str(key), str(value)) for key, value in (params or {}).items())
+        key = "\n".join([method.upper(), url, json.dumps(params), body.hexdigest()])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def request(self, transport, method, url, **kwargs):
+        """
+        serve the request from the cassette, or send it through the transport and record it,
+        the arguments are the same as HttpTransport.request
+        :param transport: the transport which sends the request to the server
+        :return: requests.Response
+        """
+        key = self._key(method, url, kwargs)
+        response = self._replay(key, method, url)
+        if response is not None:
+            return response
+        response = transport.request(method, url, **kwargs)
+        if kwargs.get("stream"):
+            self._record_stream(key, method, url, response)
+        else:
+            self._record(key, method, url, response)
+        return response
+
+    async def request_async(self, transport, method, url, **kwargs):
+        """
+        the asyncio counterpart of request, the transport is AsyncHttpTransport
+        :return: requests.Response
+        """
+        key = self._key(method, url, kwargs)
+        response = self._replay(key, method, url)
+        if response is not None:
+            return response
+        response = await transport.request(method, url, **kwargs)
+        self._record(key, method, url, response)
+        return response
+
+    def _key(self, method, url, kwargs):
+        return self.make_key(method, url, kwargs.get("params"), kwargs.get("data"), kwargs.get("json"),
+                             kwargs.get("files"))
+
+    def _replay(self, key, method, url):
+        if self.mode == CassetteMode.Record:
+            return None
+        with self._lock:
+            exchanges = self._index.get(key)
+            position = self._cursors.get(key, 0)
+            if exchanges is None or (position >= len(exchanges) and self.mode == CassetteMode.NewEpisodes):
+                if self.mode == CassetteMode.Replay:
+                    raise LookupError("No recorded response in the cassette " + self.path + " for the request: " +
+                                      method.upper() + " " + url)
+                return None
+            self._cursors[key] = position + 1
+            exchange = exchanges[min(position, len(exchanges) - 1)]
+        return self._to_response(exchange)
+
+    def _record_stream(self, key, method, url, response):
+        """
+        record the streamed response when its body is fully read, the chunks go to the caller as they arrive
+        """
+        iter_content = response.iter_content
+
+        def recording(chunk_size=1, decode_unicode=False):
+            chunks = self._spool(key, method, url, response, iter_content(chunk_size=chunk_size))
+            return stream_decode_response_unicode(chunks, response) if decode_unicode else chunks
+        # response.content and ApiStreamResponse.iter_chunks both read the body by iter_content
+        response.iter_content = recording
+
+    def _spool(self, key, method, url, response, chunks):
+        with tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE) as body:
+            for chunk in chunks:
+                body.write(chunk)
+                yield chunk
+            body.seek(0)
+            self._record(key, method, url, response, body)
+
+    def _record(self, key, method, url, response, body=None):
+        """
+        :param body: (optional) the file of the body, default is the content of the response
+        """
+        if body is None:
+            body = io.BytesIO(response.content)
+        is_base64 = not self._is_utf8(body)
+        exchange = {
+            "key": key,
+            "request": method.upper() + " " + url,
+            "status": response.status_code,
+            "url": response.url,
+            "reason": response.reason,
+            "encoding": response.encoding,
+            "headers": dict(response.headers),
+            "elapsed": response.elapsed.total_seconds(),
+            "base64": is_base64,
+        }
+        # the body is the last field, it is written piece by piece
+        head = json.dumps(exchange, ensure_ascii=False, separators=(",", ":"))[:-1] + ',"body":"'
+        with self._lock:
+            if self.mode != CassetteMode.Record:
+                body.seek(0)
+                content = body.read()
+                exchange["body"] = base64.b64encode(content).decode("ascii") if is_base64 else content.decode("utf-8")
+                exchanges = self._index.setdefault(key, [])
+                exchanges.append(exchange)
+                # the recorded one counts as replayed, so new_episodes continues after it
+                self._cursors[key] = len(exchanges)
+            if self._writer is None:
+                self._writer = self._open_file(self.record_path, "at")
+            self._writer.write(head)
+            for piece in self._body_pieces(body, is_base64):
+                self._writer.write(piece)
+            self._writer.write('"}\n')
+            self._writer.flush()
+
+    def _is_utf8(self, body):
+        body.seek(0)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for block in iter(lambda: body.read(self.BLOCK_SIZE), b""):
+                decoder.decode(block)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def _body_pieces(self, body, is_base64):
+        """
+        :return: generator of the json escaped pieces of the body string
+        """
+        body.seek(0)
+        if is_base64:
+            # a multiple of 3 bytes is encoded without padding, so the pieces can be joined
+            for block in iter(lambda: body.read(self.BLOCK_SIZE * 3), b""):
+                yield base64.b64encode(block).decode("ascii")
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for block in iter(lambda: body.read(self.BLOCK_SIZE), b""):
+            yield json.dumps(decoder.decode(block), ensure_ascii=False)[1:-1]
+        yield json.dumps(decoder.decode(b"", final=True), ensure_ascii=False)[1:-1]
+
+    @staticmethod
+    def _to_response(exchange):
+        response = Response()
+        response.status_code = exchange["status"]
+        response.url = exchange["url"]
+        response.reason = exchange["reason"]
+        response.encoding = exchange["encoding"]
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        response.elapsed = datetime.timedelta(seconds=exchange["elapsed"])
+        body = exchange["body"]
+        response._content = base64.b64decode(body) if exchange["base64"] else body.encode("utf-8")
+        response._content_consumed = True
+        response.raw = io.BytesIO(response._content)
+        return response
+
+    @staticmethod
+    def _open_file(path, mode):
+        if "r" not in mode:
+            folder = os.path.dirname(path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+        if path.endswith(".gz"):
+            return gzip.open(path, mode, encoding="utf-8")
+        return open(path, mode, encoding="utf-8")
+
+    def _truncate(self, path):
+        with self._open_file(path, "wt"):
+            pass
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            if self.mode == CassetteMode.NewEpisodes:
+                # the new exchanges are appended to the record path, the file is created by the first one
+                return
+            raise FileNotFoundError("The cassette is not found: " + self.path)
+        count = 0
+        with self._open_file(self.path, "rt") as f:
+            for line in f:
+                if line.strip() == "":
+                    continue
+                exchange = json.loads(line)
+                self._index.setdefault(exchange["key"], []).append(exchange)
+                count += 1
+        logger.info("=== cassette loaded: " + self.path + ", " + str(count) + " exchanges, mode: " + self.mode)
+
+
+atexit.register(Cassette.shutdown)
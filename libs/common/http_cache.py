@@ -0,0 +1,169 @@
+import io
+import threading
+from collections import OrderedDict
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from libs.utils.misc import Misc
+
+
+class ConditionalCache:
+    """
+    HTTP conditional cache of the GET responses, used by HttpTransport and AsyncHttpTransport.
+    The bodies which come with an ETag or Last-Modified validator are kept, the next GET of the same url, params
+    and headers sends If-None-Match/If-Modified-Since, and a 304 from the server is answered with the cached body,
+    so an unchanged resource costs neither bandwidth nor parse time.
+    It is off by default, so the assertions see what the server returns, a request turns it on by
+    ApiRequest.set_cache, or all the GET requests use it if it is enabled in config.cfg.
+    The cache is an LRU with a cap on the number of entries and on the total body size, it can be configured
+    in the [http_cache] section of config.cfg.
+    """
+
+    DEFAULTS = {
+        # if False, only the requests which call ApiRequest.set_cache use the cache
+        "enabled": False,
+        "max_entries": 256,
+        # bytes, the total size of the cached bodies
+        "max_size": 32 * 1024 * 1024,
+    }
+
+    def __init__(self, max_entries=256, max_size=32 * 1024 * 1024, enabled=True):
+        """
+        :param max_entries: the max number of cached responses
+        :param max_size: the max total size in bytes of the cached bodies
+        :param enabled: if False, only the requests which ask for the cache use it
+        """
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @classmethod
+    def from_config(cls):
+        """
+        :return: the cache configured in config.cfg
+        """
+        config = Misc.load_config_section("http_cache", cls.DEFAULTS)
+        return cls(max_entries=config["max_entries"], max_size=config["max_size"], enabled=config["enabled"])
+
+    @staticmethod
+    def make_key(url, params=None, headers=None):
+        """
+        the responses are cached per url, params and request headers, so the tokens of different users
+        never share an entry
+        """
+        return (url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())),
+                tuple(sorted((str(k).lower(), str(v)) for k, v in (headers or {}).items())))
+
+    def prepare(self, method, url, params=None, headers=None, stream=False, use_cache=None):
+        """
+        check whether the request can use the cache, and add the validators of the cached response
+        :param use_cache: True or False to turn the cache on or off for the request, None means the enabled option
+        :return: (the cache key or None, the headers to send)
+        """
+        if not (self.enabled if use_cache is None else use_cache):
+            return None, headers
+        if method.upper() != "GET" or stream:
+            return None, headers
+        headers = headers or {}
+        lower_keys = {str(key).lower() for key in headers}
+        if "if-none-match" in lower_keys or "if-modified-since" in lower_keys:
+            # the caller checks the conditional request itself
+            return None, headers
+        key = self.make_key(url, params, headers)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return key, headers
+        headers = dict(headers)
+        if entry["headers"].get("ETag") is not None:
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified") is not None:
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return key, headers
+
+    def resolve(self, key, response):
+        """
+        store the new response, or answer the 304 with the cached one
+        :param key: the key from prepare, None if the request does not use the cache
+        :param response: the requests.Response from the server
+        :return: the response to return to the caller
+        """
+        if key is None:
+            return response
+        if response.status_code == 304:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                    return response
+                self._entries.move_to_end(key)
+                entry["headers"].update(response.headers)
+                self.hits += 1
+            return self._to_response(entry, response)
+
+        with self._lock:
+            self.misses += 1
+        if response.status_code != 200 or "no-store" in response.headers.get("Cache-Control", ""):
+            self._discard(key)
+            return response
+        if response.headers.get("ETag") is None and response.headers.get("Last-Modified") is None:
+            self._discard(key)
+            return response
+
+        content = response.content
+        if len(content) > self.max_size:
+            self._discard(key)
+            return response
+        entry = {
+            "status": response.status_code,
+            "reason": response.reason,
+            "encoding": response.encoding,
+            "headers": CaseInsensitiveDict(response.headers),
+            "content": content,
+        }
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = entry
+            self.size += len(content)
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                self._pop(next(iter(self._entries)))
+        return response
+
+    def clear(self):
+        """
+        drop all the cached responses
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _discard(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry["content"])
+
+    @staticmethod
+    def _to_response(entry, not_modified):
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.encoding = entry["encoding"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.url = not_modified.url
+        response.elapsed = not_modified.elapsed
+        response.request = not_modified.request
+        response._content = entry["content"]
+        response._content_consumed = True
+        response.raw = io.BytesIO(entry["content"])
+        response.from_cache = True
+        response.timing = getattr(not_modified, "timing", None)
+        return response
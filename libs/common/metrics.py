@@ -0,0 +1,341 @@
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from libs.utils.misc import Misc
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram: the values are kept in log-linear buckets (32 linear buckets per power of two,
+    in microseconds), so the memory is constant, the relative error of a percentile is below 3%,
+    and two histograms can be merged, e.g. the ones of the xdist workers.
+    """
+
+    SUB_BUCKETS = 32
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, milliseconds, count=1):
+        """
+        :param milliseconds: the latency value
+        :param count: how many times the value is recorded
+        :return:
+        """
+        index = self._index(int(max(milliseconds, 0) * 1000))
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += milliseconds * count
+        self.min = milliseconds if self.min is None else min(self.min, milliseconds)
+        self.max = milliseconds if self.max is None else max(self.max, milliseconds)
+
+    def merge(self, other):
+        """
+        add the values of another histogram
+        :param other: LatencyHistogram
+        :return: the histogram itself
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count > 0:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def to_dict(self):
+        """
+        :return: the buckets and the totals as json types, to merge the histogram in another process
+        """
+        return {"counts": {str(index): count for index, count in self.counts.items()}, "count": self.count,
+                "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: the dict of to_dict
+        :return: LatencyHistogram
+        """
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+    def percentile(self, percent):
+        """
+        :param percent: e.g. 95 for p95
+        :return: the latency in milliseconds, None if nothing is recorded
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._value(index) / 1000.0, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        :return: dict of count, mean, min, max, p50, p95 and p99 in milliseconds
+        """
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3),
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+            "p50": round(self.percentile(50), 3),
+            "p95": round(self.percentile(95), 3),
+            "p99": round(self.percentile(99), 3),
+        }
+
+    @classmethod
+    def _index(cls, value):
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKETS.bit_length()
+        return shift * cls.SUB_BUCKETS + (value >> shift)
+
+    @classmethod
+    def _value(cls, index):
+        """
+        the middle value of the bucket
+        """
+        if index < cls.SUB_BUCKETS * 2:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        mantissa = index - shift * cls.SUB_BUCKETS
+        return (mantissa << shift) + (1 << shift) // 2
+
+
+class RequestTiming:
+    """
+    The phase durations of one request in milliseconds: dns, connect (TCP), tls, ttfb (from sending the request
+    to the first byte of the response, without dns/connect/tls), download and total.
+    dns, connect and tls are 0 when a kept-alive connection is reused.
+    The transport starts a timing per request, the connection classes add their phases to the timing
+    of the current thread.
+    """
+
+    PHASES = ("dns", "connect", "tls", "ttfb", "download", "total")
+
+    _local = threading.local()
+
+    def __init__(self):
+        self.dns = 0.0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.ttfb = 0.0
+        self.download = 0.0
+        self.total = 0.0
+        self._start = time.perf_counter()
+        self._first_byte = None
+
+    @classmethod
+    def begin(cls):
+        """
+        start the timing of a request on the current thread
+        :return: RequestTiming
+        """
+        cls._local.current = cls()
+        return cls._local.current
+
+    @classmethod
+    def current(cls):
+        """
+        :return: the timing of the request which is being sent by the current thread, None if there is no one
+        """
+        return getattr(cls._local, "current", None)
+
+    @classmethod
+    def end(cls):
+        cls._local.current = None
+
+    def headers_received(self):
+        """
+        mark the time when the response headers are received
+        :return:
+        """
+        self._first_byte = time.perf_counter()
+
+    def finish(self):
+        """
+        calculate ttfb, download and total after the body is read (or not read, in streaming mode)
+        :return: the timing itself
+        """
+        now = time.perf_counter()
+        first_byte = self._first_byte or now
+        self.total = (now - self._start) * 1000
+        self.ttfb = max((first_byte - self._start) * 1000 - self.dns - self.connect - self.tls, 0.0)
+        self.download = (now - first_byte) * 1000
+        return self
+
+    def as_dict(self):
+        return {phase: round(getattr(self, phase), 3) for phase in self.PHASES}
+
+
+class HttpMetrics:
+    """
+    In-process latency histograms of every phase, per method and templated path,
+    e.g. "GET pxp/iot/Device/findDeviceData.json". The numeric and uuid path segments are replaced with {id}.
+    The summary is exported to results/metrics/http_timing.json at the end of the pytest session and attached to
+    the allure report, so the endpoints which got slower between builds can be found. Under xdist each worker
+    exports the buckets of its histograms, and the controller merges them into the summary of the session.
+    """
+
+    _lock = threading.Lock()
+    # endpoint -> phase -> LatencyHistogram
+    _histograms = {}
+    _listeners = []
+
+    ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12})$")
+
+    @classmethod
+    def endpoint(cls, method, url):
+        """
+        :return: the method and the templated path of the url, e.g. "GET pxp/iot/Device/findDeviceData.json"
+        """
+        segments = urlsplit(url).path.strip("/").split("/")
+        path = "/".join("{id}" if cls.ID_SEGMENT.match(segment) else segment for segment in segments)
+        return method.upper() + " " + path
+
+    @classmethod
+    def add_listener(cls, listener):
+        """
+        listen to every recorded request, e.g. the load runner collects its own statistics by it
+        :param listener: callable(endpoint, timing, status, error), it is called on the thread which sends the request
+        :return:
+        """
+        with cls._lock:
+            cls._listeners = cls._listeners + [listener]
+
+    @classmethod
+    def remove_listener(cls, listener):
+        with cls._lock:
+            cls._listeners = [item for item in cls._listeners if item is not listener]
+
+    @classmethod
+    def record(cls, method, url, timing, status=None, error=None):
+        """
+        add the timing of a request to the histograms, the failed requests without response are only
+        passed to the listeners
+        :param method: the request method
+        :param url: the request url
+        :param timing: RequestTiming
+        :param status: the response status
+        :param error: the exception if the request is failed without response
+        :return:
+        """
+        endpoint = cls.endpoint(method, url)
+        for listener in cls._listeners:
+            listener(endpoint, timing, status, error)
+        if error is not None:
+            return
+        with cls._lock:
+            histograms = cls._histograms.get(endpoint)
+            if histograms is None:
+                histograms = {phase: LatencyHistogram() for phase in RequestTiming.PHASES}
+                cls._histograms[endpoint] = histograms
+            for phase in RequestTiming.PHASES:
+                histograms[phase].record(getattr(timing, phase))
+
+    @classmethod
+    def summary(cls):
+        """
+        :return: dict of endpoint -> phase -> {count, mean, min, max, p50, p95, p99}
+        """
+        with cls._lock:
+            return cls._summary(cls._histograms)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._histograms = {}
+
+    @classmethod
+    def export(cls, file_name=None):
+        """
+        write the summary to results/metrics as json, an xdist worker writes the buckets of its histograms to
+        http_timing_<worker>.part.json instead, they are merged by merge_workers
+        :param file_name: (optional) the file name of the summary, default is http_timing.json
+        :return: the summary of this process as json string, None if nothing is recorded
+        """
+        with cls._lock:
+            summary = cls._summary(cls._histograms)
+            parts = {endpoint: {phase: histogram.to_dict() for phase, histogram in histograms.items()}
+                     for endpoint, histograms in cls._histograms.items()}
+        if not summary:
+            return None
+        worker = os.environ.get("PYTEST_XDIST_WORKER")
+        content = json.dumps(summary, indent=4)
+        if worker and file_name is None:
+            cls._write("http_timing_" + worker + ".part.json", json.dumps(parts))
+        else:
+            cls._write(file_name or "http_timing.json", content)
+        return content
+
+    @classmethod
+    def merge_workers(cls, file_name="http_timing.json"):
+        """
+        merge the histograms exported by the xdist workers with the ones of this process into the summary of the
+        session, it is called by the controller at the end of the pytest session
+        :param file_name: (optional) the file name of the summary
+        :return: the summary as json string, None if no worker exported its histograms
+        """
+        parts = cls.worker_parts()
+        if not parts:
+            return None
+        with cls._lock:
+            merged = {endpoint: {phase: LatencyHistogram().merge(histogram) for phase, histogram in histograms.items()}
+                      for endpoint, histograms in cls._histograms.items()}
+        for part in parts:
+            with open(part, encoding="utf-8") as f:
+                for endpoint, histograms in json.load(f).items():
+                    target = merged.setdefault(endpoint, {phase: LatencyHistogram() for phase in RequestTiming.PHASES})
+                    for phase, data in histograms.items():
+                        target[phase].merge(LatencyHistogram.from_dict(data))
+            os.remove(part)
+        content = json.dumps(cls._summary(merged), indent=4)
+        cls._write(file_name, content)
+        return content
+
+    @classmethod
+    def worker_parts(cls):
+        """
+        :return: the paths of the histograms exported by the xdist workers, the controller removes the ones left
+            by an interrupted session before the workers start
+        """
+        return sorted(glob.glob(os.path.join(cls._folder(), "http_timing_*.part.json")))
+
+    @staticmethod
+    def _summary(histograms):
+        return {endpoint: {phase: histogram.summary() for phase, histogram in phases.items()}
+                for endpoint, phases in sorted(histograms.items())}
+
+    @staticmethod
+    def _folder():
+        return os.path.join(Misc.get_root_directory(), "results", "metrics")
+
+    @classmethod
+    def _write(cls, file_name, content):
+        folder = cls._folder()
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, file_name), "w", encoding="utf-8") as f:
+            f.write(content)
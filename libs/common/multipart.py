@@ -0,0 +1,144 @@
+import mimetypes
+import os
+import uuid
+
+
+class UploadFile:
+    """
+    A file to upload in the multipart body, it is only a description, the file is opened when its content
+    is read and closed as soon as it is fully read
+    """
+
+    def __init__(self, field, path, content_type=None, file_name=None):
+        """
+        :param field: the form field name
+        :param path: the file path
+        :param content_type: (optional) the content type of the part, guessed from the file name by default
+        :param file_name: (optional) the file name sent to the server, default is the base name of the path
+        """
+        self.field = field
+        self.path = path
+        self.file_name = file_name or os.path.basename(path)
+        self.content_type = content_type or mimetypes.guess_type(self.file_name)[0] or "application/octet-stream"
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def __repr__(self):
+        return "(" + self.field + ", " + self.path + ", " + self.content_type + ")"
+
+
+class MultipartEncoder:
+    """
+    Streaming multipart/form-data body. It is a file-like object with a known length, so requests sends it with
+    Content-Length and reads it block by block: the files are read in chunks while sending, the memory stays
+    constant whatever the file sizes are. Each file is closed as soon as it is read to the end, and close()
+    releases the current one if the sending is interrupted.
+    """
+
+    def __init__(self, fields=None, files=None, boundary=None):
+        """
+        :param fields: (optional) dict of the form fields
+        :param files: list of UploadFile
+        :param boundary: (optional) the multipart boundary, a random one by default
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.fields = dict(fields or {})
+        self.files = list(files or [])
+        # the parts are either bytes or UploadFile
+        self._parts = []
+        for key, value in self.fields.items():
+            self._parts.append(self._part_header(key) + str(value).encode("utf-8") + b"\r\n")
+        for upload in self.files:
+            self._parts.append(self._part_header(upload.field, upload.file_name, upload.content_type))
+            self._parts.append(upload)
+            self._parts.append(b"\r\n")
+        self._parts.append(("--" + self.boundary + "--\r\n").encode("utf-8"))
+        self.len = sum(part.size if isinstance(part, UploadFile) else len(part) for part in self._parts)
+        self._index = 0
+        self._offset = 0
+        self._file = None
+
+    @property
+    def content_type(self):
+        """
+        :return: the Content-Type header of the body
+        """
+        return "multipart/form-data; boundary=" + self.boundary
+
+    def key(self):
+        """
+        :return: a stable description of the body, used by the cassette lookup
+        """
+        fields = sorted((str(key), str(value)) for key, value in self.fields.items())
+        return str(fields) + str([(upload.field, upload.file_name, upload.size) for upload in self.files])
+
+    def read(self, size=-1):
+        """
+        :param size: the max number of bytes to read, -1 means all the rest
+        :return: bytes, empty when the body is fully read
+        """
+        chunks = []
+        remaining = size if size is not None and size >= 0 else None
+        while self._index < len(self._parts) and (remaining is None or remaining > 0):
+            part = self._parts[self._index]
+            if isinstance(part, UploadFile):
+                if self._file is None:
+                    self._file = open(part.path, "rb")
+                chunk = self._file.read(-1 if remaining is None else remaining)
+                if not chunk:
+                    self._close_file()
+                    self._index += 1
+                    continue
+            else:
+                end = len(part) if remaining is None else self._offset + remaining
+                chunk = part[self._offset:end]
+                self._offset += len(chunk)
+                if self._offset >= len(part):
+                    self._index += 1
+                    self._offset = 0
+            chunks.append(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(64 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+    def rewind(self):
+        """
+        go back to the beginning, e.g. to send the body again by a retry
+        :return:
+        """
+        self._close_file()
+        self._index = 0
+        self._offset = 0
+
+    def close(self):
+        """
+        close the file which is being read
+        :return:
+        """
+        self._close_file()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _part_header(self, field, file_name=None, content_type=None):
+        header = "--" + self.boundary + "\r\n" + 'Content-Disposition: form-data; name="' + field + '"'
+        if file_name is not None:
+            header += '; filename="' + file_name + '"'
+        header += "\r\n"
+        if content_type is not None:
+            header += "Content-Type: " + content_type + "\r\n"
+        return (header + "\r\n").encode("utf-8")
@@ -1,15 +1,95 @@
-import json
-import requests
+import asyncio
+import itertools
+import logging
 from libs.common.log import logger
+from libs.common.multipart import MultipartEncoder, UploadFile
 from libs.common.content_type import ContentType
+from libs.common.async_transport import AsyncHttpTransport, AsyncLimiter
+from libs.common.cassette import Cassette
+from libs.common.retry import RetryPolicy
+from libs.common.transport import HttpTransport
+from libs.utils.json_codec import JsonCodec
+from libs.utils.json_compare import ExpectedSchema
+from libs.utils.json_index import PathIndex
 from libs.utils.json_utils import JsonUtils
+from libs.utils.misc import Misc
+from libs.utils.xml_compare import ExpectedXml
 import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION, ALL_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+_NOT_PARSED = object()
+
+
+class HttpLog:
+    """
+    The switches of the request/response logging, they can be configured in the [http_log] section of config.cfg.
+    The formatting work is skipped entirely when the level is disabled for the logger or the request is not sampled.
+    """
+
+    config = Misc.load_config_section("http_log", {
+        # the level of the request/response logs, e.g. set it to DEBUG to hide them in an INFO run
+        "level": "INFO",
+        # the max length of a logged body, the rest is cut, 0 means no limit
+        "max_body_size": 10000,
+        # log 1 in N successful requests, the failed ones (no response or status >= 400) are always logged
+        "sample_rate": 1,
+    })
+    level = logging.getLevelName(config["level"].upper())
+    _counter = itertools.count()
+
+    @classmethod
+    def is_enabled(cls):
+        """
+        :return: True if the logger will output the request/response logs
+        """
+        return logger.isEnabledFor(cls.level)
+
+    @classmethod
+    def is_logged(cls, status):
+        """
+        check whether a request/response should be logged
+        :param status: the response status, None if there is no response
+        :return: True if it should be logged
+        """
+        if not cls.is_enabled():
+            return False
+        if status is None or status >= 400:
+            return True
+        sample_rate = cls.config["sample_rate"]
+        return sample_rate <= 1 or next(cls._counter) % sample_rate == 0
+
+    @classmethod
+    def log(cls, message):
+        logger.log(cls.level, message, stacklevel=2)
+
+    @classmethod
+    def is_truncated(cls, text):
+        """
+        :param text: the body text
+        :return: True if the text is longer than max_body_size
+        """
+        return 0 < cls.config["max_body_size"] < len(text)
+
+    @classmethod
+    def truncate(cls, text):
+        """
+        cut the text to max_body_size
+        :param text: the body text
+        :return: the text itself or the cut text with a note of the full length
+        """
+        if not cls.is_truncated(text):
+            return text
+        return text[:cls.config["max_body_size"]] + " ... (truncated, " + str(len(text)) + " chars in total)"
 
 
 class ApiRequest:
 
+    # seconds, the read timeout and the connect timeout, they can be changed per request by set_timeout
     timeout = 300
+    connect_timeout = 10
 
     def __init__(self, url, method, body=None, json_body=None, verify=True):
         """
@@ -34,6 +114,11 @@ class ApiRequest:
         self.proxies = None
         self.url_params = []
         self.allow_redirects = True
+        self.retry_policy = None
+        # None means the enabled option of the [http_cache] section of config.cfg
+        self.use_cache = None
+        # the path and the url params are set to the url by the first sending, so the request can be sent again
+        self.assembled = False
 
     @classmethod
     def get(cls, url):
@@ -146,14 +231,18 @@ class ApiRequest:
                 self.url_params.append(key + "=" + value)
         return self
 
-    def add_file(self, field, path):
-        """  support file upload, and this should be set to files field
+    def add_file(self, field, path, content_type=None, file_name=None):
+        """  support file upload, and this should be set to files field.
+        the file is not opened here, it is streamed in chunks while sending and closed after send(),
+        the other form fields are set by set_body(dict, auto_config=False), a str, bytes or json body is an error
         :param field: the file's filed name
         :param path: the file's path
+        :param content_type: (optional) the content type of the file part, guessed from the file name by default
+        :param file_name: (optional) the file name sent to the server, default is the base name of the path
         :return: the request itself
         """
         if path is not None:
-            self.files.append((field, open(path, "rb")))
+            self.files.append(UploadFile(field, path, content_type=content_type, file_name=file_name))
         return self
 
     def set_body(self, body, auto_config=True):
@@ -170,10 +259,20 @@ class ApiRequest:
             self.data = body
             return self
 
-        if JsonUtils.is_json(body) or isinstance(body, dict) or isinstance(body, list):
+        if isinstance(body, dict) or isinstance(body, list):
             self.set_json(body)
-        elif isinstance(body, str):
-            self.data = body
+        elif isinstance(body, (str, bytes)):
+            # one parse tells whether it is a json, and the parsed value is the json body
+            is_json, value = JsonCodec.try_loads(body)
+            if is_json and value is None:
+                # json_body None means no body, the json null is sent as it is
+                self.data = body
+                if not any(key.lower() == "content-type" for key in self.headers):
+                    self.set_content_type(ContentType.APPLICATION_JSON)
+            elif is_json:
+                self.set_json(value)
+            else:
+                self.data = body
         else:
             self.set_json(JsonUtils.object_to_json(body))
         return self
@@ -221,12 +320,224 @@ class ApiRequest:
         self.allow_redirects = allow_redirects
         return self
 
+    def set_retry(self, policy=None, **options):
+        """
+        turn on the retry of the request, the requests are not retried by default unless it is enabled in the
+        [retry] section of config.cfg
+        :param policy: (optional) instance of RetryPolicy, default is the policy in config.cfg
+        :param options: the options of the policy to change, e.g. max_attempts=5, statuses={500, 502}
+        :return: the request itself
+        """
+        self.retry_policy = (policy or RetryPolicy.configured()).copy(**options)
+        return self
+
+    def set_cache(self, enabled=True):
+        """
+        turn the conditional cache on or off for the GET request, it is off by default unless it is enabled in the
+        [http_cache] section of config.cfg. With the cache a 304 from the server is answered with the cached body,
+        see ApiResponse.from_cache
+        :param enabled: True or False
+        :return: the request itself
+        """
+        self.use_cache = enabled
+        return self
+
+    def set_timeout(self, connect=None, read=None):
+        """
+        set the timeouts of the request, so that a hung call does not stall the worker
+        :param connect: seconds to wait for the connection
+        :param read: seconds to wait for the server to send data
+        :return: the request itself
+        """
+        if connect is not None:
+            self.connect_timeout = connect
+        if read is not None:
+            self.timeout = read
+        return self
+
     def send(self):
         """
         Assemble the request and send it to the server. get the response
         :return: the object of ApiResponse
         """
+        return self.__send()
+
+    def stream(self, chunk_size=64 * 1024):
+        """
+        Assemble the request and send it in streaming mode, only the status and the headers are read,
+        the body is kept on the connection until it is iterated, saved or asked for by text/content.
+        It is used for the big downloads and exports, e.g.
+
+            with ApiRequest.get(host).add_path("export").stream() as response:
+                response.assert_status(200).save_to(path)
+
+        :param chunk_size: the size in bytes of the chunks which are read from the connection
+        :return: the object of ApiStreamResponse
+        """
+        api_response = self.__send(stream=True)
+        api_response.chunk_size = chunk_size
+        return api_response
+
+    def __send(self, stream=False):
+        """
+        this is a private method to send the assembled request through the shared transport
+        :param stream: if True, don't read the body and return ApiStreamResponse
+        :return: the object of ApiResponse or ApiStreamResponse
+        """
+        self.__assemble()
+
+        request_time = datetime.datetime.now()
+        current = time.time()
+        kwargs = dict(params=self.params, data=self.data, json=self.json_body, headers=self.headers,
+                      verify=self.verify, timeout=(self.connect_timeout, self.timeout), proxies=self.proxies,
+                      allow_redirects=self.allow_redirects, stream=stream, use_cache=self.use_cache)
+        encoder = None
+        if len(self.files) > 0:
+            # stream the multipart body instead of letting requests build it in memory
+            encoder = MultipartEncoder(fields=self.data if isinstance(self.data, dict) else None, files=self.files)
+            kwargs["data"] = encoder
+            kwargs["headers"] = dict(self.headers, **{"Content-Type": encoder.content_type})
+        cassette = Cassette.get_instance()
+        policy = self.retry_policy or RetryPolicy.default()
+        attempts = []
+        started = time.monotonic()
+        try:
+            while True:
+                attempt_start = time.monotonic()
+                try:
+                    if cassette is None:
+                        r = HttpTransport.get_instance().request(self.method, self.url, **kwargs)
+                    else:
+                        r = cassette.request(HttpTransport.get_instance(), self.method, self.url, **kwargs)
+                    error = None
+                except Exception as e:
+                    r, error = None, e
+                wait = self.__next_attempt(policy, attempts, started, attempt_start, r, error)
+                if wait is None:
+                    break
+                time.sleep(wait)
+                if encoder is not None:
+                    encoder.rewind()
+        finally:
+            if encoder is not None:
+                encoder.close()
+
+        if error is not None:
+            self.__log_exchange(request_time, current, None)
+            raise error
+
+        api_response = ApiStreamResponse(r) if stream else ApiResponse(r)
+        api_response.attempts = attempts
+        self.__log_exchange(request_time, current, api_response)
+
+        return api_response
+
+    async def send_async(self, limiter=None):
+        """
+        The asyncio counterpart of send, it should be awaited on an event loop, the connections are reused
+        by all the requests on the same loop. aiohttp is required.
+        :param limiter: (optional) instance of AsyncLimiter, to bound the number of requests in flight
+        :return: the object of ApiResponse
+        """
+        if limiter is not None:
+            async with limiter:
+                return await self.send_async()
+
+        self.__assemble()
+
+        request_time = datetime.datetime.now()
+        current = time.time()
+        kwargs = dict(params=self.params, data=self.data, files=self.files, json=self.json_body,
+                      headers=self.headers, verify=self.verify, timeout=(self.connect_timeout, self.timeout),
+                      proxies=self.proxies, allow_redirects=self.allow_redirects, use_cache=self.use_cache)
+        cassette = Cassette.get_instance()
+        policy = self.retry_policy or RetryPolicy.default()
+        attempts = []
+        started = time.monotonic()
+        while True:
+            attempt_start = time.monotonic()
+            try:
+                if cassette is None:
+                    r = await AsyncHttpTransport.request(self.method, self.url, **kwargs)
+                else:
+                    r = await cassette.request_async(AsyncHttpTransport, self.method, self.url, **kwargs)
+                error = None
+            except Exception as e:
+                r, error = None, e
+            wait = self.__next_attempt(policy, attempts, started, attempt_start, r, error)
+            if wait is None:
+                break
+            await asyncio.sleep(wait)
+
+        if error is not None:
+            self.__log_exchange(request_time, current, None)
+            raise error
+
+        api_response = ApiResponse(r)
+        api_response.attempts = attempts
+        self.__log_exchange(request_time, current, api_response)
 
+        return api_response
+
+    @classmethod
+    async def send_many_async(cls, api_requests, concurrency=100, return_exceptions=False):
+        """
+        Send a batch of built requests on the running event loop, at most "concurrency" of them are in flight
+        :param api_requests: list of ApiRequest, they should be fully built but not sent yet
+        :param concurrency: the max number of requests in flight at the same time
+        :param return_exceptions: the same as asyncio.gather, if True, the error is put in the result list
+            instead of being raised
+        :return: list of ApiResponse in the same order as the input
+        """
+        limiter = AsyncLimiter(concurrency)
+        return await asyncio.gather(*[request.send_async(limiter=limiter) for request in api_requests],
+                                    return_exceptions=return_exceptions)
+
+    def __next_attempt(self, policy, attempts, started, attempt_start, response, error):
+        """
+        this is a private method to record the finished attempt and decide whether to retry it
+        :param policy: the RetryPolicy
+        :param attempts: the records of the attempts, the new record is appended to it
+        :param started: the time.monotonic() when the first attempt is sent
+        :param attempt_start: the time.monotonic() when the attempt is sent
+        :param response: the requests.Response of the attempt, None if there is an error
+        :param error: the exception of the attempt, None if there is a response
+        :return: seconds to wait before the next attempt, None if there is no more attempt
+        """
+        status = None if response is None else response.status_code
+        record = {
+            "attempt": len(attempts) + 1,
+            "status": status,
+            "error": None if error is None else repr(error),
+            "elapsed": time.monotonic() - attempt_start,
+            "wait": 0,
+        }
+        attempts.append(record)
+        if not policy.should_retry(record["attempt"], self.method, started, status=status, error=error):
+            return None
+
+        record["wait"] = policy.wait_time(record["attempt"], None if response is None else response.headers)
+        logger.warning("=== retry " + self.method + " " + self.url + " after attempt " + str(record["attempt"]) +
+                       " (" + (record["error"] or "status " + str(status)) + "), wait " +
+                       str(round(record["wait"], 3)) + "s")
+        if response is not None:
+            response.close()
+        return record["wait"]
+
+    def __assemble(self):
+        """
+        this is a private method to set the path and the url params to the url before sending
+        :return:
+        """
+        if len(self.files) > 0 and ((self.data is not None and not isinstance(self.data, dict)) or
+                                    self.json_body is not None):
+            # the multipart body only has the form fields and the files, the other bodies can't be a part of it
+            raise ValueError("The request with files only sends a dict of form fields as the body, "
+                             "set it by set_body(fields, auto_config=False), but the body is: " +
+                             HttpLog.truncate(str(self.data if self.json_body is None else self.json_body)))
+        if self.assembled:
+            return
+        self.assembled = True
         if len(self.url_params) > 0:
             self.path = "?" + "&".join(self.url_params)
 
@@ -239,48 +550,104 @@ class ApiRequest:
         # add a tag for automation test request
         self.params["test"] = "automation"
 
-        logger.info("=" * 150)
-
-        self.__print_request()
-        current = time.time()
-        r = requests.request(self.method, self.url, params=self.params, data=self.data, files=self.files,
-                             json=self.json_body, headers=self.headers, verify=self.verify, timeout=self.timeout,
-                             proxies=self.proxies, allow_redirects=self.allow_redirects)
-
-        logger.info("=== time cost:       " + str((time.time() - current) * 1000))
-
-        api_response = ApiResponse(r)
-        api_response.print_response()
-
-        return api_response
+    @classmethod
+    def send_many(cls, api_requests, concurrency=10, deadline=None, fail_fast=True):
+        """
+        Send a batch of built requests in parallel through a bounded thread pool
+        :param api_requests: list of ApiRequest, they should be fully built but not sent yet
+        :param concurrency: the max number of requests in flight at the same time, it is better to keep it
+            no bigger than the pool_maxsize of the [transport] config, otherwise the extra connections are not kept
+        :param deadline: (optional) seconds for the whole batch, the requests which are not finished in time
+            are regarded as TimeoutError
+        :param fail_fast: if True, raise the first error at once and cancel the requests which are not started.
+            if False, send all of them and put the error in the result list at the position of the failed request
+        :return: list of ApiResponse (or the exception if fail_fast is False) in the same order as the input
+        """
+        api_requests = list(api_requests)
+        results = [None] * len(api_requests)
+        if len(api_requests) == 0:
+            return results
+
+        end_time = None if deadline is None else time.monotonic() + deadline
+        executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(api_requests))),
+                                      thread_name_prefix="ApiRequest")
+        futures = {executor.submit(request.send): index for index, request in enumerate(api_requests)}
+        pending = set(futures)
+        try:
+            while len(pending) > 0:
+                timeout = None if end_time is None else max(end_time - time.monotonic(), 0)
+                done, pending = wait(pending, timeout=timeout,
+                                     return_when=FIRST_EXCEPTION if fail_fast else ALL_COMPLETED)
+                for future in done:
+                    error = future.exception()
+                    if error is None:
+                        results[futures[future]] = future.result()
+                    elif fail_fast:
+                        raise error
+                    else:
+                        results[futures[future]] = error
+                if len(pending) > 0 and end_time is not None and time.monotonic() >= end_time:
+                    error = FutureTimeoutError(str(len(pending)) + " of " + str(len(api_requests)) +
+                                               " requests are not finished in " + str(deadline) + " seconds")
+                    if fail_fast:
+                        raise error
+                    for future in pending:
+                        results[futures[future]] = error
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        return results
+
+    def __log_exchange(self, request_time, start, api_response):
+        """
+        this is a private method logging the request and the response if they are selected by HttpLog
+        :param request_time: the datetime when the request is sent
+        :param start: the time.time() when the request is sent
+        :param api_response: the ApiResponse, None if the request is failed without response
+        :return:
+        """
+        if not HttpLog.is_logged(None if api_response is None else api_response.status):
+            return
+        HttpLog.log("=" * 150)
+        self.__print_request(request_time)
+        HttpLog.log("=== time cost:       " + str((time.time() - start) * 1000))
+        if api_response is not None:
+            api_response.print_response()
 
-    def __print_request(self):
+    def __print_request(self, request_time=None):
         """
         this is a private method just logging the request info
+        :param request_time: the datetime when the request is sent, default is now
         :return:
         """
-        logger.info("==> current time: " + datetime.datetime.now().strftime('%F %H:%M:%S.%f'))
-        logger.info("==> request:")
-        logger.info("==> " + self.method + " : " + self.url)
+        if not HttpLog.is_enabled():
+            return
+        request_time = request_time or datetime.datetime.now()
+        HttpLog.log("==> current time: " + request_time.strftime('%F %H:%M:%S.%f'))
+        HttpLog.log("==> request:")
+        HttpLog.log("==> " + self.method + " : " + self.url)
         if self.params != {}:
-            logger.info("==> params: ")
+            HttpLog.log("==> params: ")
             for key, value in self.params.items():
-                logger.info("==>   " + key + " : " + str(value))
+                HttpLog.log("==>   " + key + " : " + str(value))
         if self.headers != {}:
-            logger.info("==> headers: ")
-            for i in JsonUtils.dict_generator(self.headers):
-                logger.info("==>   " + json.dumps(i))
-        if len(self.files) > 0 :
-            logger.info("==> files: ")
+            HttpLog.log("==> headers: ")
+            for key, value in self.headers.items():
+                HttpLog.log("==>   " + key + " : " + str(value))
+        if len(self.files) > 0:
+            HttpLog.log("==> files: ")
             for file in self.files:
-                logger.info("==>   " + str(file))
+                HttpLog.log("==>   " + str(file))
         if self.data is not None:
-            logger.info("==> payload:")
-            logger.info("==>   " + str(self.data))
+            HttpLog.log("==> payload:")
+            HttpLog.log("==>   " + HttpLog.truncate(str(self.data)))
         if self.json_body != {} and self.json_body is not None:
-            logger.info("==> payload:")
-            logger.info("==>   " + json.dumps(self.json_body, ensure_ascii=False, indent=4))
-        logger.info("==>")
+            HttpLog.log("==> payload:")
+            HttpLog.log("==>   " + HttpLog.truncate(JsonCodec.pretty(self.json_body)))
+        HttpLog.log("==>")
 
 
 class ApiResponse:
@@ -290,10 +657,81 @@ class ApiResponse:
         self.headers = response.headers
         self.url = response.url
         self.encoding = response.encoding
-        self.text = response.text
-        self.json = response.json
         self.elapsed = response.elapsed
-        self.content = response.content
+        # True if the body is served by the conditional cache after a 304 from the server
+        self.from_cache = getattr(response, "from_cache", False)
+        # the dns, connect, tls, ttfb, download and total milliseconds, None if the response is not from the network
+        timing = getattr(response, "timing", None)
+        self.timing = None if timing is None else timing.as_dict()
+        # the records of the attempts made by the retry policy, with the elapsed and the wait seconds of each one
+        self.attempts = []
+        self._response = response
+        self._text = None
+        self._json_body = _NOT_PARSED
+        self._json_error = None
+        self._path_index = None
+
+    @property
+    def content(self):
+        """
+        the raw body in bytes
+        """
+        return self._response.content
+
+    @property
+    def text(self):
+        """
+        the decoded body, it is only decoded on the first access
+        """
+        if self._text is None:
+            self._text = self._response.text
+        return self._text
+
+    @property
+    def body(self):
+        """
+        the parsed json body, it is parsed on the first access and then cached,
+        so the assertions, the logging and the callers share one parse
+        :return: the parsed json body
+        """
+        if self._json_body is _NOT_PARSED:
+            if self._json_error is None:
+                try:
+                    self._json_body = self._decode_json()
+                    return self._json_body
+                except ValueError as e:
+                    self._json_error = ValueError("The response body is not a valid json (status: " +
+                                                  str(self.status) + ", Content-Type: " +
+                                                  str(self.headers.get("Content-Type")) + "): " + self.text[:200])
+                    self._json_error.__cause__ = e
+            raise self._json_error
+        return self._json_body
+
+    def _decode_json(self):
+        """
+        parse the raw utf-8 body by JsonCodec, the body of another charset is parsed from the decoded text
+        """
+        encoding = (self.encoding or "utf-8").lower().replace("_", "-")
+        if encoding in ("utf-8", "utf8"):
+            return JsonCodec.loads(self.content)
+        return JsonCodec.loads(self.text)
+
+    def path_index(self):
+        """
+        the body indexed by path, it is built on the first call and then cached, so many fields can be looked up
+        without walking the body again
+        :return: PathIndex of the body
+        """
+        if self._path_index is None:
+            self._path_index = PathIndex(self.body)
+        return self._path_index
+
+    def json(self):
+        """
+        keep the same usage as requests.Response.json(), but the body is only parsed once
+        :return: the parsed json body
+        """
+        return self.body
 
     def assert_status(self, status):
         """
@@ -339,10 +777,11 @@ class ApiResponse:
                     ignore_order=False, ignore_string_case=False, exclude_paths=None):
         """
         Verify the response body according to the given values
-        :param json_body: the expected response body, it should be a json ar dict
+        :param json_body: the expected response body, it should be a json ar dict, or a compiled ExpectedSchema
         :param contain_str:  a string parameter, which will be checked whether it is a substring of the response body or not.
-        :param xml_body: TODO: the xml format body. Because most of the APIs are using json format now, we just finished
-         the json validation methon at the moment. once there is the requirement to check xml body, we will add the xml validation flows
+        :param xml_body: the expected xml body as str, bytes or an Element, a dict of the XPath-like selectors and the
+         expected values, or a compiled ExpectedXml. it is checked as a subset of the body like json_body, the body of
+         an ApiStreamResponse is parsed from the stream
         :param is_expected: this parameter should work with parameter contain_str. default is true, the response should
          contain expected values. if is_expected is False, verify the response not contains the input strings
         :return: ApiResopnse itself
@@ -354,20 +793,34 @@ class ApiResponse:
             if contain_str is not None:
                 assert str(contain_str) in self.text, "Failed to find the expected string: \"" + str(contain_str) + \
                                                  "\" in the response body >>>\n " + self.text
+            elif isinstance(json_body, ExpectedSchema):
+                json_body.assert_match(self.body)
             elif json_body is not None:
                 if not (isinstance(json_body, str) or isinstance(json_body, dict) or isinstance(json_body, list)):
                     json_body = JsonUtils.object_to_json(json_body)
-                JsonUtils.dict_compare(self.json(), json_body,
+                JsonUtils.dict_compare(self.body, json_body,
                                        ignore_order=ignore_order, ignore_string_case=ignore_string_case, exclude_paths=exclude_paths)
 
             elif xml_body is not None:
-                # TODO: need to be implemented.
-                raise NotImplementedError("XML validation is not implemented.")
+                if not isinstance(xml_body, ExpectedXml):
+                    xml_body = ExpectedXml.get(xml_body, ignore_order=ignore_order,
+                                               ignore_string_case=ignore_string_case, exclude_paths=exclude_paths)
+                xml_body.assert_match(self)
             else:
                 raise ValueError("Input parameter error!")
 
         return self
 
+    def assert_json_stream(self, stream):
+        """
+        Run the path-targeted checks of a JsonStream on the body in one pass, the body of an ApiStreamResponse is
+        parsed from the stream, it is never loaded as a whole, and the reading stops once all the paths are checked
+        :param stream: JsonStream, e.g. JsonStream().assert_equal("$.result.code", 200).count("$.data[*]")
+        :return: the response itself
+        """
+        stream.run(self)
+        return self
+
     def get_header(self, key):
         """
         return the special header value of the response
@@ -381,18 +834,84 @@ class ApiResponse:
         this is a method just logger the request info
         :return:
         """
-        logger.info("<== current time: " + datetime.datetime.now().strftime('%F %H:%M:%S.%f'))
-        logger.info("<== response:")
-        logger.info("<== elapsed: " + str(self.elapsed))
-        logger.info("<== Status: " + str(self.status))
+        if not HttpLog.is_enabled():
+            return
+        HttpLog.log("<== current time: " + datetime.datetime.now().strftime('%F %H:%M:%S.%f'))
+        HttpLog.log("<== response:")
+        HttpLog.log("<== elapsed: " + str(self.elapsed))
+        HttpLog.log("<== Status: " + str(self.status))
         if self.headers != {}:
-            logger.info("<== headers:")
-            for i in JsonUtils.dict_generator(self.headers):
-                logger.info("<==   " + json.dumps(i))
-        logger.info("<== payload:")
+            HttpLog.log("<== headers:")
+            for key, value in self.headers.items():
+                HttpLog.log("<==   " + key + " : " + str(value))
+        HttpLog.log("<== payload:")
+        self._print_payload()
+        HttpLog.log("<== request is done!\n")
+
+    def _print_payload(self):
+        """
+        log the body, it is cut by the max_body_size of HttpLog
+        :return:
+        """
+        if HttpLog.is_truncated(self.text):
+            # don't pretty print a body which will be cut anyway
+            HttpLog.log("<==   " + HttpLog.truncate(self.text))
+        else:
+            try:
+                HttpLog.log("<==   " + HttpLog.truncate(JsonCodec.pretty(self.body)))
+            except ValueError:
+                HttpLog.log("<==   " + self.text)
+
+
+class ApiStreamResponse(ApiResponse):
+    """
+    The response of ApiRequest.stream, the body is not buffered, it can be read by iter_chunks or save_to
+    in constant memory. assert_status, assert_header and the other header checks work as usual, text, content
+    and body are only materialized when they are asked for, and then the whole body is read into memory.
+    The connection goes back to the pool when the body is fully read or the response is closed.
+    """
+
+    def __init__(self, response, chunk_size=64 * 1024):
+        super().__init__(response)
+        self.chunk_size = chunk_size
+
+    def iter_chunks(self, chunk_size=None):
+        """
+        iterate the body in chunks
+        :param chunk_size: the size in bytes of the chunks, default is the chunk_size given to ApiRequest.stream
+        :return: generator of bytes
+        """
         try:
-            logger.info("<==   " + json.dumps(json.loads(self.text), ensure_ascii=False, indent=4))
-        except Exception:
-            logger.info("<==   " + self.text)
-        logger.info("<== request is done!\n")
+            for chunk in self._response.iter_content(chunk_size=chunk_size or self.chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            self.close()
+
+    def save_to(self, path, chunk_size=None):
+        """
+        write the body to a file chunk by chunk
+        :param path: the file path
+        :param chunk_size: the size in bytes of the chunks, default is the chunk_size given to ApiRequest.stream
+        :return: the response itself
+        """
+        with open(path, "wb") as f:
+            for chunk in self.iter_chunks(chunk_size):
+                f.write(chunk)
+        return self
+
+    def close(self):
+        """
+        release the connection, the unread body is dropped
+        :return:
+        """
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
+    def _print_payload(self):
+        HttpLog.log("<==   (streamed body, Content-Length: " + str(self.headers.get("Content-Length")) + ")")
@@ -0,0 +1,106 @@
+from libs.common.request import ApiRequest
+
+
+class RequestTemplate:
+    """
+    A prepared endpoint: the method, the url, the static headers, the default params and the TLS settings are
+    declared once, the url is assembled and the headers are merged up front, and every request is stamped out
+    with only the fields which vary, e.g.
+
+        device_data = RequestTemplate.get(host, "pxp/iot/Device/findDeviceData.json", verify=False)
+        alerts = device_data.bind(headers={"idToken": token}, params={"interfaceType": InterfaceType.AlertData})
+        while True:
+            response = alerts.send(deviceId=device_id)
+            ...
+
+    The stamped requests are normal ApiRequest, they can be changed by the builder methods before sending.
+    """
+
+    def __init__(self, method, host, path="", headers=None, params=None, verify=True, timeout=None,
+                 connect_timeout=None, retry_policy=None, allow_redirects=True):
+        """
+        :param method: the request method, "get", "post", "put" or "delete"
+        :param host: the test host
+        :param path: (optional) the api path, e.g. "pxp/iot/Device/findDeviceData.json"
+        :param headers: (optional) dict of the static headers
+        :param params: (optional) dict of the default params, the None values are skipped
+        :param verify: (optional) the same as ApiRequest.is_verify
+        :param timeout: (optional) seconds, the read timeout
+        :param connect_timeout: (optional) seconds, the connect timeout
+        :param retry_policy: (optional) RetryPolicy of the requests
+        :param allow_redirects: (optional) the same as ApiRequest.is_redirect
+        """
+        self.method = method
+        self.host = host
+        self.path = path
+        self.url = host.rstrip("/") + ("/" + str(path).lstrip("/") if path else "")
+        self.headers = {key: value for key, value in (headers or {}).items() if value is not None}
+        self.params = {key: value for key, value in (params or {}).items() if value is not None}
+        self.verify = verify
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retry_policy = retry_policy
+        self.allow_redirects = allow_redirects
+
+    @classmethod
+    def get(cls, host, path="", **options):
+        return cls("get", host, path, **options)
+
+    @classmethod
+    def post(cls, host, path="", **options):
+        return cls("post", host, path, **options)
+
+    @classmethod
+    def put(cls, host, path="", **options):
+        return cls("put", host, path, **options)
+
+    @classmethod
+    def delete(cls, host, path="", **options):
+        return cls("delete", host, path, **options)
+
+    def bind(self, headers=None, params=None):
+        """
+        derive a template with more static headers and default params, e.g. the token of a test
+        :param headers: (optional) dict of the headers to add
+        :param params: (optional) dict of the params to add
+        :return: a new RequestTemplate
+        """
+        template = RequestTemplate.__new__(RequestTemplate)
+        template.__dict__.update(self.__dict__)
+        if headers:
+            template.headers = dict(self.headers, **{key: value for key, value in headers.items()
+                                                     if value is not None})
+        if params:
+            template.params = dict(self.params, **{key: value for key, value in params.items()
+                                                   if value is not None})
+        return template
+
+    def request(self, headers=None, body=None, json_body=None, **params):
+        """
+        stamp out a request of the endpoint, it can be sent again and again, e.g. by a polling loop
+        :param headers: (optional) dict of the headers of this request
+        :param body: (optional) the request body
+        :param json_body: (optional) the json body
+        :param params: the params of this request, the None values are skipped
+        :return: ApiRequest which is ready to send
+        """
+        request = ApiRequest(self.url, self.method, body=body, json_body=json_body, verify=self.verify)
+        request.headers = dict(self.headers, **headers) if headers else dict(self.headers)
+        request.params = dict(self.params)
+        for key, value in params.items():
+            if value is not None:
+                request.params[key] = value
+        request.allow_redirects = self.allow_redirects
+        request.retry_policy = self.retry_policy
+        if self.timeout is not None:
+            request.timeout = self.timeout
+        if self.connect_timeout is not None:
+            request.connect_timeout = self.connect_timeout
+        return request
+
+    def send(self, headers=None, body=None, json_body=None, **params):
+        """
+        stamp out a request of the endpoint and send it
+        :return: ApiResponse
+        """
+        return self.request(headers, body, json_body, **params).send()
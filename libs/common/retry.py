@@ -0,0 +1,155 @@
+import copy
+import email.utils
+import random
+import time
+import requests
+from libs.utils.misc import Misc
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only needed by the async mode
+    aiohttp = None
+
+
+class RetryPolicy:
+    """
+    Declarative retry policy of ApiRequest: which methods, statuses and exceptions are retried, how many attempts
+    are made and how long to wait between them (exponential backoff with full jitter, or the Retry-After header).
+    The policy is configured in the [retry] section of config.cfg. The requests are not retried by default, so a
+    test which expects a 503 or a timeout gets it at the first attempt, a request turns the retry on by
+    ApiRequest.set_retry, or all of them do if it is enabled in config.cfg.
+    """
+
+    DEFAULTS = {
+        # if False, only the requests which call ApiRequest.set_retry are retried
+        "enabled": False,
+        # 1 means no retry
+        "max_attempts": 3,
+        # comma separated status codes which are retried
+        "statuses": "502,503,504",
+        # comma separated methods which are retried, the non-idempotent ones are not retried by default
+        "methods": "GET,HEAD,OPTIONS,PUT,DELETE",
+        # seconds, the wait before the n-th retry is backoff * 2 ^ (n - 1)
+        "backoff": 0.5,
+        # seconds, the max wait between two attempts, including the Retry-After from the server
+        "max_backoff": 30.0,
+        # if True, the wait is a random value between 0 and the backoff, so the workers don't retry together
+        "jitter": True,
+        # if True, the Retry-After header of the response is used as the wait
+        "respect_retry_after": True,
+        # seconds, no new attempt is made after this time since the first attempt, 0 means no limit
+        "max_elapsed": 120.0,
+    }
+
+    # the connection reset, refused and timeout errors
+    EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout) + \
+        ((aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError) if aiohttp is not None else ())
+
+    _default = None
+    _configured = None
+
+    def __init__(self, max_attempts=3, statuses=(502, 503, 504), methods=("GET", "HEAD", "OPTIONS", "PUT", "DELETE"),
+                 exceptions=EXCEPTIONS, backoff=0.5, max_backoff=30.0, jitter=True, respect_retry_after=True,
+                 max_elapsed=120.0):
+        """
+        :param max_attempts: the max number of attempts, 1 means no retry
+        :param statuses: the response status codes which are retried
+        :param methods: the request methods which are retried
+        :param exceptions: the exception classes which are retried
+        :param backoff: seconds, the base of the exponential backoff
+        :param max_backoff: seconds, the max wait between two attempts
+        :param jitter: if True, use a random wait between 0 and the backoff
+        :param respect_retry_after: if True, wait as the Retry-After header of the response says
+        :param max_elapsed: seconds, no new attempt after this time since the first one, 0 or None means no limit
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.statuses = set(statuses)
+        self.methods = {method.upper() for method in methods}
+        self.exceptions = tuple(exceptions)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.max_elapsed = max_elapsed
+
+    @classmethod
+    def configured(cls):
+        """
+        :return: the policy configured in config.cfg, it is the one of ApiRequest.set_retry
+        """
+        if cls._configured is None:
+            config = Misc.load_config_section("retry", cls.DEFAULTS)
+            enabled = config.pop("enabled")
+            config["statuses"] = [int(status) for status in config["statuses"].split(",") if status.strip()]
+            config["methods"] = [method.strip() for method in config["methods"].split(",") if method.strip()]
+            cls._configured = cls(**config)
+            cls._default = cls._configured if enabled else cls._configured.copy(max_attempts=1)
+        return cls._configured
+
+    @classmethod
+    def default(cls):
+        """
+        :return: the policy of the requests which don't call ApiRequest.set_retry, no retry unless it is enabled
+            in config.cfg
+        """
+        if cls._default is None:
+            cls.configured()
+        return cls._default
+
+    def copy(self, **overrides):
+        """
+        :param overrides: the attributes to change, e.g. max_attempts=5
+        :return: a new policy
+        """
+        policy = copy.copy(self)
+        for key, value in overrides.items():
+            if not hasattr(policy, key):
+                raise KeyError("Unknown retry policy option: " + key)
+            setattr(policy, key, value)
+        return policy
+
+    def should_retry(self, attempt, method, started, status=None, error=None):
+        """
+        :param attempt: the number of the attempt which is just finished, starting from 1
+        :param method: the request method
+        :param started: the time.monotonic() when the first attempt is sent
+        :param status: the response status, None if there is an error
+        :param error: the exception of the attempt, None if there is a response
+        :return: True if another attempt should be made
+        """
+        if attempt >= self.max_attempts or method.upper() not in self.methods:
+            return False
+        if self.max_elapsed and time.monotonic() - started >= self.max_elapsed:
+            return False
+        if error is not None:
+            return isinstance(error, self.exceptions)
+        return status in self.statuses
+
+    def wait_time(self, attempt, headers=None):
+        """
+        :param attempt: the number of the attempt which is just finished, starting from 1
+        :param headers: the headers of the response, None if there is an error
+        :return: seconds to wait before the next attempt
+        """
+        if self.respect_retry_after and headers is not None and headers.get("Retry-After") is not None:
+            retry_after = self._parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        wait = min(self.backoff * (2 ** (attempt - 1)), self.max_backoff)
+        return random.uniform(0, wait) if self.jitter else wait
+
+    @staticmethod
+    def _parse_retry_after(value):
+        """
+        the Retry-After header is either seconds or an HTTP date
+        """
+        value = str(value).strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date is None:
+            return None
+        return max(date.timestamp() - time.time(), 0)
@@ -0,0 +1,240 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from libs.common.log import logger
+from libs.utils.misc import Misc
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+
+class _FileLock:
+    """
+    exclusive lock of a file shared by the processes, e.g. the pytest-xdist workers
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600), "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds, keep waiting
+                    continue
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class TokenCache:
+    """
+    Expiry-aware cache of the JWT tokens, keyed by the host and the secret key.
+    The expiry time is decoded from the "exp" claim of the token, a token is refreshed "refresh_margin" seconds
+    before it expires. The concurrent refreshes of the same key are coalesced into one request: the threads wait
+    for the one which is fetching, and the processes (e.g. the pytest-xdist workers) wait on the lock of the
+    on-disk store, then read the token which the first one has saved.
+    Only the hash of the secret key is saved in the store, it is readable by the owner only and it is cleared at
+    the start of every pytest session. A token which the server rejects is dropped by refresh().
+    The cache is configured in the [token_cache] section of config.cfg.
+    """
+
+    DEFAULTS = {
+        "enabled": True,
+        # seconds, the token is refreshed this time before it expires
+        "refresh_margin": 60,
+        # seconds, the lifetime of a token without "exp" claim
+        "default_ttl": 300,
+        # the on-disk store shared by the workers, relative to the root directory of the project,
+        # empty means results/token_cache/tokens.json
+        "path": "",
+    }
+
+    _instance = None
+    _configured = False
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path=None, refresh_margin=60, default_ttl=300):
+        """
+        :param path: (optional) the on-disk store, the tokens are only cached in memory if it is None
+        :param refresh_margin: seconds, refresh the token this time before it expires
+        :param default_ttl: seconds, the lifetime of a token without "exp" claim
+        """
+        self.path = path
+        if path is not None and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        # key -> {"token": str, "expires": float}
+        self._tokens = {}
+        # key -> the lock of the refresh
+        self._refresh_locks = {}
+        # token -> key and key -> fetch, to get a new token when the server rejects one
+        self._issued = {}
+        self._fetches = {}
+
+    @classmethod
+    def get_instance(cls):
+        """
+        :return: the cache configured in config.cfg, or None if it is disabled
+        """
+        with cls._instance_lock:
+            if not cls._configured:
+                config = Misc.load_config_section("token_cache", cls.DEFAULTS)
+                if config["enabled"]:
+                    path = os.path.join(Misc.get_root_directory(), config["path"] or
+                                        os.path.join("results", "token_cache", "tokens.json"))
+                    cls._instance = cls(path, config["refresh_margin"], config["default_ttl"])
+                cls._configured = True
+            return cls._instance
+
+    @staticmethod
+    def make_key(host, secret_key):
+        return hashlib.sha256((str(host) + "\n" + str(secret_key)).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def expiry(token):
+        """
+        decode the "exp" claim of the JWT, the signature is not verified
+        :param token: the JWT
+        :return: the expiry time as unix timestamp, None if the token has no "exp" claim
+        """
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            exp = json.loads(base64.urlsafe_b64decode(payload.encode("ascii"))).get("exp")
+        except (IndexError, ValueError, TypeError, AttributeError):
+            return None
+        return float(exp) if isinstance(exp, (int, float)) else None
+
+    def get(self, host, secret_key, fetch):
+        """
+        :param host: the api host
+        :param secret_key: the user secret key
+        :param fetch: callable without parameter which requests a new token
+        :return: a token which is not close to its expiry
+        """
+        return self._get(self.make_key(host, secret_key), fetch)
+
+    def refresh(self, token):
+        """
+        drop a token which the server rejects, e.g. with 401 or 403, and get a new one by the fetch which got it,
+        the threads and the processes which are rejected with the same token fetch only one new token
+        :param token: the rejected token
+        :return: the new token, None if the token is not from the cache
+        """
+        key = self._issued.get(token)
+        if key is None:
+            return None
+        with self._refresh_lock(key):
+            entry = self._tokens.get(key)
+            if entry is not None and entry["token"] == token:
+                logger.info("=== the token is rejected by the server, a new one is fetched")
+                self._tokens.pop(key, None)
+                if self.path is not None:
+                    with _FileLock(self.path + ".lock"):
+                        stored = self._read_store().get(key)
+                        if stored is not None and stored["token"] == token:
+                            self._write_store(key, None)
+        return self._get(key, self._fetches[key])
+
+    def _refresh_lock(self, key):
+        with self._lock:
+            return self._refresh_locks.setdefault(key, threading.Lock())
+
+    def _get(self, key, fetch):
+        self._fetches[key] = fetch
+        entry = self._tokens.get(key)
+        if self._is_fresh(entry):
+            return entry["token"]
+        with self._refresh_lock(key):
+            # another thread may have refreshed it while this one was waiting
+            entry = self._tokens.get(key)
+            if self._is_fresh(entry):
+                return entry["token"]
+            if self.path is None:
+                entry = self._fetch(fetch)
+            else:
+                with _FileLock(self.path + ".lock"):
+                    entry = self._read_store().get(key)
+                    if not self._is_fresh(entry):
+                        entry = self._fetch(fetch)
+                        self._write_store(key, entry)
+            self._tokens[key] = entry
+            self._issued[entry["token"]] = key
+            return entry["token"]
+
+    def invalidate(self, host, secret_key):
+        """
+        drop the token, e.g. when the server rejects it, the next get() requests a new one
+        :return:
+        """
+        key = self.make_key(host, secret_key)
+        self._tokens.pop(key, None)
+        if self.path is not None:
+            with _FileLock(self.path + ".lock"):
+                self._write_store(key, None)
+
+    def clear(self):
+        self._tokens.clear()
+        if self.path is not None:
+            with _FileLock(self.path + ".lock"):
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+
+    def _is_fresh(self, entry):
+        return entry is not None and entry["expires"] - self.refresh_margin > time.time()
+
+    def _fetch(self, fetch):
+        token = fetch()
+        expires = self.expiry(token)
+        if expires is None:
+            expires = time.time() + self.default_ttl
+        logger.info("=== a new token is fetched, it expires at " + time.strftime("%H:%M:%S", time.localtime(expires)))
+        return {"token": token, "expires": expires}
+
+    def _read_store(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except ValueError:
+            # a broken store is rebuilt
+            return {}
+
+    def _write_store(self, key, entry):
+        now = time.time()
+        tokens = {k: v for k, v in self._read_store().items() if v["expires"] > now}
+        if entry is None:
+            tokens.pop(key, None)
+        else:
+            tokens[key] = entry
+        temp = self.path + "." + str(os.getpid()) + ".tmp"
+        with open(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+            json.dump(tokens, f)
+        os.replace(temp, self.path)
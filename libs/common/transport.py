@@ -0,0 +1,307 @@
+import atexit
+import os
+import socket
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, VerifiedHTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from libs.common.http_cache import ConditionalCache
+from libs.common.log import logger
+from libs.common.metrics import HttpMetrics, RequestTiming
+from libs.utils.json_codec import JsonCodec
+from libs.utils.misc import Misc
+
+
+class _NoCookiePolicy(DefaultCookiePolicy):
+    """
+    the shared sessions must not carry cookies from one ApiRequest to the next one,
+    so that the behavior stays the same as the one-off requests.request()
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class _TimedConnectionMixin:
+    """
+    add the dns, connect and tls durations of a new connection to the RequestTiming of the current thread
+    """
+
+    def _new_conn(self):
+        timing = RequestTiming.current()
+        if timing is None:
+            return super()._new_conn()
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except socket.gaierror:
+            address = None
+        resolved = time.perf_counter()
+        timing.dns += (resolved - start) * 1000
+        try:
+            if address is not None:
+                # connect to the resolved address, so the dns lookup is not done twice
+                self._dns_host = address
+            try:
+                return super()._new_conn()
+            except NewConnectionError:
+                if address is None:
+                    raise
+                # the first address is not reachable, let urllib3 try all of them
+                self._dns_host = host
+                return super()._new_conn()
+        finally:
+            self._dns_host = host
+            timing.connect += (time.perf_counter() - resolved) * 1000
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, VerifiedHTTPSConnection):
+
+    def connect(self):
+        timing = RequestTiming.current()
+        if timing is None:
+            return super().connect()
+        before = timing.dns + timing.connect
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            # the rest of connect() besides _new_conn is the tls handshake
+            timing.tls += max((time.perf_counter() - start) * 1000 - (timing.dns + timing.connect - before), 0.0)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """
+    the adapter which times the connection phases and marks the time when the response headers arrive
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        timing = RequestTiming.current()
+        if timing is not None:
+            timing.headers_received()
+        return response
+
+
+class HttpTransport:
+    """
+    Shared, pooled and keep-alive HTTP transport used by ApiRequest.send.
+    One requests.Session is kept for every scheme://host:port, so the TCP/TLS connections are reused
+    across ApiRequest instances. Each process (e.g. a pytest-xdist worker) builds its own transport lazily,
+    sockets are never shared between processes.
+    The pool can be configured in the [transport] section of config.cfg.
+    """
+
+    DEFAULTS = {
+        # how many connection pools to cache for one host session, e.g. the proxies
+        "pool_connections": 10,
+        # max connections kept alive per host
+        "pool_maxsize": 20,
+        # if True, wait for a free connection instead of opening an extra one when the pool is full
+        "pool_block": False,
+        # seconds, a host session which is idle longer than this is closed and rebuilt on next use
+        "keep_alive": 60.0,
+    }
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, pool_block=False, keep_alive=60.0, cache=None):
+        """
+        :param pool_connections: the number of urllib3 connection pools to cache per host session
+        :param pool_maxsize: the maximum number of connections to keep alive per host
+        :param pool_block: whether the pool should block for a free connection when it is full
+        :param keep_alive: idle timeout in seconds, the idle host session will be closed after it
+        :param cache: (optional) ConditionalCache for the GET requests
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.cache = cache
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        # host -> [session, last used time]
+        self._sessions = {}
+        # host -> [hits, misses], the counters of the sessions which are already closed
+        self._retired = {}
+
+    @classmethod
+    def get_instance(cls):
+        """
+        get the transport of the current process, create it from config.cfg if it does not exist
+        :return: the shared HttpTransport
+        """
+        with cls._instance_lock:
+            if cls._instance is None or cls._instance._pid != os.getpid():
+                cls._instance = cls(cache=ConditionalCache.from_config(),
+                                    **Misc.load_config_section("transport", cls.DEFAULTS))
+            return cls._instance
+
+    @classmethod
+    def shutdown(cls):
+        """
+        close the transport of the current process, it is called at the end of the pytest session
+        :return:
+        """
+        with cls._instance_lock:
+            instance, cls._instance = cls._instance, None
+        if instance is not None and instance._pid == os.getpid():
+            stats = instance.stats()
+            if stats:
+                logger.info("=== connection pool stats: " + str(stats))
+            if instance.cache is not None and instance.cache.hits + instance.cache.misses > 0:
+                logger.info("=== conditional cache hits: " + str(instance.cache.hits) +
+                            ", misses: " + str(instance.cache.misses))
+            instance.close()
+
+    @staticmethod
+    def host_key(url):
+        """
+        :param url: the whole request url
+        :return: the pool key of the url, scheme://host:port
+        """
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return "%s://%s:%s" % (parts.scheme, parts.hostname, port)
+
+    def session(self, url):
+        """
+        get the session of the url's host, the session will be created if missing or idle too long
+        :param url: the whole request url
+        :return: requests.Session
+        """
+        host = self.host_key(url)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(host)
+            if entry is not None and self.keep_alive > 0 and now - entry[1] > self.keep_alive:
+                # the server has most likely dropped the idle sockets, don't risk a reset on them
+                self._retire(host, entry[0])
+                entry = None
+            if entry is None:
+                entry = [self._create_session(), now]
+                self._sessions[host] = entry
+            entry[1] = now
+            return entry[0]
+
+    def request(self, method, url, use_cache=None, **kwargs):
+        """
+        send the request through the pooled session of the url's host
+        :param method: the request method
+        :param url: the whole request url
+        :param use_cache: (optional) True or False to turn the conditional cache on or off for the request,
+            None means the enabled option of the [http_cache] section of config.cfg
+        :param kwargs: the same keyword arguments as requests.request
+        :return: requests.Response
+        """
+        if kwargs.get("json") is not None and not kwargs.get("data"):
+            kwargs["data"], kwargs["headers"] = self.encode_json(kwargs.pop("json"), kwargs.get("headers"))
+        key = None
+        if self.cache is not None:
+            key, kwargs["headers"] = self.cache.prepare(method, url, kwargs.get("params"), kwargs.get("headers"),
+                                                        kwargs.get("stream", False), use_cache)
+        timing = RequestTiming.begin()
+        try:
+            response = self.session(url).request(method, url, **kwargs)
+        except Exception as e:
+            HttpMetrics.record(method, url, timing.finish(), error=e)
+            raise
+        finally:
+            RequestTiming.end()
+        response.timing = timing.finish()
+        HttpMetrics.record(method, url, timing, status=response.status_code)
+        return response if self.cache is None else self.cache.resolve(key, response)
+
+    @staticmethod
+    def encode_json(json_body, headers):
+        """
+        encode the json body by JsonCodec instead of the stdlib json of requests and aiohttp
+        :param json_body: the json body
+        :param headers: the request headers
+        :return: (the body bytes, the headers with the json Content-Type if it is not set)
+        """
+        if not headers or not any(key.lower() == "content-type" for key in headers):
+            headers = dict(headers or {}, **{"Content-Type": "application/json"})
+        return JsonCodec.dumps_bytes(json_body), headers
+
+    def stats(self):
+        """
+        the connection pool hit/miss counters, a hit means a request reused a kept-alive connection,
+        and a miss means a new connection was opened
+        :return: dict of host -> {"hits": int, "misses": int}
+        """
+        with self._lock:
+            result = {host: {"hits": hits, "misses": misses} for host, (hits, misses) in self._retired.items()}
+            for host, (session, _) in self._sessions.items():
+                hits, misses = self._count(session)
+                counter = result.setdefault(host, {"hits": 0, "misses": 0})
+                counter["hits"] += hits
+                counter["misses"] += misses
+        return result
+
+    def close(self):
+        """
+        close all the host sessions and their connections
+        :return:
+        """
+        with self._lock:
+            for host, (session, _) in list(self._sessions.items()):
+                self._retire(host, session)
+
+    def _create_session(self):
+        session = requests.Session()
+        session.cookies.set_policy(_NoCookiePolicy())
+        adapter = _TimedHTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _retire(self, host, session):
+        hits, misses = self._count(session)
+        counter = self._retired.setdefault(host, [0, 0])
+        counter[0] += hits
+        counter[1] += misses
+        self._sessions.pop(host, None)
+        session.close()
+
+    @staticmethod
+    def _count(session):
+        hits = misses = 0
+        adapter = session.get_adapter("https://")
+        managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+        for manager in managers:
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                misses += pool.num_connections
+                hits += max(pool.num_requests - pool.num_connections, 0)
+        return hits, misses
+
+
+atexit.register(HttpTransport.shutdown)
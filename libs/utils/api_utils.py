@@ -1,7 +1,10 @@
-import json
 from poium.common import logging
 import time
-from libs.common.request import ApiRequest
+from libs.common.request_template import RequestTemplate
+from libs.common.token_cache import TokenCache
+from libs.utils.device_frame import DeviceFrame
+from libs.utils.device_poller import DevicePoller
+from libs.utils.paginator import Paginator
 from libs.utils.misc import Misc
 
 
@@ -14,61 +17,94 @@ class InterfaceType:
 
 class APIUtils:
 
+    # the statuses of a rejected token
+    AUTH_FAILURES = (401, 403)
+
     def __init__(self):
         self.config = Misc.load_config()
         self.host = self.config["api_host"]
+        # the endpoints are prepared once, the requests only supply the fields which vary
+        self.jwt_generate = RequestTemplate.get(self.host, "pxp/iot/Device/jwtGenerate.json", verify=False)
+        self.device_data = RequestTemplate.get(self.host, "pxp/iot/Device/findDeviceData.json", verify=False)
 
     def get_user_token(self, secret_key, is_return=True):
         """
-        Obtain token by user secret keys in order to complete API authentication
+        Obtain token by user secret keys in order to complete API authentication.
+        The token is cached by TokenCache until it is close to its expiry, the response is always requested
+        if is_return is False
         """
-        response = ApiRequest\
-            .get(self.host)\
-            .add_path("pxp/iot/Device/jwtGenerate.json")\
-            .add_param("info", secret_key)\
-            .is_verify(False) \
-            .send()
+        cache = TokenCache.get_instance()
+        if is_return and cache is not None:
+            return cache.get(self.host, secret_key, lambda: self.get_user_token(secret_key, is_return=False)
+                             .body["result"]["idToken"])
+
+        response = self.jwt_generate.send(info=secret_key)
+
+        return response if not is_return else response.body["result"]["idToken"]
 
-        return response if not is_return else response.json()["result"]["idToken"]
+    def refresh_user_token(self, id_token):
+        """
+        Drop a token which the server rejects from TokenCache and get a new one.
+        Return the new token, or None if the token is not from the cache
+        """
+        cache = TokenCache.get_instance()
+        return cache.refresh(id_token) if cache is not None else None
+
+    def send_with_token(self, id_token, build):
+        """
+        Send the request built by build(id_token), if the server rejects the token (401 or 403) the request is
+        built and sent once more with a new token from TokenCache.
+        Return (response, the token which is used)
+        """
+        response = build(id_token).send()
+        if response.status in self.AUTH_FAILURES:
+            new_token = self.refresh_user_token(id_token)
+            if new_token is not None and new_token != id_token:
+                id_token = new_token
+                response = build(id_token).send()
+        return response, id_token
+
+    def device_data_request(self, id_token, device_id, interface_type, **kwargs):
+        """
+        Build the request of the device data without sending it, the kwargs are the extra params
+        """
+        return self.device_data.request(headers={"idToken": id_token}, deviceId=device_id,
+                                        interfaceType=interface_type, **kwargs)
+
+    def watch_devices(self, id_token, subscriptions, timeout=None, **options):
+        """
+        Poll many devices at the same time until each of them returns data, instead of one 304 loop per device.
+        The subscriptions are tuples of (device_id, interface_type) or (device_id, interface_type, params dict),
+        the options are passed to DevicePoller, e.g. rate=5.
+        Return a generator of (subscription, response) in the order the data arrives
+        """
+        options.setdefault("min_interval", self.config.get("jenkins_params", {}).get(
+            "interval_min", DevicePoller.DEFAULTS["min_interval"]))
+        poller = DevicePoller(lambda sub: self.device_data_request(id_token, sub.device_id, sub.interface_type,
+                                                                   **sub.params), **options)
+        for subscription in subscriptions:
+            params = subscription[2] if len(subscription) > 2 else {}
+            poller.subscribe(subscription[0], subscription[1], **params)
+        return poller.poll(timeout)
 
     def sensor_data(self, id_token, device_id, start_time, end_time, data_type="peopleCnt",
                     interface_type=InterfaceType.SensorData, page_number=1, page_size=100, is_304=False):
         """
         Get information of a period of a device
         """
+        def build(token):
+            return self.device_data_request(token, device_id, interface_type, dataType=data_type,
+                                            startTime=start_time, endTime=end_time, pageNo=page_number,
+                                            page_size=page_size)
         if is_304:
-            response = ApiRequest \
-                .get(self.host) \
-                .add_path("pxp/iot/Device/findDeviceData.json") \
-                .add_param("deviceId", device_id) \
-                .add_param("interfaceType", interface_type) \
-                .add_param("dataType", data_type) \
-                .add_param("startTime", start_time) \
-                .add_param("endTime", end_time) \
-                .add_param("pageNo", page_number) \
-                .add_param("page_size", page_size) \
-                .add_header("idToken", id_token)\
-                .is_verify(False) \
-                .send()
+            response, id_token = self.send_with_token(id_token, build)
             return response
         else:
             status = 304
             while status == 304:
-                response = ApiRequest \
-                    .get(self.host) \
-                    .add_path("pxp/iot/Device/findDeviceData.json") \
-                    .add_param("deviceId", device_id) \
-                    .add_param("interfaceType", interface_type) \
-                    .add_param("dataType", data_type) \
-                    .add_param("startTime", start_time) \
-                    .add_param("endTime", end_time) \
-                    .add_param("pageNo", page_number) \
-                    .add_param("page_size", page_size) \
-                    .add_header("idToken", id_token) \
-                    .is_verify(False) \
-                    .send()
+                response, id_token = self.send_with_token(id_token, build)
                 if "999999" not in response.text:
-                    status = json.loads(response.text)["code"]
+                    status = response.body["code"]
                 else:
                     status = "999999"
                 if status == 304:
@@ -76,32 +112,42 @@ class APIUtils:
                 else:
                     return response
 
+    def iter_sensor_data(self, id_token, device_id, start_time, end_time, data_type="peopleCnt",
+                         interface_type=InterfaceType.SensorData, page_size=100, max_in_flight=1):
+        """
+        Iterate the records of a period of a device across all the pages, the next pages are requested while
+        the current one is consumed, max_in_flight caps the number of pages requested ahead
+        """
+        return Paginator(lambda page_number: self.sensor_data(id_token, device_id, start_time, end_time,
+                                                              data_type=data_type, interface_type=interface_type,
+                                                              page_number=page_number, page_size=page_size,
+                                                              is_304=True),
+                         page_size=page_size, max_in_flight=max_in_flight)
+
+    def sensor_data_frame(self, id_token, device_id, start_time, end_time, data_type="peopleCnt",
+                          interface_type=InterfaceType.SensorData, page_size=1000, max_in_flight=1):
+        """
+        Get the records of a period of a device across all the pages as a typed DeviceFrame
+        """
+        pages = self.iter_sensor_data(id_token, device_id, start_time, end_time, data_type=data_type,
+                                      interface_type=interface_type, page_size=page_size,
+                                      max_in_flight=max_in_flight).iter_pages()
+        return DeviceFrame.from_pages(pages, device_id=device_id)
+
     def alert_data(self, id_token, device_id, interface_type=InterfaceType.AlertData, is_304=False):
         """
         Get device alert history data
         """
+        def build(token):
+            return self.device_data_request(token, device_id, interface_type)
         if is_304:
-            response = ApiRequest \
-                .get(self.host) \
-                .add_path("pxp/iot/Device/findDeviceData.json") \
-                .add_param("deviceId", device_id) \
-                .add_param("interfaceType", interface_type) \
-                .add_header("idToken", id_token) \
-                .is_verify(False) \
-                .send()
+            response, id_token = self.send_with_token(id_token, build)
             return response
         else:
             status = 304
             while status == 304:
-                response = ApiRequest \
-                    .get(self.host) \
-                    .add_path("pxp/iot/Device/findDeviceData.json") \
-                    .add_param("deviceId", device_id) \
-                    .add_param("interfaceType", interface_type) \
-                    .add_header("idToken", id_token)\
-                    .is_verify(False) \
-                    .send()
-                status = json.loads(response.text)["code"]
+                response, id_token = self.send_with_token(id_token, build)
+                status = response.body["code"]
                 if status == 304:
                     logging.info(status)
                     time.sleep(self.config["jenkins_params"]["interval_min"])
@@ -112,38 +158,16 @@ class APIUtils:
         """
         Send radar changing requests to devices
         """
+        def build(token):
+            return self.device_data_request(token, device_id, interface_type, **kwargs)
         if is_304:
-            request = ApiRequest \
-                .get(self.host) \
-                .add_path("pxp/iot/Device/findDeviceData.json") \
-                .add_param("deviceId", device_id) \
-                .add_param("interfaceType", interface_type)
-
-            for item in kwargs.items():
-                request.add_param(item[0], item[1])
-
-            response = request\
-                .add_header("idToken", id_token)\
-                .is_verify(False) \
-                .send()
+            response, id_token = self.send_with_token(id_token, build)
             return response
         else:
             status = 304
             while status == 304:
-                request = ApiRequest \
-                    .get(self.host) \
-                    .add_path("pxp/iot/Device/findDeviceData.json") \
-                    .add_param("deviceId", device_id) \
-                    .add_param("interfaceType", interface_type)
-
-                for item in kwargs.items():
-                    request.add_param(item[0], item[1])
-
-                response = request \
-                    .add_header("idToken", id_token) \
-                    .is_verify(False) \
-                    .send()
-                status = json.loads(response.text)["code"]
+                response, id_token = self.send_with_token(id_token, build)
+                status = response.body["code"]
                 if status == 304:
                     logging.info(status)
                     time.sleep(self.config["jenkins_params"]["interval_min"])
@@ -154,37 +178,18 @@ class APIUtils:
         """
         Adjust the LED luminosity of a device
         """
+        def build(token):
+            return self.device_data_request(token, device_id, interface_type, dimming=dimming).set_token(token)
         if is_304:
-            response = ApiRequest \
-                .get(self.host) \
-                .add_path("pxp/iot/Device/findDeviceData.json") \
-                .add_param("deviceId", device_id) \
-                .add_param("interfaceType", interface_type) \
-                .add_param("dimming", dimming) \
-                .add_header("idToken", id_token)\
-                .set_token(id_token) \
-                .is_verify(False) \
-                .send()
+            response, id_token = self.send_with_token(id_token, build)
             return response
         else:
             status = 304
             while status == 304:
-                response = ApiRequest \
-                    .get(self.host) \
-                    .add_path("pxp/iot/Device/findDeviceData.json") \
-                    .add_param("deviceId", device_id) \
-                    .add_param("interfaceType", interface_type) \
-                    .add_param("dimming", dimming) \
-                    .add_header("idToken", id_token) \
-                    .set_token(id_token) \
-                    .is_verify(False) \
-                    .send()
-                status = json.loads(response.text)["code"]
+                response, id_token = self.send_with_token(id_token, build)
+                status = response.body["code"]
                 if status == 304:
                     logging.info(status)
                     time.sleep(self.config["jenkins_params"]["interval_min"])
                 else:
                     return response
-
-
-
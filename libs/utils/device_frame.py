@@ -0,0 +1,266 @@
+import pandas as pd
+from libs.utils.paginator import Paginator
+
+
+class DeviceFrame:
+    """
+    Columnar view of the device data records (sensor, alert, radar...) as a typed pandas DataFrame:
+    the time column is parsed to UTC timestamps, the device id column is categorical, and the numeric measures
+    are numbers. The assertions are vectorized, so millions of readings are checked without Python loops, e.g.
+
+        api.sensor_data_frame(token, device_id, start, end, page_size=1000) \\
+            .assert_not_empty() \\
+            .assert_range("value", min_value=0) \\
+            .assert_monotonic_time() \\
+            .assert_no_gaps("5min")
+
+    Every assertion returns the frame itself, the same as the ApiResponse assertions.
+    """
+
+    # the column names which are recognized as the time and the device id if they are not given
+    TIME_COLUMNS = ("timestamp", "time", "dataTime", "createTime", "ts")
+    DEVICE_COLUMNS = ("deviceId", "device_id")
+
+    def __init__(self, frame, time_column=None, device_column=None):
+        """
+        :param frame: the typed pandas DataFrame
+        :param time_column: (optional) the name of the time column, found from TIME_COLUMNS by default
+        :param device_column: (optional) the name of the device id column, found from DEVICE_COLUMNS by default
+        """
+        self.frame = frame
+        self.time_column = time_column or self._find(frame, self.TIME_COLUMNS)
+        self.device_column = device_column or self._find(frame, self.DEVICE_COLUMNS)
+
+    @classmethod
+    def from_records(cls, records, time_column=None, device_column=None, device_id=None):
+        """
+        :param records: list of dict
+        :param time_column: (optional) the name of the time column
+        :param device_column: (optional) the name of the device id column
+        :param device_id: (optional) added as the device id column if the records don't have one
+        :return: DeviceFrame
+        """
+        return cls.from_pages([records], time_column, device_column, device_id)
+
+    @classmethod
+    def from_pages(cls, pages, time_column=None, device_column=None, device_id=None):
+        """
+        build the frame page by page, so the records of one page are released once they are converted
+        :param pages: iterable of records lists, e.g. Paginator.iter_pages()
+        :return: DeviceFrame
+        """
+        frames = []
+        for records in pages:
+            if len(records) > 0:
+                frames.append(cls._typed(pd.DataFrame.from_records(records), time_column))
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        device_column = device_column or cls._find(frame, cls.DEVICE_COLUMNS)
+        if device_column is None and device_id is not None:
+            device_column = cls.DEVICE_COLUMNS[0]
+            frame[device_column] = str(device_id)
+        if device_column is not None and device_column in frame:
+            # categorize once after concat, the categories of the pages are not the same
+            frame[device_column] = frame[device_column].astype(str).astype("category")
+        return cls(frame, time_column, device_column)
+
+    @classmethod
+    def from_response(cls, response, time_column=None, device_column=None, device_id=None):
+        """
+        :param response: ApiResponse of findDeviceData.json
+        :return: DeviceFrame
+        """
+        records, _ = Paginator.page_records(response.body)
+        return cls.from_records(records, time_column, device_column, device_id)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def assert_not_empty(self):
+        assert len(self.frame) > 0, "Expected some device data records, but actually there is no one"
+        return self
+
+    def assert_columns(self, *columns):
+        """
+        Assert the frame has all the columns
+        :return: the frame itself
+        """
+        missing = [column for column in columns if column not in self.frame]
+        assert not missing, "Expected the columns " + str(missing) + " in the device data, but actually are " + \
+                            str(list(self.frame.columns))
+        return self
+
+    def assert_range(self, column, min_value=None, max_value=None, allow_null=False):
+        """
+        Assert every value of the column is in [min_value, max_value], the values of a text column are compared
+        as numbers, a value which is not a number is a failure
+        :param column: the column name
+        :param min_value: (optional) the min value, included
+        :param max_value: (optional) the max value, included
+        :param allow_null: if False, a missing value is a failure too
+        :return: the frame itself
+        """
+        self.assert_columns(column)
+        series = self.frame[column]
+        invalid = series.isna() if not allow_null else pd.Series(False, index=series.index)
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            # e.g. the numbers and the texts are mixed, the comparison of them raises TypeError
+            series = self._to_numbers(series)
+            invalid |= series.isna() & self.frame[column].notna()
+        if min_value is not None:
+            invalid |= series < min_value
+        if max_value is not None:
+            invalid |= series > max_value
+        count = int(invalid.sum())
+        assert count == 0, str(count) + " values of " + column + " are not numbers or out of [" + str(min_value) + \
+            ", " + str(max_value) + "], the first ones >>>\n" + self._sample(invalid)
+        return self
+
+    def assert_monotonic_time(self, strict=False):
+        """
+        Assert the time of the records of every device is increasing in the order they are received
+        :param strict: if True, two records with the same time is a failure too
+        :return: the frame itself
+        """
+        diffs = self._time_diffs()
+        invalid = diffs <= pd.Timedelta(0) if strict else diffs < pd.Timedelta(0)
+        count = int(invalid.sum())
+        assert count == 0, str(count) + " records are earlier than the previous one of the device, " \
+                                        "the first ones >>>\n" + self._sample(invalid)
+        return self
+
+    def gaps(self, max_gap):
+        """
+        find the gaps between two consecutive records of a device which are longer than max_gap
+        :param max_gap: seconds, or a pandas time delta string, e.g. "5min"
+        :return: DataFrame of device, start, end and duration of the gaps
+        """
+        max_gap = pd.Timedelta(max_gap) if isinstance(max_gap, str) else pd.Timedelta(seconds=max_gap)
+        frame = self._sorted()
+        diffs = self._time_diffs(frame)
+        invalid = diffs > max_gap
+        gaps = pd.DataFrame({
+            "start": frame[self.time_column].shift(1)[invalid],
+            "end": frame[self.time_column][invalid],
+            "duration": diffs[invalid],
+        })
+        if self.device_column is not None:
+            gaps.insert(0, "device", frame[self.device_column][invalid])
+        return gaps.reset_index(drop=True)
+
+    def assert_no_gaps(self, max_gap):
+        """
+        Assert there is no gap between the records of a device which is longer than max_gap
+        :param max_gap: seconds, or a pandas time delta string, e.g. "5min"
+        :return: the frame itself
+        """
+        gaps = self.gaps(max_gap)
+        assert gaps.empty, str(len(gaps)) + " gaps are longer than " + str(max_gap) + " >>>\n" + \
+            gaps.head(10).to_string()
+        return self
+
+    def aggregate(self, column, by=None, freq=None, funcs=("count", "min", "max", "mean", "sum")):
+        """
+        :param column: the measure column
+        :param by: (optional) the column to group by, e.g. the device column
+        :param freq: (optional) resample the time column by this frequency, e.g. "1h"
+        :param funcs: the aggregate functions
+        :return: DataFrame of the aggregates, or Series if there is no group
+        """
+        self.assert_columns(column)
+        keys = []
+        if by is not None:
+            keys.append(by)
+        if freq is not None:
+            keys.append(pd.Grouper(key=self.time_column, freq=freq))
+        if not keys:
+            return self.frame[column].agg(list(funcs))
+        return self.frame.groupby(keys, observed=True)[column].agg(list(funcs))
+
+    def assert_aggregate(self, column, func, expected=None, min_value=None, max_value=None, by=None):
+        """
+        Assert an aggregate of the column, e.g. the sum of peopleCnt, for the whole frame or every group
+        :param column: the measure column
+        :param func: the aggregate function name, e.g. "sum", "mean", "count"
+        :param expected: (optional) the expected value
+        :param min_value: (optional) the min value, included
+        :param max_value: (optional) the max value, included
+        :param by: (optional) the column to group by, every group should match
+        :return: the frame itself
+        """
+        values = self.aggregate(column, by=by, funcs=(func,))[func]
+        values = values if isinstance(values, pd.Series) else pd.Series([values], index=["all"])
+        invalid = pd.Series(False, index=values.index)
+        if expected is not None:
+            invalid |= values != expected
+        if min_value is not None:
+            invalid |= values < min_value
+        if max_value is not None:
+            invalid |= values > max_value
+        assert not invalid.any(), "Expected the " + func + " of " + column + " is " + \
+            (str(expected) if expected is not None else "in [" + str(min_value) + ", " + str(max_value) + "]") + \
+            ", but actually >>>\n" + values[invalid].head(10).to_string()
+        return self
+
+    @classmethod
+    def _typed(cls, frame, time_column=None):
+        """
+        parse the time column and convert the numeric text columns to numbers
+        """
+        time_column = time_column or cls._find(frame, cls.TIME_COLUMNS)
+        for column in frame.columns:
+            if column == time_column:
+                frame[column] = cls._to_time(frame[column])
+            elif column not in cls.DEVICE_COLUMNS and (pd.api.types.is_object_dtype(frame[column]) or
+                                                       pd.api.types.is_string_dtype(frame[column])):
+                try:
+                    numbers = pd.to_numeric(frame[column], errors="coerce")
+                except (TypeError, ValueError):
+                    # nested values, e.g. dict or list
+                    continue
+                # only if every value is a number, the ids and the texts stay as they are
+                if numbers.notna().sum() == frame[column].notna().sum():
+                    frame[column] = numbers
+        return frame
+
+    @staticmethod
+    def _to_numbers(series):
+        """
+        :return: the series of numbers, NaN for the values which are not numbers
+        """
+        try:
+            return pd.to_numeric(series, errors="coerce")
+        except (TypeError, ValueError):
+            # nested values, e.g. dict or list
+            return pd.to_numeric(series.map(lambda value: value if pd.api.types.is_scalar(value) else None),
+                                 errors="coerce")
+
+    @staticmethod
+    def _to_time(series):
+        numbers = pd.to_numeric(series, errors="coerce")
+        if numbers.notna().sum() == series.notna().sum():
+            # epoch seconds or milliseconds
+            unit = "ms" if numbers.abs().max() > 1e11 else "s"
+            return pd.to_datetime(numbers, unit=unit, utc=True)
+        return pd.to_datetime(series, utc=True, errors="coerce")
+
+    @staticmethod
+    def _find(frame, names):
+        for name in names:
+            if name in frame:
+                return name
+        return None
+
+    def _sorted(self):
+        keys = [self.device_column, self.time_column] if self.device_column is not None else [self.time_column]
+        return self.frame.sort_values(keys, kind="mergesort")
+
+    def _time_diffs(self, frame=None):
+        assert self.time_column is not None, "There is no time column in the device data: " + \
+                                             str(list(self.frame.columns))
+        frame = self.frame if frame is None else frame
+        if self.device_column is None:
+            return frame[self.time_column].diff()
+        return frame.groupby(self.device_column, observed=True)[self.time_column].diff()
+
+    def _sample(self, mask):
+        return self.frame[mask].head(10).to_string()
@@ -0,0 +1,237 @@
+import asyncio
+import heapq
+import itertools
+import queue
+import threading
+import time
+from libs.common.async_transport import AsyncHttpTransport, AsyncLimiter
+from libs.common.log import logger
+from libs.utils.misc import Misc
+
+
+class Subscription:
+    """
+    One watched (device_id, interface_type) of DevicePoller, with its own polling interval
+    """
+
+    def __init__(self, device_id, interface_type, params=None, once=True, interval=1.0):
+        """
+        :param device_id: the device id
+        :param interface_type: one of InterfaceType
+        :param params: (optional) dict of the extra request params
+        :param once: if True, the subscription is finished by the first response with data,
+            otherwise it is polled until the poller stops
+        :param interval: seconds, the first polling interval
+        """
+        self.device_id = device_id
+        self.interface_type = interface_type
+        self.params = dict(params or {})
+        self.once = once
+        self.interval = interval
+        self.polls = 0
+        self.results = 0
+        self.done = False
+        # the request is built by the first poll and sent again by the next ones
+        self.request = None
+
+    def __repr__(self):
+        return "(" + str(self.device_id) + ", " + str(self.interface_type) + ")"
+
+
+class _RateLimiter:
+    """
+    space the requests of the event loop, so no more than "rate" requests are started per second
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        if self.interval <= 0:
+            return
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class DevicePoller:
+    """
+    Watch many devices on one event loop instead of one blocking 304 polling loop per device, e.g.
+
+        poller = DevicePoller(lambda sub: api.device_data_request(token, sub.device_id, sub.interface_type))
+        poller.subscribe(device_1, InterfaceType.AlertData)
+        poller.subscribe(device_2, InterfaceType.RadarData)
+        for subscription, response in poller.poll(timeout=300):
+            ...
+
+    The subscriptions are kept in a heap ordered by their next polling time. The interval of a subscription
+    grows by "backoff" after every 304 up to max_interval, and goes back to min_interval after data arrives.
+    All the subscriptions share a global rate cap and a cap of the requests in flight.
+    The results are delivered as soon as they arrive.
+    The defaults are configured in the [poller] section of config.cfg.
+    """
+
+    DEFAULTS = {
+        # seconds, the first and the shortest polling interval
+        "min_interval": 1.0,
+        # seconds, the longest polling interval of an idle device
+        "max_interval": 30.0,
+        # the interval is multiplied by it after every 304
+        "backoff": 1.5,
+        # the max number of requests started per second by all the subscriptions, 0 means no limit
+        "rate": 10.0,
+        "max_in_flight": 20,
+    }
+
+    def __init__(self, request_factory, is_ready=None, **options):
+        """
+        :param request_factory: callable(subscription) which returns the built ApiRequest of the subscription,
+            it is called once and the request is sent again by every poll
+        :param is_ready: (optional) callable(response) which returns True if the response has data,
+            default is a response whose body code is not 304
+        :param options: (optional) to override the DEFAULTS, e.g. rate=5
+        """
+        config = Misc.load_config_section("poller", self.DEFAULTS)
+        for key, value in options.items():
+            if key not in config:
+                raise KeyError("Unknown poller option: " + key)
+            config[key] = value
+        self.request_factory = request_factory
+        self.is_ready = is_ready or self.has_data
+        self.min_interval = config["min_interval"]
+        self.max_interval = max(config["max_interval"], self.min_interval)
+        self.backoff = config["backoff"]
+        self.rate = config["rate"]
+        self.max_in_flight = config["max_in_flight"]
+        self.subscriptions = []
+
+    @staticmethod
+    def has_data(response):
+        """
+        :param response: ApiResponse
+        :return: False if the server answers 304 (no new data yet) in the body code
+        """
+        if "999999" in response.text:
+            return True
+        try:
+            return response.body.get("code") != 304
+        except (ValueError, AttributeError):
+            return True
+
+    def subscribe(self, device_id, interface_type, once=True, **params):
+        """
+        :param device_id: the device id
+        :param interface_type: one of InterfaceType
+        :param once: if True, stop polling the device after the first response with data
+        :param params: the extra request params
+        :return: the Subscription
+        """
+        subscription = Subscription(device_id, interface_type, params, once, self.min_interval)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    async def watch(self, timeout=None):
+        """
+        poll the subscriptions on the running event loop until all of them are done or the timeout is reached
+        :param timeout: (optional) seconds
+        :return: async generator of (subscription, ApiResponse)
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        limiter = AsyncLimiter(self.max_in_flight)
+        rate = _RateLimiter(self.rate)
+        counter = itertools.count()
+        now = time.monotonic()
+        # (next polling time, sequence, subscription)
+        timers = [(now, next(counter), subscription) for subscription in self.subscriptions if not subscription.done]
+        heapq.heapify(timers)
+        # task -> subscription
+        pending = {}
+        try:
+            while timers or pending:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    logger.warning("=== polling timeout, still waiting for " +
+                                   str([subscription for subscription in self.subscriptions
+                                        if not subscription.done]))
+                    return
+                while timers and timers[0][0] <= now:
+                    _, _, subscription = heapq.heappop(timers)
+                    task = asyncio.ensure_future(self._poll_once(subscription, limiter, rate))
+                    pending[task] = subscription
+                delay = timers[0][0] - now if timers else None
+                if deadline is not None:
+                    delay = deadline - now if delay is None else min(delay, deadline - now)
+                if not pending:
+                    await asyncio.sleep(max(delay, 0))
+                    continue
+                finished, _ = await asyncio.wait(list(pending), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    subscription = pending.pop(task)
+                    subscription.polls += 1
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        logger.warning("=== polling " + repr(subscription) + " failed: " + repr(e))
+                        response = None
+                    if response is not None and self.is_ready(response):
+                        subscription.results += 1
+                        subscription.interval = self.min_interval
+                        subscription.done = subscription.once
+                        yield subscription, response
+                    else:
+                        subscription.interval = min(subscription.interval * self.backoff, self.max_interval)
+                    if not subscription.done:
+                        heapq.heappush(timers, (time.monotonic() + subscription.interval, next(counter),
+                                                subscription))
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def poll(self, timeout=None):
+        """
+        the blocking version of watch for the sync tests, the event loop runs in a background thread
+        :param timeout: (optional) seconds
+        :return: generator of (subscription, ApiResponse)
+        """
+        results = queue.Queue()
+        end = object()
+        state = {}
+
+        async def pump():
+            state["loop"] = asyncio.get_running_loop()
+            state["task"] = asyncio.current_task()
+            try:
+                async for item in self.watch(timeout):
+                    results.put(item)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                results.put(e)
+            finally:
+                await AsyncHttpTransport.close()
+                results.put(end)
+
+        thread = threading.Thread(target=asyncio.run, args=(pump(),), name="DevicePoller", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # the caller stops early, cancel the polling
+            if thread.is_alive() and "loop" in state:
+                state["loop"].call_soon_threadsafe(state["task"].cancel)
+            thread.join()
+
+    async def _poll_once(self, subscription, limiter, rate):
+        await rate.wait()
+        if subscription.request is None:
+            subscription.request = self.request_factory(subscription)
+        return await subscription.request.send_async(limiter=limiter)
@@ -0,0 +1,146 @@
+import json
+import re
+from libs.utils.misc import Misc
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib json is used without it
+    orjson = None
+
+
+class JsonCodec:
+    """
+    The json encoder and decoder of the request bodies, the response bodies and the logs. orjson is used when it
+    is installed, otherwise the stdlib json, the backend can be forced in the [json] section of config.cfg.
+    The values which orjson doesn't support, e.g. the integers bigger than 64 bits or NaN, are handled by the
+    stdlib json. orjson reads the integers bigger than 64 bits as floats, so the texts which have a number of
+    19 digits or more are parsed by the stdlib json to keep the exact integers.
+    """
+
+    config = Misc.load_config_section("json", {
+        # auto, orjson or json
+        "backend": "auto",
+    })
+    backend = "orjson" if orjson is not None and config["backend"].lower() in ("auto", "orjson") else "json"
+    # the shortest integers out of the 64 bits range, -9223372036854775809 has 19 digits
+    _long_number = re.compile(r"\d{19}")
+    _long_number_bytes = re.compile(rb"\d{19}")
+
+    @classmethod
+    def use(cls, backend):
+        """
+        switch the backend, e.g. to compare the results of both
+        :param backend: "orjson" or "json"
+        """
+        if backend == "orjson" and orjson is None:
+            raise ImportError("orjson is not installed, please install it: pip install orjson")
+        if backend not in ("orjson", "json"):
+            raise ValueError("Unknown json backend: " + str(backend))
+        cls.backend = backend
+
+    @classmethod
+    def loads(cls, text):
+        """
+        :param text: str, bytes or bytearray of the json
+        :return: the parsed value, ValueError if it is not a valid json
+        """
+        if cls.backend == "orjson" and not cls._has_long_number(text):
+            try:
+                return orjson.loads(text)
+            except ValueError:
+                # e.g. NaN, let the stdlib json parse it or raise the error
+                pass
+        return json.loads(text)
+
+    @classmethod
+    def _has_long_number(cls, text):
+        """
+        :return: True if the text may have an integer which orjson reads as a float
+        """
+        if isinstance(text, str):
+            return cls._long_number.search(text) is not None
+        return cls._long_number_bytes.search(text) is not None
+
+    @classmethod
+    def dumps_bytes(cls, value):
+        """
+        encode the value straight to the compact utf-8 bytes of the request body
+        :return: bytes
+        """
+        if cls.backend == "orjson":
+            try:
+                return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # e.g. an integer bigger than 64 bits, or a type which is only supported by json
+                pass
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def dumps(cls, value):
+        """
+        :return: the compact json text
+        """
+        return cls.dumps_bytes(value).decode("utf-8")
+
+    @classmethod
+    def pretty(cls, value):
+        """
+        the indented json text of the logs, the non-ascii characters are not escaped
+        :return: str
+        """
+        if cls.backend == "orjson":
+            try:
+                return orjson.dumps(value, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+            except TypeError:
+                pass
+        return json.dumps(value, ensure_ascii=False, indent=4)
+
+    @classmethod
+    def try_loads(cls, text):
+        """
+        parse the text if it is a json, it is the one pass check of the bodies which may be a json or not
+        :param text: str or bytes
+        :return: (True, the parsed value), or (False, None) if it is not a json
+        """
+        try:
+            return True, cls.loads(text)
+        except (ValueError, TypeError):
+            return False, None
+
+    @classmethod
+    def to_json(cls, value):
+        """
+        convert a value to the plain json types, the same result as loads(dumps(value)) without the round trip:
+        the tuples become lists, the keys become strings, the subclasses of str, int and float become the base types
+        :return: the converted value, TypeError if the value is not json serializable
+        """
+        value_type = type(value)
+        if value_type is str or value_type is int or value_type is float or value_type is bool or value is None:
+            return value
+        if isinstance(value, dict):
+            return {cls._key(key): cls.to_json(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls.to_json(item) for item in value]
+        if isinstance(value, str):
+            return str(value)
+        if isinstance(value, int):
+            return int(value)
+        if isinstance(value, float):
+            return float(value)
+        raise TypeError("Object of type " + value_type.__name__ + " is not JSON serializable")
+
+    @staticmethod
+    def _key(key):
+        if isinstance(key, str):
+            return str(key)
+        if key is True:
+            return "true"
+        if key is False:
+            return "false"
+        if key is None:
+            return "null"
+        if isinstance(key, int):
+            return int.__repr__(key)
+        if isinstance(key, float):
+            return float.__repr__(key)
+        raise TypeError("keys must be str, int, float, bool or None, not " + type(key).__name__)
@@ -0,0 +1,340 @@
+import collections
+import copy
+import hashlib
+import json
+import re
+import threading
+
+
+class _Stop(Exception):
+    """
+    stop the validation at the first error in the fail fast mode
+    """
+
+
+class ExpectedSchema:
+    """
+    An expected json compiled once into a reusable validator, the rules of JsonUtils.dict_compare:
+
+    - the expected json is a subset of the actual one: every field of the expected json should be in the actual
+      json, unless its expected value is None, the extra fields of the actual json are not checked
+    - an expected value is a regular expression which should match the whole actual value, e.g. "\\d+"
+    - the values of different types are not compared, e.g. None means any value
+    - the lists are compared item by item, the expected items after the end of the actual list are not checked
+    - with ignore_order, an expected item passes if it matches any actual item, the other expected items are
+      compared with the actual items which match no expected item, each with the most similar one, the rest of
+      them are not checked like the items after the end of an ordered list
+    - exclude_paths are DeepDiff style paths, e.g. "root['result']['idToken']", which are not compared
+
+    The compiled tree holds the patterns (compiled once), the excluded paths and the expected type of every node,
+    so a validation is one walk of the actual json. A branch is compiled when it is checked the first time.
+    The identical branches are skipped by one equality check, and with ignore_order the list items are paired by
+    the canonical digests of their subtrees first, only the unpaired ones are compared one by one.
+    The cached schemas are shared by the threads, a lazily compiled branch is assigned by one attribute, so a
+    thread sees either nothing or the whole branch.
+    The schemas are cached by the content hash of the expected json and the options, e.g.
+
+        schema = ExpectedSchema.get(expected_body, ignore_order=True)
+        for response in responses:
+            schema.assert_match(response)
+    """
+
+    PATH_PART = re.compile(r"\[(?:'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"|(-?\d+))\]")
+
+    CACHE_SIZE = 256
+    _cache = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, expected, ignore_order=False, ignore_string_case=False, exclude_paths=None):
+        """
+        :param expected: the expected json
+        :param ignore_order: ignore the order of the list items
+        :param ignore_string_case: compare the strings and match the patterns case insensitively
+        :param exclude_paths: (optional) list of DeepDiff style paths which are not compared
+        """
+        # a copy, the branches are compiled lazily and the schema is cached by the content at this time,
+        # so the changes of the caller's json later don't reach the cached schema
+        self.expected = copy.deepcopy(expected)
+        self.ignore_order = ignore_order
+        self.flags = re.I if ignore_string_case else 0
+        self.excluded = {self.parse_path(path) for path in exclude_paths or []}
+        self._root = self.compile(self.expected, ())
+
+    @classmethod
+    def get(cls, expected, ignore_order=False, ignore_string_case=False, exclude_paths=None):
+        """
+        get the compiled schema from the cache, compile it if missing
+        :return: ExpectedSchema
+        """
+        key = cls.content_hash(expected, ignore_order, ignore_string_case, exclude_paths)
+        with cls._cache_lock:
+            schema = cls._cache.get(key)
+            if schema is not None:
+                cls._cache.move_to_end(key)
+                return schema
+        schema = cls(expected, ignore_order=ignore_order, ignore_string_case=ignore_string_case,
+                     exclude_paths=exclude_paths)
+        with cls._cache_lock:
+            cls._cache[key] = schema
+            if len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return schema
+
+    @staticmethod
+    def content_hash(expected, *options):
+        content = json.dumps([expected, options], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def parse_path(cls, path):
+        """
+        :param path: DeepDiff style path, e.g. "root['data'][0]['value']"
+        :return: tuple of the keys and the indexes, e.g. ("data", 0, "value")
+        """
+        path = str(path)
+        if path.startswith("root"):
+            path = path[4:]
+        parts = []
+        for match in cls.PATH_PART.finditer(path):
+            if match.group(3) is not None:
+                parts.append(int(match.group(3)))
+            else:
+                parts.append((match.group(1) if match.group(1) is not None else match.group(2))
+                             .replace("\\'", "'").replace('\\"', '"'))
+        return tuple(parts)
+
+    @staticmethod
+    def format_path(path):
+        """
+        :param path: tuple of the keys and the indexes
+        :return: DeepDiff style path, e.g. "root['data'][0]"
+        """
+        return "root" + "".join("[" + repr(part) + "]" for part in path)
+
+    def validate(self, actual, fail_fast=False):
+        """
+        :param actual: the actual json, or an ApiResponse whose body is validated
+        :param fail_fast: stop at the first error
+        :return: list of the error messages, empty if the actual json matches
+        """
+        if hasattr(actual, "body") and not isinstance(actual, (dict, list)):
+            actual = actual.body
+        errors = []
+        try:
+            self._root.check(actual, _Context(errors, fail_fast, self))
+        except _Stop:
+            pass
+        return errors
+
+    def assert_match(self, actual, fail_fast=False):
+        """
+        Assert the actual json or the body of the ApiResponse matches the schema
+        :return: the schema itself
+        """
+        errors = self.validate(actual, fail_fast)
+        if len(errors) > 0:
+            raise AssertionError(errors)
+        return self
+
+    def digest(self, value):
+        """
+        the canonical form of a subtree, the digests of two subtrees are equal only if the subtrees are, so the
+        items paired by their digests are identical, not only of the same hash. The digests of the dict items and
+        of the unordered list items don't depend on their order
+        """
+        if isinstance(value, dict):
+            return "dict", frozenset((key, self.digest(item)) for key, item in value.items())
+        if isinstance(value, list):
+            digests = [self.digest(item) for item in value]
+            return "list", frozenset(collections.Counter(digests).items()) if self.ignore_order else tuple(digests)
+        if self.flags and isinstance(value, str):
+            return "str", value.lower()
+        return type(value).__name__, value
+
+    def compile(self, expected, path):
+        """
+        :param expected: the expected value of the path
+        :param path: tuple of the keys and the indexes
+        :return: the node of the compiled tree, its children are compiled when they are checked the first time,
+            so the branches which are always identical are never compiled
+        """
+        if expected is None or path in self.excluded:
+            return _ANY
+        if isinstance(expected, dict):
+            return _DictNode(expected, path, self)
+        if isinstance(expected, list):
+            return _UnorderedListNode(expected, path, self) if self.ignore_order else _ListNode(expected, path, self)
+        return _ValueNode(expected, path, self.flags)
+
+
+class _Context:
+    """
+    the state of one validation
+    """
+
+    __slots__ = ("errors", "fail_fast", "schema")
+
+    def __init__(self, errors, fail_fast, schema):
+        self.errors = errors
+        self.fail_fast = fail_fast
+        self.schema = schema
+
+    def error(self, message):
+        self.errors.append(message)
+        if self.fail_fast:
+            raise _Stop()
+
+
+class _AnyNode:
+    """
+    None or an excluded path, any value matches
+    """
+
+    def check(self, actual, context):
+        pass
+
+
+_ANY = _AnyNode()
+
+
+class _Node:
+
+    def __init__(self, expected, path):
+        self.expected = expected
+        self.type = type(expected)
+        self.path = path
+
+    def check(self, actual, context):
+        # the type changes are not checked, and the identical branches are skipped
+        if type(actual) is self.type and actual != self.expected:
+            self.check_value(actual, context)
+
+    def check_value(self, actual, context):
+        raise NotImplementedError()
+
+
+class _DictNode(_Node):
+
+    def __init__(self, expected, path, schema):
+        super().__init__(expected, path)
+        self.schema = schema
+        # list of (key, node, required)
+        self.children = None
+
+    def check_value(self, actual, context):
+        if self.children is None:
+            self.children = [(key, self.schema.compile(value, self.path + (key,)),
+                              value is not None and self.path + (key,) not in self.schema.excluded)
+                             for key, value in self.expected.items()]
+        for key, node, required in self.children:
+            if key in actual:
+                node.check(actual[key], context)
+            elif required:
+                context.error("Field in the response body is missing: " +
+                              ExpectedSchema.format_path(self.path + (key,)))
+
+
+class _ListNode(_Node):
+
+    def __init__(self, expected, path, schema):
+        super().__init__(expected, path)
+        self.schema = schema
+        self.items = None
+
+    def check_value(self, actual, context):
+        if self.items is None:
+            self.items = [self.schema.compile(item, self.path + (index,)) for index, item in enumerate(self.expected)]
+        # the expected items after the end of the actual list are not checked
+        for node, item in zip(self.items, actual):
+            node.check(item, context)
+
+
+class _UnorderedListNode(_ListNode):
+
+    def __init__(self, expected, path, schema):
+        super().__init__(expected, path, schema)
+        # (items, digests), they are assigned together for the threads sharing the schema
+        self.compiled = None
+
+    def check_value(self, actual, context):
+        if self.compiled is None:
+            items = [self.schema.compile(item, self.path + (index,)) for index, item in enumerate(self.expected)]
+            self.compiled = (items, [self.schema.digest(item) for item in self.expected])
+        items, digests = self.compiled
+        # the identical items are matched by their digests
+        actual_digests = [context.schema.digest(item) for item in actual]
+        expected_digests = set(digests)
+        used = {position for position, digest in enumerate(actual_digests) if digest in expected_digests}
+        present = set(actual_digests)
+        # the expected items with patterns or "any value" fields are compared one by one
+        unmatched = []
+        for position, digest in enumerate(digests):
+            node = items[position]
+            if digest in present or node is _ANY:
+                continue
+            for candidate, item in enumerate(actual):
+                if type(item) is node.type and self._is_matching(node, item, context.schema):
+                    used.add(candidate)
+                    break
+            else:
+                unmatched.append(node)
+        # the rest are compared field by field with the most similar actual items which match nothing
+        rest = [item for position, item in enumerate(actual) if position not in used]
+        for node in unmatched:
+            if not rest:
+                break
+            best = min(range(len(rest)), key=lambda candidate: self._distance(node, rest[candidate], context.schema))
+            item = rest.pop(best)
+            if type(item) is node.type:
+                node.check(item, context)
+            elif not (isinstance(node, _ValueNode) and node.pattern is not None and node.pattern.match(str(item))):
+                # an item of another type is paired like DeepDiff does, only its text can match the pattern
+                context.error("Field in the response body is not matching: " + ExpectedSchema.format_path(node.path) +
+                              ", expected: < " + str(node.expected) + " > but actually: < " + str(item) + " >")
+
+    @staticmethod
+    def _distance(node, item, schema):
+        """
+        the items of the same type first, then the ones with fewer errors
+        """
+        errors = []
+        node.check(item, _Context(errors, False, schema))
+        return type(item) is not node.type, len(errors)
+
+    @staticmethod
+    def _is_matching(node, item, schema):
+        errors = []
+        try:
+            node.check(item, _Context(errors, True, schema))
+        except _Stop:
+            pass
+        return not errors
+
+
+class _ValueNode(_Node):
+
+    _NOT_COMPILED = object()
+
+    def __init__(self, expected, path, flags):
+        super().__init__(expected, path)
+        self.flags = flags
+        self.lower = expected.lower() if flags and isinstance(expected, str) else None
+        # most of the values are matched by equality, the pattern is compiled by the first mismatch and kept
+        self._pattern = self._NOT_COMPILED
+
+    @property
+    def pattern(self):
+        if self._pattern is self._NOT_COMPILED:
+            try:
+                self._pattern = re.compile("^" + str(self.expected) + "$", self.flags)
+            except re.error:
+                # not a valid regular expression, only the equal value matches
+                self._pattern = None
+        return self._pattern
+
+    def check_value(self, actual, context):
+        if self.lower is not None and self.lower == actual.lower():
+            return
+        if self.pattern is None or self.pattern.match(str(actual)) is None:
+            context.error("Field in the response body is not matching: " + ExpectedSchema.format_path(self.path) +
+                          ", expected: < " + str(self.expected) + " > but actually: < " + str(actual) + " >")
@@ -0,0 +1,88 @@
+from libs.utils.json_compare import ExpectedSchema
+from libs.utils.json_utils import JsonUtils
+
+
+class PathIndex:
+    """
+    A json walked once into a dict of path -> value, for the tests which look up many fields of one response, e.g.
+
+        index = response.path_index()
+        assert index["root['result']['code']"] == 200
+        assert index.get(("data", 0, "deviceId")) == device_id
+        alerts = index.find("alertType")
+
+    The paths are the tuples of the keys and the indexes, or the DeepDiff style paths, e.g. "root['data'][0]".
+    The containers are indexed too, so a lookup of a dict or a list returns the whole subtree.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, value, max_depth=None, max_items=None):
+        """
+        :param value: the json, or an ApiResponse whose body is indexed
+        :param max_depth: (optional) the containers deeper than it are indexed as values and not walked
+        :param max_items: (optional) the max number of indexed paths, the rest of the json is not indexed
+        """
+        if hasattr(value, "body") and not isinstance(value, (dict, list)):
+            value = value.body
+        self.value = value
+        self.values = dict(JsonUtils.flatten(value, max_depth=max_depth, max_items=max_items, containers=True))
+        # the last key -> list of paths, it is built by the first find
+        self._keys = None
+
+    @staticmethod
+    def to_path(path):
+        """
+        :param path: tuple or list of the keys and the indexes, or a DeepDiff style path
+        :return: tuple of the keys and the indexes
+        """
+        if isinstance(path, tuple):
+            return path
+        if isinstance(path, list):
+            return tuple(path)
+        return ExpectedSchema.parse_path(path)
+
+    def get(self, path, default=None):
+        """
+        :param path: the path of the value
+        :param default: the value of a missing path
+        :return: the value of the path
+        """
+        return self.values.get(self.to_path(path), default)
+
+    def __getitem__(self, path):
+        value = self.values.get(self.to_path(path), self._MISSING)
+        if value is self._MISSING:
+            raise KeyError("Field in the response body is missing: " + ExpectedSchema.format_path(self.to_path(path)))
+        return value
+
+    def __contains__(self, path):
+        return self.to_path(path) in self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def items(self):
+        return self.values.items()
+
+    def find(self, key):
+        """
+        :param key: a dict key or a list index
+        :return: list of (path, value) of all the fields with the key, in the order of the json
+        """
+        if self._keys is None:
+            self._keys = {}
+            for path in self.values:
+                if path:
+                    self._keys.setdefault(path[-1], []).append(path)
+        return [(path, self.values[path]) for path in self._keys.get(key, [])]
+
+    def find_values(self, key):
+        """
+        :param key: a dict key or a list index
+        :return: list of the values of all the fields with the key
+        """
+        return [value for _, value in self.find(key)]
@@ -0,0 +1,330 @@
+import collections
+import json
+import re
+import threading
+
+
+class JsonPath:
+    """
+    A JSONPath expression parsed once into a list of steps, e.g.
+
+        value = JsonPath.get("root['result']['idToken']").first(response.body)
+        values = JsonPath.get("$.data[*].value").find(response.body)
+        alerts = JsonPath.get("$.data[?(@.alertType == 1 && @.level >= 2)].deviceId").find_all(bodies)
+
+    The supported syntax:
+
+    - $ or root for the document, DeepDiff style paths are JSONPath expressions too
+    - .key, ['key'], ["key"], [0], [-1], the union ['a','b'] or [0,2] and the slice [1:3]
+    - the wildcards .* and [*], and the recursive descent ..key or ..*
+    - the filters [?(@.key)], [?(@.key op value)] with op of ==, !=, <, <=, >, >=, =~ /regex/,
+      joined by && or ||, the value is a json literal or a quoted string
+
+    A path of plain keys and indexes is resolved by one direct walk. The compiled paths are cached in an LRU by
+    the expression, so the same expression is parsed only once.
+    """
+
+    TOKEN = re.compile(r"""
+        \.\.(?P<descent>\*|[^.\[\]\s]+)?   # ..key, ..* or .. before a bracket
+        | \.(?P<name>\*|[^.\[\]\s]+)        # .key or .*
+        | \[\s*(?P<bracket>(?:'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\?\((?:[^()]|\([^()]*\))*\)|[^\]'"])*)\s*\]
+        """, re.X)
+    QUOTED = re.compile(r"""'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)\"""")
+    CONDITION = re.compile(r"^\s*@((?:\.[^.\[\]\s=!<>~]+|\[[^\]]*\])*)\s*(?:(==|!=|<=|>=|<|>|=~)\s*(.+?))?\s*$")
+    SLICE = re.compile(r"^(-?\d*):(-?\d*)(?::(-?\d+))?$")
+
+    CACHE_SIZE = 1024
+    _cache = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, expression):
+        """
+        :param expression: the JSONPath expression, e.g. "$.data[*].value" or "root['result']['code']"
+        """
+        self.expression = expression
+        self.steps = self.parse(expression)
+        # the keys of a path without wildcards and filters, it is resolved by a direct walk
+        self.keys = [argument for kind, argument in self.steps] \
+            if all(kind == "key" for kind, _ in self.steps) else None
+
+    @classmethod
+    def get(cls, expression):
+        """
+        get the compiled path from the cache, compile it if missing
+        :param expression: the JSONPath expression, or a compiled JsonPath
+        :return: JsonPath
+        """
+        if isinstance(expression, JsonPath):
+            return expression
+        expression = str(expression)
+        with cls._cache_lock:
+            path = cls._cache.get(expression)
+            if path is not None:
+                cls._cache.move_to_end(expression)
+                return path
+        path = cls(expression)
+        with cls._cache_lock:
+            cls._cache[expression] = path
+            if len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return path
+
+    @classmethod
+    def parse(cls, expression):
+        """
+        :param expression: the JSONPath expression
+        :return: list of (kind, argument), the kinds are key, keys, wildcard, slice, filter and descent
+        """
+        text = expression.strip()
+        if text.startswith("$"):
+            text = text[1:]
+        elif text.startswith("root"):
+            text = text[4:]
+        elif text and text[0] not in ".[":
+            # a relative path, e.g. "data[0].value"
+            text = "." + text
+        steps = []
+        position = 0
+        while position < len(text):
+            match = cls.TOKEN.match(text, position)
+            if match is None:
+                raise ValueError("Invalid JSONPath: " + expression + ", at: " + text[position:])
+            position = match.end()
+            if match.group("bracket") is not None:
+                steps.append(cls._parse_bracket(match.group("bracket").strip(), expression))
+            elif match.group("name") is not None:
+                name = match.group("name")
+                steps.append(("wildcard", None) if name == "*" else ("key", name))
+            else:
+                steps.append(("descent", None))
+                name = match.group("descent")
+                if name is not None:
+                    steps.append(("wildcard", None) if name == "*" else ("key", name))
+        if steps and steps[-1][0] == "descent":
+            raise ValueError("Invalid JSONPath: " + expression + ", .. should be followed by a key")
+        return steps
+
+    @classmethod
+    def _parse_bracket(cls, content, expression):
+        if content == "*":
+            return "wildcard", None
+        if content.startswith("?(") and content.endswith(")"):
+            return "filter", cls._parse_filter(content[2:-1], expression)
+        slice_match = cls.SLICE.match(content)
+        if slice_match is not None:
+            start, stop, step = (int(part) if part else None for part in slice_match.groups())
+            return "slice", slice(start, stop, step)
+        keys = [cls._parse_key(part.strip(), expression) for part in cls._split(content, ",")]
+        return ("key", keys[0]) if len(keys) == 1 else ("keys", keys)
+
+    @classmethod
+    def _parse_key(cls, text, expression):
+        match = cls.QUOTED.fullmatch(text)
+        if match is not None:
+            key = match.group(1) if match.group(1) is not None else match.group(2)
+            return key.replace("\\'", "'").replace('\\"', '"')
+        try:
+            return int(text)
+        except ValueError:
+            raise ValueError("Invalid JSONPath: " + expression + ", unknown key: " + text)
+
+    @classmethod
+    def _parse_filter(cls, text, expression):
+        """
+        :return: the conditions as a list of the "or" groups, each of them is a list of (keys, operator, value)
+        """
+        groups = []
+        for group in cls._split(text, "||"):
+            conditions = []
+            for condition in cls._split(group, "&&"):
+                match = cls.CONDITION.match(condition)
+                if match is None:
+                    raise ValueError("Invalid JSONPath filter: " + expression + ", at: " + condition.strip())
+                steps = cls.parse(match.group(1)) if match.group(1) else []
+                if any(kind != "key" for kind, _ in steps):
+                    raise ValueError("Invalid JSONPath filter: " + expression +
+                                     ", only the keys are supported after @")
+                keys = [argument for _, argument in steps]
+                operator, value = match.group(2), match.group(3)
+                if operator == "=~":
+                    value = cls._parse_regex(value)
+                elif operator is not None:
+                    value = cls._parse_literal(value, expression)
+                conditions.append((keys, operator, value))
+            groups.append(conditions)
+        return groups
+
+    @classmethod
+    def _parse_literal(cls, text, expression):
+        if cls.QUOTED.fullmatch(text) is not None:
+            return cls._parse_key(text, expression)
+        try:
+            return json.loads(text)
+        except ValueError:
+            raise ValueError("Invalid JSONPath filter: " + expression + ", unknown value: " + text)
+
+    @classmethod
+    def _parse_regex(cls, text):
+        flags = 0
+        if text.startswith("/") and text.rfind("/") > 0:
+            end = text.rfind("/")
+            flags = re.I if "i" in text[end + 1:] else 0
+            text = text[1:end]
+        else:
+            text = cls._parse_literal(text, text)
+        return re.compile(text, flags)
+
+    @staticmethod
+    def _split(text, separator):
+        """
+        split the text by the separator which is not quoted
+        """
+        parts = []
+        quote = None
+        start = 0
+        index = 0
+        while index < len(text):
+            char = text[index]
+            if quote is not None:
+                if char == "\\":
+                    index += 1
+                elif char == quote:
+                    quote = None
+            elif char in "'\"":
+                quote = char
+            elif text.startswith(separator, index):
+                parts.append(text[start:index])
+                index += len(separator)
+                start = index
+                continue
+            index += 1
+        parts.append(text[start:])
+        return parts
+
+    def find(self, document):
+        """
+        :param document: the json, or an ApiResponse whose body is searched
+        :return: list of the matched values, empty if nothing matches
+        """
+        if hasattr(document, "body") and not isinstance(document, (dict, list)):
+            document = document.body
+        if self.keys is not None:
+            value = self._walk(document, self.keys)
+            return [] if value is _MISSING else [value]
+        nodes = [document]
+        for kind, argument in self.steps:
+            nodes = self._apply(kind, argument, nodes)
+            if not nodes:
+                break
+        return nodes
+
+    def first(self, document, default=None):
+        """
+        :param document: the json, or an ApiResponse
+        :param default: the value if nothing matches
+        :return: the first matched value
+        """
+        values = self.find(document)
+        return values[0] if values else default
+
+    def find_all(self, documents):
+        """
+        :param documents: iterable of the jsons or the ApiResponse
+        :return: list of the matched values of every document
+        """
+        return [self.find(document) for document in documents]
+
+    def first_all(self, documents, default=None):
+        """
+        :param documents: iterable of the jsons or the ApiResponse
+        :param default: the value of a document if nothing matches
+        :return: list of the first matched value of every document
+        """
+        return [self.first(document, default) for document in documents]
+
+    @staticmethod
+    def _walk(value, keys):
+        for key in keys:
+            if isinstance(value, dict):
+                if key not in value:
+                    return _MISSING
+                value = value[key]
+            elif isinstance(value, list):
+                if not isinstance(key, int):
+                    # .0 of the dot notation
+                    if not key.lstrip("-").isdigit():
+                        return _MISSING
+                    key = int(key)
+                if not -len(value) <= key < len(value):
+                    return _MISSING
+                value = value[key]
+            else:
+                return _MISSING
+        return value
+
+    def _apply(self, kind, argument, nodes):
+        result = []
+        if kind == "key" or kind == "keys":
+            keys = [argument] if kind == "key" else argument
+            for node in nodes:
+                for key in keys:
+                    value = self._walk(node, (key,))
+                    if value is not _MISSING:
+                        result.append(value)
+        elif kind == "wildcard":
+            for node in nodes:
+                if isinstance(node, dict):
+                    result.extend(node.values())
+                elif isinstance(node, list):
+                    result.extend(node)
+        elif kind == "slice":
+            for node in nodes:
+                if isinstance(node, list):
+                    result.extend(node[argument])
+        elif kind == "filter":
+            for node in nodes:
+                items = node.values() if isinstance(node, dict) else node if isinstance(node, list) else ()
+                result.extend(item for item in items if self._is_matching(item, argument))
+        else:
+            # the descent, the node itself and all its descendant containers
+            stack = list(reversed(nodes))
+            while stack:
+                node = stack.pop()
+                if isinstance(node, (dict, list)):
+                    result.append(node)
+                    children = node.values() if isinstance(node, dict) else node
+                    stack.extend(child for child in reversed(list(children)) if isinstance(child, (dict, list)))
+        return result
+
+    def _is_matching(self, item, groups):
+        for conditions in groups:
+            for keys, operator, expected in conditions:
+                value = self._walk(item, keys)
+                if value is _MISSING:
+                    break
+                try:
+                    if operator is None:
+                        matched = True
+                    elif operator == "=~":
+                        matched = isinstance(value, str) and expected.search(value) is not None
+                    else:
+                        matched = _OPERATORS[operator](value, expected)
+                except TypeError:
+                    matched = False
+                if not matched:
+                    break
+            else:
+                return True
+        return False
+
+
+_MISSING = object()
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
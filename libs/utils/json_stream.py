@@ -0,0 +1,518 @@
+import codecs
+import json
+import re
+from libs.utils.json_compare import ExpectedSchema
+from libs.utils.json_path import JsonPath
+
+# the states of JsonEventParser, what is expected by the next token
+_VALUE, _ARRAY_START, _MAP_START, _KEY, _COLON, _NEXT, _END = range(7)
+
+_LITERALS = {"true": True, "false": False, "null": None}
+
+_DECODER = json.JSONDecoder()
+
+
+class JsonEventParser:
+    """
+    An incremental json parser, the chunks of the raw bytes are fed in and the events are sent to the handler
+    without building the object tree, e.g.
+
+        for path, event, value in JsonEventParser.iter_events(response.iter_chunks()):
+            ...
+
+    The events are start_map, end_map, start_array, end_array and value (of a string, a number, true, false
+    or null). The path is the list of the keys and the indexes of the value, e.g. ["data", 0, "timestamp"],
+    it is the same list which is changed by the next events, copy it to keep it.
+
+    The tokens are parsed in python, which is much slower than json.loads, so the handler can select how a
+    container is parsed when it starts: WHOLE decodes it by the json module and sends it as one value event,
+    e.g. a record of a big list, SKIP drops it without events, e.g. a part of the json which is not checked.
+    The skipped containers are not validated.
+    """
+
+    TOKEN = re.compile(r'[ \t\n\r]*(?:([{}\[\],:])|"((?:[^"\\]|\\.)*)"|'
+                       r'(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)|(true|false|null))')
+    # the strings and the text between the brackets of a skipped container
+    SKIP_TEXT = re.compile(r'(?:[^"\[\]{}]+|"(?:[^"\\]|\\.)*")*')
+
+    WHOLE = "whole"
+    SKIP = "skip"
+    EVENTS = "events"
+
+    def __init__(self, handler, select=None, max_whole_size=1024 * 1024):
+        """
+        :param handler: callable(path, event, value)
+        :param select: (optional) callable(path) which returns how the container of the path is parsed,
+            WHOLE, SKIP or EVENTS, default is EVENTS
+        :param max_whole_size: the max size in characters of a container decoded as WHOLE, a bigger one is
+            parsed into events
+        """
+        self.handler = handler
+        self.select = select
+        self.max_whole_size = max_whole_size
+        self.path = []
+        # True for a map, False for an array, of the containers being parsed
+        self._maps = []
+        self._state = _VALUE
+        # the depth in a skipped container
+        self._skip = 0
+        self._buffer = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    @classmethod
+    def iter_events(cls, chunks):
+        """
+        :param chunks: iterable of bytes or str
+        :return: generator of (path tuple, event, value)
+        """
+        events = []
+        parser = cls(lambda path, event, value: events.append((tuple(path), event, value)))
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from events
+            events.clear()
+        parser.close()
+        yield from events
+
+    def feed(self, chunk):
+        """
+        :param chunk: bytes or str, a part of the json
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        self._buffer = self._buffer + chunk if self._buffer else chunk
+        self._parse(False)
+
+    def close(self):
+        """
+        parse the rest of the json, ValueError if the json is not complete
+        """
+        self._buffer += self._decoder.decode(b"", final=True)
+        self._parse(True)
+        if self._state != _END:
+            raise ValueError("The json is not complete, it ends in: " + repr(self._buffer[-50:]))
+
+    def _parse(self, final):
+        buffer = self._buffer
+        size = len(buffer)
+        match = self.TOKEN.match
+        handler = self.handler
+        path = self.path
+        maps = self._maps
+        state = self._state
+        skip = self._skip
+        position = 0
+        while True:
+            if skip > 0:
+                position = self.SKIP_TEXT.match(buffer, position).end()
+                if position >= size or buffer[position] == '"':
+                    # the rest of the container, or of a string, is in the next chunk
+                    if final:
+                        self._error(buffer, position)
+                    break
+                skip += 1 if buffer[position] in "[{" else -1
+                position += 1
+                if skip == 0:
+                    state = _NEXT if maps else _END
+                continue
+            token = match(buffer, position)
+            if token is None:
+                # an incomplete token waits for the next chunk
+                if final and buffer[position:].strip():
+                    self._error(buffer, position)
+                break
+            punctuation, string, number, literal = token.groups()
+            if number is not None and token.end() + 2 >= size and not final:
+                # the number may go on in the next chunk, e.g. "12" and ".5" or "1e" and "+3"
+                break
+            if (punctuation == "{" or punctuation == "[") and (state == _VALUE or state == _ARRAY_START) and \
+                    self.select is not None:
+                mode = self.select(path)
+                if mode == self.SKIP:
+                    skip = 1
+                    position = token.end()
+                    continue
+                if mode == self.WHOLE:
+                    start = token.start(1)
+                    try:
+                        value, position = _DECODER.raw_decode(buffer, start)
+                    except ValueError:
+                        if not final and size - start < self.max_whole_size:
+                            # the rest of the container is in the next chunk
+                            break
+                        # too big, or not valid, it is parsed into events
+                    else:
+                        handler(path, "value", value)
+                        state = _NEXT if maps else _END
+                        continue
+            if state == _NEXT:
+                if punctuation == ",":
+                    if maps[-1]:
+                        state = _KEY
+                    else:
+                        path[-1] += 1
+                        state = _VALUE
+                elif (punctuation == "}" and maps[-1]) or (punctuation == "]" and not maps[-1]):
+                    path.pop()
+                    handler(path, "end_map" if maps.pop() else "end_array", None)
+                    state = _NEXT if maps else _END
+                else:
+                    self._error(buffer, position)
+            elif state == _VALUE or state == _ARRAY_START:
+                if punctuation is None:
+                    if string is not None:
+                        value = json.loads('"' + string + '"') if "\\" in string else string
+                    elif number is not None:
+                        value = float(number) if "." in number or "e" in number or "E" in number else int(number)
+                    else:
+                        value = _LITERALS[literal]
+                    handler(path, "value", value)
+                    state = _NEXT if maps else _END
+                elif punctuation == "{":
+                    handler(path, "start_map", None)
+                    maps.append(True)
+                    path.append(None)
+                    state = _MAP_START
+                elif punctuation == "[":
+                    handler(path, "start_array", None)
+                    maps.append(False)
+                    path.append(0)
+                    state = _ARRAY_START
+                elif punctuation == "]" and state == _ARRAY_START:
+                    path.pop()
+                    maps.pop()
+                    handler(path, "end_array", None)
+                    state = _NEXT if maps else _END
+                else:
+                    self._error(buffer, position)
+            elif state == _KEY or state == _MAP_START:
+                if string is not None:
+                    path[-1] = json.loads('"' + string + '"') if "\\" in string else string
+                    state = _COLON
+                elif punctuation == "}" and state == _MAP_START:
+                    path.pop()
+                    maps.pop()
+                    handler(path, "end_map", None)
+                    state = _NEXT if maps else _END
+                else:
+                    self._error(buffer, position)
+            elif state == _COLON and punctuation == ":":
+                state = _VALUE
+            else:
+                self._error(buffer, position)
+            position = token.end()
+        self._buffer = buffer[position:]
+        self._state = state
+        self._skip = skip
+
+    @staticmethod
+    def _error(buffer, position):
+        raise ValueError("The response body is not a valid json, at: " + repr(buffer[position:position + 50].strip()))
+
+
+class _Stop(Exception):
+    """
+    all the targets are resolved, or the first error in the fail fast mode
+    """
+
+
+class _Target:
+
+    WILDCARD = object()
+
+    def __init__(self, expression, callback, required=False):
+        self.expression = expression
+        steps = JsonPath.get(expression).steps
+        if any(kind not in ("key", "wildcard") for kind, _ in steps):
+            raise ValueError("Only the keys, the indexes and the wildcards are supported by the streaming path: " +
+                             expression)
+        self.steps = tuple(self.WILDCARD if kind == "wildcard" else argument for kind, argument in steps)
+        self.callback = callback
+        self.required = required
+        # the container of the first wildcard, the target is resolved when it ends, None if there is no wildcard
+        self.scope = self.steps[:self.steps.index(self.WILDCARD)] if self.WILDCARD in self.steps else None
+        self.matches = 0
+        self.resolved = False
+
+
+class JsonStream:
+    """
+    Path-targeted checks of a big json response in one pass over the raw byte stream, with constant memory:
+    only the values of the target paths are built, and the parsing stops as soon as all the targets are resolved,
+    e.g.
+
+        stream = JsonStream().assert_equal("$.result.code", 200) \\
+            .assert_increasing("$.data[*].timestamp") \\
+            .count("$.data[*]")
+        with request.stream() as response:
+            stream.run(response)
+        total = stream.counts["$.data[*]"]
+
+    The paths are JsonPath expressions of the keys, the indexes and the wildcards. A path without wildcards is
+    resolved by its first value, a path with wildcards is resolved when the container of the first wildcard ends.
+    run raises AssertionError with all the errors, like JsonUtils.dict_compare. A JsonStream checks one response.
+    """
+
+    def __init__(self, fail_fast=False):
+        """
+        :param fail_fast: stop at the first error
+        """
+        self.fail_fast = fail_fast
+        self.errors = []
+        self.counts = {}
+        self.targets = []
+        self._final_checks = []
+        self._pending = 0
+        # (the targets deeper than the container, the value being built, the matched targets) of the containers
+        # being parsed
+        self._frames = []
+        self._selected = None
+
+    def on(self, path, callback, required=False):
+        """
+        :param path: the JsonPath of the values, e.g. "$.data[*].timestamp"
+        :param callback: callable(value, path tuple), it is called with every value of the path, a dict or a list
+            value is built from the stream
+        :param required: if True, it is an error when the path is not in the json
+        :return: the stream itself
+        """
+        self.targets.append(_Target(str(path), callback, required))
+        return self
+
+    def count(self, path):
+        """
+        count the values of the path, the number is in counts[path] after run, a path is counted once however many
+        times it is registered, e.g. by count and assert_count
+        :return: the stream itself
+        """
+        path = str(path)
+        if path in self.counts:
+            return self
+        self.counts[path] = 0
+
+        def increase(value, value_path):
+            self.counts[path] += 1
+        return self.on(path, increase)
+
+    def assert_equal(self, path, expected):
+        """
+        Assert every value of the path equals the expected value, and the path is in the json
+        :return: the stream itself
+        """
+        def check(value, value_path):
+            if value != expected:
+                self._error("Field in the response body is not matching: " + ExpectedSchema.format_path(value_path) +
+                            ", expected: < " + str(expected) + " > but actually: < " + str(value) + " >")
+        return self.on(path, check, required=True)
+
+    def assert_each(self, path, predicate, message=None):
+        """
+        Assert the predicate is True for every value of the path
+        :param predicate: callable(value)
+        :param message: (optional) the error message
+        :return: the stream itself
+        """
+        def check(value, value_path):
+            if not predicate(value):
+                self._error((message or "Field in the response body is not expected") + ": " +
+                            ExpectedSchema.format_path(value_path) + ", actually: < " + str(value) + " >")
+        return self.on(path, check)
+
+    def assert_increasing(self, path, strict=True):
+        """
+        Assert the values of the path are increasing in the order of the json, e.g. the timestamps of the records
+        :param strict: if False, the equal values are allowed
+        :return: the stream itself
+        """
+        previous = []
+
+        def check(value, value_path):
+            if previous and (value <= previous[0] if strict else value < previous[0]):
+                self._error("Field in the response body is not increasing: " + ExpectedSchema.format_path(value_path) +
+                            ", previous: < " + str(previous[0]) + " > but actually: < " + str(value) + " >")
+            previous[:] = [value]
+        return self.on(path, check)
+
+    def assert_count(self, path, expected):
+        """
+        Assert the number of the values of the path, e.g. assert_count("$.data[*]", 100)
+        :return: the stream itself
+        """
+        path = str(path)
+        self.count(path)
+
+        def check():
+            if self.counts[path] != expected:
+                self._error("Expected " + str(expected) + " values of " + path +
+                            " in the response body, but actually " + str(self.counts[path]))
+        self._final_checks.append(check)
+        return self
+
+    def run(self, source):
+        """
+        parse the json and run the checks, it stops reading the source when all the targets are resolved
+        :param source: ApiStreamResponse, ApiResponse, bytes, str, a binary file or an iterable of chunks
+        :return: the stream itself, AssertionError if there are errors
+        """
+        self._pending = len(self.targets)
+        self._frames = []
+        parser = JsonEventParser(self._event, self._select)
+        chunks = self._chunks(source)
+        try:
+            if self._pending > 0:
+                for chunk in chunks:
+                    parser.feed(chunk)
+                parser.close()
+        except _Stop:
+            pass
+        finally:
+            if hasattr(chunks, "close"):
+                # release the connection of a streamed response
+                chunks.close()
+        for target in self.targets:
+            if target.required and target.matches == 0:
+                self.errors.append("Field in the response body is missing: " + target.expression)
+        for check in self._final_checks:
+            try:
+                check()
+            except _Stop:
+                break
+        if len(self.errors) > 0:
+            raise AssertionError(self.errors)
+        return self
+
+    @staticmethod
+    def _chunks(source):
+        if hasattr(source, "iter_chunks"):
+            return source.iter_chunks()
+        if isinstance(source, (bytes, str)):
+            return iter((source,))
+        if hasattr(source, "read"):
+            return iter(lambda: source.read(64 * 1024), b"")
+        if hasattr(source, "content"):
+            return iter((source.content,))
+        return iter(source)
+
+    def _error(self, message):
+        self.errors.append(message)
+        if self.fail_fast:
+            raise _Stop()
+
+    def _select(self, path):
+        """
+        the containers without targets are skipped, the records of the lists and the containers of the targets
+        are decoded whole, the others are parsed into events
+        """
+        # the whole value is sent right after the selection, the targets are kept for it
+        self._selected = targets = self._prefixed(path)
+        if self._frames and self._frames[-1][1] is not None:
+            return JsonEventParser.WHOLE
+        if not targets:
+            return JsonEventParser.SKIP
+        if (path and isinstance(path[-1], int)) or any(len(target.steps) == len(path) for target in targets):
+            return JsonEventParser.WHOLE
+        return JsonEventParser.EVENTS
+
+    def _prefixed(self, path):
+        """
+        :return: list of the targets which are not resolved and start with the path,
+            the parent frame keeps the ones which start with the path of the parent
+        """
+        if not self._frames:
+            return [target for target in self.targets if not target.resolved]
+        depth = len(path) - 1
+        key = path[-1]
+        wildcard = _Target.WILDCARD
+        return [target for target in self._frames[-1][0]
+                if not target.resolved and (target.steps[depth] is wildcard or target.steps[depth] == key)]
+
+    def _event(self, path, event, value):
+        frames = self._frames
+        parent = frames[-1] if frames else None
+        if event == "value":
+            if parent is None or parent[0]:
+                if isinstance(value, (dict, list)):
+                    self._match_whole(value, path, self._selected)
+                else:
+                    for target in self._prefixed(path):
+                        if len(target.steps) == len(path):
+                            self._match(target, value, path)
+            if parent is not None and parent[1] is not None:
+                self._add(parent[1], path, value)
+        elif event == "start_map" or event == "start_array":
+            targets = self._prefixed(path) if parent is None or parent[0] else []
+            deeper = [target for target in targets if len(target.steps) > len(path)]
+            matched = [target for target in targets if len(target.steps) == len(path)]
+            building = None
+            if matched or (parent is not None and parent[1] is not None):
+                building = {} if event == "start_map" else []
+                if parent is not None and parent[1] is not None:
+                    self._add(parent[1], path, building)
+            frames.append((deeper, building, matched))
+        else:
+            deeper, building, matched = frames.pop()
+            for target in matched:
+                self._match(target, building, path)
+            for target in deeper:
+                if not target.resolved and target.scope is not None and len(target.scope) == len(path):
+                    # the container of the wildcard ends
+                    self._resolve(target)
+
+    def _match_whole(self, value, path, targets):
+        """
+        match the targets in a container which is decoded whole
+        """
+        path = tuple(path)
+        for target in targets:
+            if target.resolved:
+                continue
+            steps = target.steps[len(path):]
+            if not steps:
+                self._match(target, value, path)
+            elif len(steps) == 1 and isinstance(value, dict) and steps[0] is not _Target.WILDCARD:
+                # a field of a record, e.g. "$.data[*].timestamp"
+                if steps[0] in value:
+                    self._match(target, value[steps[0]], path + steps)
+            else:
+                nodes = [(path, value)]
+                for step in steps:
+                    nodes = [(node_path + (key,), item) for node_path, node in nodes
+                             for key, item in self._children(node, step)]
+                for node_path, item in nodes:
+                    if target.resolved:
+                        break
+                    self._match(target, item, node_path)
+            if not target.resolved and target.scope is not None and len(target.scope) >= len(path):
+                # the container of the wildcard is complete
+                self._resolve(target)
+
+    @staticmethod
+    def _children(node, step):
+        if step is _Target.WILDCARD:
+            if isinstance(node, dict):
+                return node.items()
+            return enumerate(node) if isinstance(node, list) else ()
+        if isinstance(node, dict):
+            return ((step, node[step]),) if step in node else ()
+        if isinstance(node, list) and isinstance(step, int) and 0 <= step < len(node):
+            return ((step, node[step]),)
+        return ()
+
+    def _match(self, target, value, path):
+        target.matches += 1
+        target.callback(value, tuple(path))
+        if target.scope is None:
+            self._resolve(target)
+
+    def _resolve(self, target):
+        target.resolved = True
+        self._pending -= 1
+        if self._pending <= 0:
+            raise _Stop()
+
+    @staticmethod
+    def _add(container, path, value):
+        if isinstance(container, dict):
+            container[path[-1]] = value
+        else:
+            container.append(value)
@@ -1,9 +1,12 @@
-import json
-import re
 from requests.structures import CaseInsensitiveDict
-from deepdiff import DeepDiff
-from deepdiff.model import PrettyOrderedSet
-import jsonpath
+from libs.utils.json_codec import JsonCodec
+from libs.utils.json_compare import ExpectedSchema
+from libs.utils.json_path import JsonPath
+
+try:
+    from deepdiff import DeepDiff
+except ImportError:  # deepdiff is only needed by the detailed report
+    DeepDiff = None
 
 
 class JsonUtils:
@@ -11,103 +14,160 @@ class JsonUtils:
     # verify the json string is valid json
     @classmethod
     def is_json(cls, my_json):
-        try:
-            json.loads(my_json)
-        except Exception:
-            return False
-        return True
+        return JsonCodec.try_loads(my_json)[0]
 
     @classmethod
     def json_to_object(cls, my_class_json, my_class):
-        my_class_rebuild = json.loads(my_class_json)
+        my_class_rebuild = JsonCodec.loads(my_class_json)
         # my_class = My_Class()
         my_class.__dict_ = my_class_rebuild
         return my_class
 
     @classmethod
     def object_to_json(cls, my_class):
-        return json.loads(json.dumps(my_class.__dict__))
+        return JsonCodec.to_json(my_class.__dict__)
 
     @classmethod
-    def dict_generator(cls, indict, pre=None):
-        pre = pre[:] if pre else []
-        if isinstance(indict, list):
-            if len(indict) == 0:
-                yield pre
+    def flatten(cls, value, max_depth=None, max_items=None, containers=False):
+        """
+        walk a json without recursion, the path is one shared list which is only copied into a tuple for the
+        yielded items, so the deep payloads don't hit the recursion limit
+        @param value: the json, a dict, a list or a scalar
+        @param max_depth: (optional) the containers deeper than it are yielded as values and not walked
+        @param max_items: (optional) stop after yielding so many items
+        @param containers: if True, the dicts and the lists are yielded too, before their items
+        @return: generator of (path, value), the path is a tuple of the keys and the indexes, e.g. ("data", 0, "value"),
+        the empty dicts and lists are yielded as values
+        """
+        count = 0
+        path = []
+        # the iterators of the (key, value) of the containers being walked
+        stack = [iter(((None, value),))]
+        while stack:
+            for key, item in stack[-1]:
+                if len(stack) > 1:
+                    path.append(key)
+                is_container = isinstance(item, (dict, list, tuple, CaseInsensitiveDict))
+                if is_container and len(item) > 0 and (max_depth is None or len(path) < max_depth):
+                    if containers:
+                        yield tuple(path), item
+                        count += 1
+                        if max_items is not None and count >= max_items:
+                            return
+                    stack.append(iter(item.items()) if isinstance(item, (dict, CaseInsensitiveDict))
+                                 else enumerate(item))
+                    break
+                yield tuple(path), item
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+                if len(stack) > 1:
+                    path.pop()
             else:
-                i = 0
-                for v in indict:
-                    for d in JsonUtils.dict_generator(v, pre + [str(i)]):
-                        yield d
-                    i = i + 1
-        elif isinstance(indict, dict) or isinstance(indict, CaseInsensitiveDict):
-            for key, value in indict.items():
-                if isinstance(value, dict):
-                    if len(value) == 0:
-                        yield pre+[key, '{}']
-                    else:
-                        for d in JsonUtils.dict_generator(value, pre + [key]):
-                            yield d
-                elif isinstance(value, list):
-                    if len(value) == 0:
-                        yield pre+[key, '[]']
-                    else:
-                        i = 0
-                        for v in value:
-                            for d in JsonUtils.dict_generator(v, pre + [key] + [str(i)]):
-                                yield d
-                            i = i + 1
-                elif isinstance(value, tuple):
+                stack.pop()
+                if path:
+                    path.pop()
+
+    @classmethod
+    def dict_generator(cls, indict, pre=None):
+        """
+        the legacy flat view of a json, e.g. ["data", "0", "value", 1], see flatten for the (path, value) pairs.
+        It walks the json without recursion, with the same output as the recursive version
+        @param indict: the json
+        @param pre: (optional) list of the keys before the json
+        @return: generator of the lists of the keys and the value
+        """
+        path = list(pre) if pre else []
+        # (is a dict, iterator of (key, value), the path length of the container)
+        stack = []
+        items = iter(((None, indict),))
+        is_dict = False
+        size = len(path)
+        while True:
+            for key, value in items:
+                del path[size:]
+                if is_dict:
+                    if isinstance(value, (dict, list, tuple)):
+                        if len(value) == 0:
+                            yield path + [key, "{}" if isinstance(value, dict) else
+                                          "[]" if isinstance(value, list) else "()"]
+                            continue
+                        path.append(key)
+                        if isinstance(value, dict):
+                            stack.append((is_dict, items, size))
+                            items, size = iter(value.items()), len(path)
+                            break
+                        stack.append((is_dict, items, size))
+                        # the list items are indexed, the tuple items are not
+                        children = (((str(i),), v) for i, v in enumerate(value)) if isinstance(value, list) \
+                            else (((), v) for v in value)
+                        is_dict, items, size = False, children, len(path)
+                        break
+                    yield path + [key, value]
+                    continue
+                path.extend(key or ())
+                if isinstance(value, list):
                     if len(value) == 0:
-                        yield pre+[key, '()']
-                    else:
-                        for v in value:
-                            for d in JsonUtils.dict_generator(v, pre + [key]):
-                                yield d
-                else:
-                    yield pre + [key, value]
-        else:
-            yield indict
+                        yield path[:]
+                        continue
+                    stack.append((is_dict, items, size))
+                    is_dict, items, size = False, (((str(i),), v) for i, v in enumerate(value)), len(path)
+                    break
+                if isinstance(value, (dict, CaseInsensitiveDict)):
+                    stack.append((is_dict, items, size))
+                    is_dict, items, size = True, iter(value.items()), len(path)
+                    break
+                yield value
+            else:
+                if not stack:
+                    return
+                is_dict, items, size = stack.pop()
 
     @classmethod
     def get_value_by_path(cls, json, json_path):
         """
-        we know a item path in a json, try to get its value through the path
-        @param json:
-        @param json_path:
-        @return:
+        we know a item path in a json, try to get its value through the path, the path is compiled once and cached,
+        see JsonPath for the syntax
+        @param json: the json, or an ApiResponse
+        @param json_path: a DeepDiff style path, e.g. "root['result']['idToken']", or a JSONPath, e.g. "$.data[*].value"
+        @return: list of the matched values, False if nothing matches, the same as jsonpath
         """
-        json_path = str(json_path).replace("root", "$").replace("['", ".").replace("']", "")
-        return jsonpath(json, json_path)
+        return JsonPath.get(json_path).find(json) or False
 
     @classmethod
-    def dict_compare(cls, json_self, json_target, ignore_order=False, ignore_string_case=False, exclude_paths=None):
+    def dict_compare(cls, json_self, json_target, ignore_order=False, ignore_string_case=False, exclude_paths=None,
+                     fail_fast=False, report=False):
         """
-        Compare the differences between two jsons
+        Compare the differences between two jsons, see ExpectedSchema for the rules.
+        The expected json is compiled once and cached
         @param json_self: the json str should be come from the API response
         @param json_target:  it is the target json we use to compare, it is build as expected by your
         @param ignore_order: ignore the order for list part in the json
+        @param ignore_string_case: compare the strings case insensitively
+        @param exclude_paths: the DeepDiff style paths which are not compared, e.g. "root['result']['idToken']"
+        @param fail_fast: stop at the first difference
+        @param report: if True, the DeepDiff report of the two jsons is added to the error, deepdiff is required
         self
         @return:
         """
-        errors = list()
-        differences = DeepDiff(json_target, json_self, ignore_order=ignore_order, ignore_string_case=ignore_string_case,
-                               exclude_paths=exclude_paths)
-        # usually we don't check the extra part, but we will be strict with the missing part in the json
-        item_added = differences["dictionary_item_added"] if "dictionary_item_added" in differences else []
-        item_removed = differences["dictionary_item_removed"] if "dictionary_item_removed" in differences else []
-        values_changed = differences["values_changed"] if "values_changed" in differences else {}
-        for item in item_removed:
-            value = cls.get_value_by_path(json_target, item)
-            if value[0] is not None:
-                errors.append("Field in the response body is missing: " + str(item))
-        for key, value in values_changed.items():
-            pattern = "^" + str(value["old_value"]) + "$"
-            source = str(value["new_value"])
-            ignore_string_case = re.I if ignore_string_case else 0
-            if not re.match(pattern, source, flags=ignore_string_case):
-                errors.append("Field in the response body is not matching: " + str(key) + ", expected: < " +
-                              str(value["old_value"]) + " > but actually: < " + str(value["new_value"]) + " >")
+        errors = ExpectedSchema.get(json_target, ignore_order=ignore_order, ignore_string_case=ignore_string_case,
+                                    exclude_paths=exclude_paths).validate(json_self, fail_fast=fail_fast)
+        if len(errors) > 0 and report:
+            errors.append("DeepDiff report:\n" + cls.deepdiff_report(json_self, json_target, ignore_order=ignore_order,
+                                                                     ignore_string_case=ignore_string_case,
+                                                                     exclude_paths=exclude_paths))
 
         if len(errors) > 0:
-            raise AssertionError(errors)
\ No newline at end of file
+            raise AssertionError(errors)
+
+    @classmethod
+    def deepdiff_report(cls, json_self, json_target, ignore_order=False, ignore_string_case=False,
+                        exclude_paths=None):
+        """
+        the detailed differences of two jsons by DeepDiff, it is slow on the big jsons, only for the report
+        @return: the differences as text
+        """
+        if DeepDiff is None:
+            return "deepdiff is not installed, please install it: pip install deepdiff"
+        return DeepDiff(json_target, json_self, ignore_order=ignore_order, ignore_string_case=ignore_string_case,
+                        exclude_paths=exclude_paths).pretty()
@@ -0,0 +1,187 @@
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from libs.common.log import logger
+from libs.common.metrics import HttpMetrics, LatencyHistogram
+
+
+class LoadReport:
+    """
+    The result of a LoadRunner run: throughput, error rate and percentile latencies of the scenario
+    and of every endpoint it called
+    """
+
+    def __init__(self, name, rate, duration, elapsed, scheduled, scenario_latency, scenario_errors, endpoints):
+        self.name = name
+        self.rate = rate
+        self.duration = duration
+        self.elapsed = elapsed
+        self.scheduled = scheduled
+        self.scenario_latency = scenario_latency
+        self.scenario_errors = scenario_errors
+        # endpoint -> {"latency": LatencyHistogram, "errors": int}
+        self.endpoints = endpoints
+
+    @property
+    def completed(self):
+        return self.scenario_latency.count
+
+    @property
+    def throughput(self):
+        """
+        :return: the completed scenarios per second
+        """
+        return self.completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        """
+        :return: the report as dict, the latencies are in milliseconds
+        """
+        endpoints = {}
+        for endpoint, stats in sorted(self.endpoints.items()):
+            count = stats["latency"].count
+            endpoints[endpoint] = {
+                "requests": count,
+                "throughput": round(count / self.elapsed, 3) if self.elapsed > 0 else 0.0,
+                "errors": stats["errors"],
+                "error_rate": round(stats["errors"] / count, 4) if count else 0.0,
+                "latency": stats["latency"].summary(),
+            }
+        return {
+            "name": self.name,
+            "target_rate": self.rate,
+            "duration": self.duration,
+            "elapsed": round(self.elapsed, 3),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "throughput": round(self.throughput, 3),
+            "errors": self.scenario_errors,
+            "error_rate": round(self.scenario_errors / self.completed, 4) if self.completed else 0.0,
+            "latency": self.scenario_latency.summary(),
+            "endpoints": endpoints,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    def log(self):
+        logger.info("=== load report:\n" + self.to_json())
+        return self
+
+
+class LoadRunner:
+    """
+    Open-model load generation on top of ApiRequest/APIUtils, e.g.
+
+        api = APIUtils()
+        token = api.get_user_token(secret_key)
+        report = LoadRunner(lambda: api.alert_data(token, device_id, is_304=True), rate=50, duration=60,
+                            ramp_up=10).run()
+
+    The scenarios are started on a schedule (the arrival rate ramps up linearly to "rate" per second in "ramp_up"
+    seconds, then stays), not when the previous one is finished. The scenario latency is measured from the
+    scheduled start time, so a slow server shows up in the percentiles instead of being hidden by a
+    lower sending rate (coordinated omission).
+    The latencies are collected in LatencyHistogram, per scenario and per endpoint (method and templated path)
+    which the scenario called. Set a sample_rate in the [http_log] config for long runs, otherwise every request
+    is logged.
+    """
+
+    def __init__(self, scenario, rate, duration, ramp_up=0.0, max_workers=100, poisson=False, name="scenario"):
+        """
+        :param scenario: callable without parameter, e.g. built from the APIUtils methods, an exception or
+            a failed assertion inside it counts as an error
+        :param rate: the target arrival rate, scenarios per second
+        :param duration: seconds, how long to schedule the scenarios, the ramp up included
+        :param ramp_up: seconds, the arrival rate grows linearly from 0 to rate in this time
+        :param max_workers: the max number of scenarios which run at the same time, the late ones wait
+            in the queue, and the waiting time is counted in their latency
+        :param poisson: if True, the arrivals are a Poisson process instead of evenly spaced
+        :param name: the name in the report
+        """
+        if rate <= 0 or duration <= 0:
+            raise ValueError("The rate and the duration should be positive")
+        self.scenario = scenario
+        self.rate = rate
+        self.duration = duration
+        self.ramp_up = min(max(ramp_up, 0.0), duration)
+        self.max_workers = max_workers
+        self.poisson = poisson
+        self.name = name
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._scenario_latency = LatencyHistogram()
+        self._scenario_errors = 0
+        self._endpoints = {}
+
+    def arrival_time(self, arrivals):
+        """
+        the offset from the start when the scenario should start, by inverting the cumulative arrivals
+        N(t) = rate * t^2 / (2 * ramp_up) during the ramp up, then rate * (t - ramp_up / 2)
+        :param arrivals: the cumulative number of arrivals
+        :return: seconds since the start
+        """
+        ramp_arrivals = self.rate * self.ramp_up / 2
+        if arrivals <= ramp_arrivals:
+            return math.sqrt(2 * self.ramp_up * arrivals / self.rate)
+        return self.ramp_up + (arrivals - ramp_arrivals) / self.rate
+
+    def run(self):
+        """
+        schedule the scenarios for the duration, wait for the started ones to finish
+        :return: LoadReport
+        """
+        HttpMetrics.add_listener(self._on_request)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="LoadRunner")
+        scheduled = 0
+        arrivals = 0.0
+        start = time.perf_counter()
+        try:
+            while True:
+                arrivals += random.expovariate(1.0) if self.poisson else 1.0
+                offset = self.arrival_time(arrivals)
+                if offset >= self.duration:
+                    break
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._execute, start + offset)
+                scheduled += 1
+            executor.shutdown(wait=True)
+        finally:
+            HttpMetrics.remove_listener(self._on_request)
+        elapsed = time.perf_counter() - start
+        return LoadReport(self.name, self.rate, self.duration, elapsed, scheduled, self._scenario_latency,
+                          self._scenario_errors, self._endpoints)
+
+    def _execute(self, intended_start):
+        self._local.active = True
+        failed = False
+        try:
+            self.scenario()
+        except Exception as e:
+            failed = True
+            logger.warning("=== load scenario failed: " + repr(e))
+        finally:
+            self._local.active = False
+        latency = (time.perf_counter() - intended_start) * 1000
+        with self._lock:
+            self._scenario_latency.record(latency)
+            if failed:
+                self._scenario_errors += 1
+
+    def _on_request(self, endpoint, timing, status, error):
+        if not getattr(self._local, "active", False):
+            # the request is not sent by a scenario of this run
+            return
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = {"latency": LatencyHistogram(), "errors": 0}
+                self._endpoints[endpoint] = stats
+            stats["latency"].record(timing.total)
+            if error is not None or (status is not None and status >= 400):
+                stats["errors"] += 1
@@ -22,6 +22,32 @@ class Misc:
         info_dict["password"] = test_accounts["users"]["common_user"]["password"]
         return {**info_dict, **test_accounts}
 
+    @staticmethod
+    def load_config_section(section, defaults):
+        """
+        read one section of config.cfg, every value is converted to the type of its default value
+        :param section: the section name in config.cfg
+        :param defaults: dict of the option names and the default values
+        :return: dict of the option values, the default value is used if the option is missing
+        """
+        config = configparser.ConfigParser()
+        config.read(os.path.join(Misc.get_root_directory(), "config", "config.cfg"), encoding="utf-8")
+        values = dict(defaults)
+        if not config.has_section(section):
+            return values
+        for key, default in defaults.items():
+            if not config.has_option(section, key):
+                continue
+            if isinstance(default, bool):
+                values[key] = config.getboolean(section, key)
+            elif isinstance(default, int):
+                values[key] = config.getint(section, key)
+            elif isinstance(default, float):
+                values[key] = config.getfloat(section, key)
+            else:
+                values[key] = config.get(section, key)
+        return values
+
     @staticmethod
     def load_json_file(file_name):
         with open(file_name, encoding="utf-8") as f:
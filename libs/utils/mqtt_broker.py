@@ -0,0 +1,232 @@
+import json
+import socket
+import struct
+import threading
+from libs.common.log import logger
+
+
+class LocalBroker:
+    """
+    A minimal in-process MQTT 3.1.1 broker, the stand-in of the device broker for the tests which run offline, e.g.
+
+        with LocalBroker() as broker, MQTTUtils(port=broker.port) as mqtt:
+            mqtt.subscribe_device(device_id)
+            broker.publish("pxp/iot/device/" + device_id + "/1", {"code": 200})
+            message = mqtt.wait_for(lambda m: m.json()["code"] == 200, timeout=5)
+
+    It supports CONNECT, SUBSCRIBE/UNSUBSCRIBE with the + and # wildcards, PUBLISH of QoS 0, 1 and 2 from the
+    clients, retained messages and PING. The messages are delivered to the subscribers with QoS 0,
+    there is no session persistence and no authentication.
+    """
+
+    CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+    SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+    def __init__(self, host="127.0.0.1", port=0):
+        """
+        :param host: the listening address
+        :param port: the listening port, 0 means a free port, see the port attribute after start()
+        """
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        # connection -> set of topic filters
+        self._subscriptions = {}
+        # topic -> payload
+        self._retained = {}
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(16)
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, name="LocalBroker", daemon=True)
+        self._thread.start()
+        logger.info("=== local MQTT broker is listening on " + self.host + ":" + str(self.port))
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        with self._lock:
+            connections = list(self._subscriptions)
+            self._subscriptions.clear()
+        for connection in connections:
+            connection.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def publish(self, topic, payload, retain=False):
+        """
+        publish a message to the subscribers, as if a device sends it
+        :param topic: the topic name
+        :param payload: bytes, str, or dict/list which is sent as json
+        :param retain: if True, the message is kept and sent to the later subscribers too
+        :return:
+        """
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload)
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self._route(topic, payload, retain)
+
+    @staticmethod
+    def matches(topic_filter, topic):
+        """
+        :return: True if the topic matches the filter with the + and # wildcards
+        """
+        filters = topic_filter.split("/")
+        levels = topic.split("/")
+        for index, part in enumerate(filters):
+            if part == "#":
+                return True
+            if index >= len(levels) or (part != "+" and part != levels[index]):
+                return False
+        return len(filters) == len(levels)
+
+    def _accept(self):
+        while self._server is not None:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            connection = _Connection(sock)
+            with self._lock:
+                self._subscriptions[connection] = set()
+            threading.Thread(target=self._serve, args=(connection,), name="LocalBroker-client", daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            while True:
+                packet_type, flags, body = connection.read_packet()
+                if packet_type is None or packet_type == self.DISCONNECT:
+                    return
+                self._handle(connection, packet_type, flags, body)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._subscriptions.pop(connection, None)
+            connection.close()
+
+    def _handle(self, connection, packet_type, flags, body):
+        if packet_type == self.CONNECT:
+            connection.send(self.CONNACK << 4, b"\x00\x00")
+        elif packet_type == self.PUBLISH:
+            qos = (flags >> 1) & 0x03
+            length = struct.unpack("!H", body[:2])[0]
+            topic = body[2:2 + length].decode("utf-8")
+            offset = 2 + length
+            if qos > 0:
+                packet_id = body[offset:offset + 2]
+                offset += 2
+                connection.send((self.PUBACK if qos == 1 else self.PUBREC) << 4, packet_id)
+            self._route(topic, body[offset:], bool(flags & 0x01))
+        elif packet_type == self.PUBREL:
+            connection.send(self.PUBCOMP << 4, body[:2])
+        elif packet_type == self.SUBSCRIBE:
+            packet_id, filters = body[:2], self._topic_filters(body[2:], True)
+            with self._lock:
+                self._subscriptions.setdefault(connection, set()).update(filters)
+                retained = [(topic, payload) for topic, payload in self._retained.items()
+                            if any(self.matches(topic_filter, topic) for topic_filter in filters)]
+            # only QoS 0 is granted
+            connection.send(self.SUBACK << 4, packet_id + b"\x00" * len(filters))
+            for topic, payload in retained:
+                connection.send_publish(topic, payload, retain=True)
+        elif packet_type == self.UNSUBSCRIBE:
+            packet_id, filters = body[:2], self._topic_filters(body[2:], False)
+            with self._lock:
+                self._subscriptions.get(connection, set()).difference_update(filters)
+            connection.send(self.UNSUBACK << 4, packet_id)
+        elif packet_type == self.PINGREQ:
+            connection.send(self.PINGRESP << 4, b"")
+
+    def _route(self, topic, payload, retain):
+        with self._lock:
+            if retain:
+                if payload:
+                    self._retained[topic] = payload
+                else:
+                    self._retained.pop(topic, None)
+            receivers = [connection for connection, filters in self._subscriptions.items()
+                         if any(self.matches(topic_filter, topic) for topic_filter in filters)]
+        for connection in receivers:
+            try:
+                connection.send_publish(topic, payload)
+            except OSError:
+                # the client is gone, it is removed by its own thread
+                pass
+
+    @staticmethod
+    def _topic_filters(body, with_qos):
+        filters = []
+        offset = 0
+        while offset < len(body):
+            length = struct.unpack("!H", body[offset:offset + 2])[0]
+            filters.append(body[offset + 2:offset + 2 + length].decode("utf-8"))
+            offset += 2 + length + (1 if with_qos else 0)
+        return filters
+
+
+class _Connection:
+    """
+    a client connection of LocalBroker, it reads and writes the MQTT packets
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._file = sock.makefile("rb")
+        self._write_lock = threading.Lock()
+
+    def read_packet(self):
+        """
+        :return: (packet type, flags, body), the type is None if the connection is closed
+        """
+        header = self._file.read(1)
+        if not header:
+            return None, None, None
+        length = 0
+        multiplier = 1
+        while True:
+            byte = self._file.read(1)
+            if not byte:
+                return None, None, None
+            length += (byte[0] & 0x7F) * multiplier
+            if not byte[0] & 0x80:
+                break
+            multiplier *= 128
+        body = self._file.read(length) if length > 0 else b""
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    def send(self, header, body):
+        length = len(body)
+        encoded = bytearray()
+        while True:
+            byte = length % 128
+            length //= 128
+            encoded.append(byte | 0x80 if length > 0 else byte)
+            if length == 0:
+                break
+        with self._write_lock:
+            self.sock.sendall(bytes([header]) + bytes(encoded) + body)
+
+    def send_publish(self, topic, payload, retain=False):
+        topic = topic.encode("utf-8")
+        self.send((LocalBroker.PUBLISH << 4) | (0x01 if retain else 0), struct.pack("!H", len(topic)) + topic + payload)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._file.close()
+        self.sock.close()
@@ -0,0 +1,255 @@
+import collections
+import json
+import threading
+import time
+import uuid
+from libs.common.log import logger
+from libs.utils.misc import Misc
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:  # paho-mqtt is only needed by the MQTT subscriptions
+    mqtt = None
+
+
+class MqttMessage:
+    """
+    A received MQTT message, the payload is parsed as json only when it is asked
+    """
+
+    def __init__(self, seq, topic, payload, qos=0, retain=False):
+        self.seq = seq
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.received = time.time()
+        self._json = None
+
+    @property
+    def text(self):
+        return self.payload.decode("utf-8", errors="replace")
+
+    def json(self):
+        """
+        :return: the payload parsed as json, ValueError if it is not json
+        """
+        if self._json is None:
+            self._json = json.loads(self.payload)
+        return self._json
+
+    def __repr__(self):
+        return "(" + self.topic + ", " + self.text[:100] + ")"
+
+
+class MQTTUtils:
+    """
+    Push-based device data subscription, the counterpart of the 304 polling of APIUtils, e.g.
+
+        with MQTTUtils() as mqtt:
+            mqtt.subscribe_device(device_id, InterfaceType.AlertData)
+            trigger_the_alert()
+            message = mqtt.wait_for(lambda m: m.json().get("deviceId") == device_id, timeout=30)
+
+    The messages are buffered in a bounded queue by the network thread of paho, when the queue is full the oldest
+    message is dropped (see the dropped counter). wait_for returns as soon as a matching message arrives, the
+    messages which don't match stay in the queue for the next waits.
+    The broker is configured in the [mqtt] section of config.cfg, libs.utils.mqtt_broker.LocalBroker is a stand-in
+    for the tests which run offline.
+    """
+
+    DEFAULTS = {
+        "host": "localhost",
+        "port": 1883,
+        "username": "",
+        "password": "",
+        "tls": False,
+        "keepalive": 60,
+        "qos": 1,
+        # the max number of the buffered messages
+        "queue_size": 10000,
+        # the topic of a device, {interface_type} is + when the interface type is not given
+        "device_topic": "pxp/iot/device/{device_id}/{interface_type}",
+    }
+
+    def __init__(self, **options):
+        """
+        :param options: (optional) to override the DEFAULTS, e.g. port=broker.port
+        """
+        if mqtt is None:
+            raise ImportError("paho-mqtt is required by the MQTT subscriptions, please install it: "
+                              "pip install paho-mqtt")
+        config = Misc.load_config_section("mqtt", self.DEFAULTS)
+        for key, value in options.items():
+            if key not in config:
+                raise KeyError("Unknown mqtt option: " + key)
+            config[key] = value
+        self.config = config
+        self.dropped = 0
+        self._messages = collections.deque()
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._connected = threading.Event()
+        self._connect_result = None
+        self._topics = {}
+        # message id -> the granted QoS of the SUBACK which is not taken by subscribe yet
+        self._subacks = {}
+        self._subscribed = threading.Condition()
+        client_id = "api-test-" + uuid.uuid4().hex[:12]
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            # paho-mqtt 2.x
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+        else:
+            self.client = mqtt.Client(client_id=client_id)
+        if config["username"]:
+            self.client.username_pw_set(config["username"], config["password"] or None)
+        if config["tls"]:
+            self.client.tls_set()
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.on_subscribe = self._on_subscribe
+        self.client.on_disconnect = self._on_disconnect
+
+    def connect(self, timeout=10):
+        """
+        connect to the broker and start the network thread
+        :param timeout: seconds to wait for the connection
+        :return: the client itself
+        """
+        self._connected.clear()
+        self.client.connect(self.config["host"], self.config["port"], keepalive=self.config["keepalive"])
+        self.client.loop_start()
+        if not self._connected.wait(timeout):
+            self.close()
+            raise TimeoutError("Failed to connect to the MQTT broker " + self.config["host"] + ":" +
+                               str(self.config["port"]) + " in " + str(timeout) + "s")
+        if self._connect_result != 0:
+            self.close()
+            raise ConnectionError("The MQTT broker refused the connection: " +
+                                  mqtt.connack_string(self._connect_result))
+        return self
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def subscribe(self, topic, qos=None, timeout=10):
+        """
+        subscribe the topic and wait for the SUBACK of the broker, the messages published after it are received
+        :param topic: the topic filter, + and # wildcards are supported
+        :param qos: (optional) the QoS, default is the qos of the config
+        :param timeout: seconds to wait for the SUBACK
+        :return: the client itself
+        """
+        qos = self.config["qos"] if qos is None else qos
+        self._topics[topic] = qos
+        result, mid = self.client.subscribe(topic, qos)
+        if result != mqtt.MQTT_ERR_SUCCESS:
+            raise ConnectionError("Failed to subscribe " + topic + ": " + mqtt.error_string(result))
+        with self._subscribed:
+            # the SUBACK may arrive before the wait starts, so it is kept by _on_subscribe
+            if not self._subscribed.wait_for(lambda: mid in self._subacks, timeout):
+                raise TimeoutError("The MQTT broker didn't acknowledge the subscription of " + topic + " in " +
+                                   str(timeout) + "s")
+            granted = self._subacks.pop(mid)
+        if any(granted_qos == 0x80 for granted_qos in granted):
+            raise ConnectionError("The MQTT broker refused the subscription of " + topic)
+        return self
+
+    def subscribe_device(self, device_id, interface_type=None, qos=None, timeout=10):
+        """
+        :param device_id: the device id
+        :param interface_type: (optional) one of InterfaceType, all the interface types by default
+        :param qos: (optional) the QoS
+        :param timeout: seconds to wait for the SUBACK
+        :return: the client itself
+        """
+        topic = self.config["device_topic"].format(device_id=device_id,
+                                                   interface_type="+" if interface_type is None else interface_type)
+        return self.subscribe(topic, qos, timeout)
+
+    def unsubscribe(self, topic):
+        self._topics.pop(topic, None)
+        self.client.unsubscribe(topic)
+        return self
+
+    def wait_for(self, predicate=None, timeout=30):
+        """
+        wait for the first buffered or incoming message which matches the predicate, it is removed from the queue
+        :param predicate: (optional) callable(MqttMessage) which returns True for the expected message,
+            any message matches by default
+        :param timeout: seconds
+        :return: MqttMessage, TimeoutError if no message matches in time
+        """
+        return self.wait_for_count(predicate, 1, timeout)[0]
+
+    def wait_for_count(self, predicate=None, count=1, timeout=30):
+        """
+        wait for "count" messages which match the predicate, they are removed from the queue
+        :param predicate: (optional) callable(MqttMessage)
+        :param count: the number of the expected messages
+        :param timeout: seconds
+        :return: list of MqttMessage in the received order, TimeoutError if not enough messages match in time
+        """
+        deadline = time.monotonic() + timeout
+        matched = []
+        # the messages which are already checked are not checked again
+        checked = 0
+        with self._condition:
+            while True:
+                for message in list(self._messages):
+                    if message.seq <= checked:
+                        continue
+                    checked = message.seq
+                    if predicate is None or predicate(message):
+                        self._messages.remove(message)
+                        matched.append(message)
+                        if len(matched) >= count:
+                            return matched
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Expected " + str(count) + " matching MQTT messages in " + str(timeout) +
+                                       "s, but actually got " + str(len(matched)) + ", " +
+                                       str(len(self._messages)) + " other messages are buffered")
+                self._condition.wait(remaining)
+
+    def drain(self):
+        """
+        :return: list of all the buffered messages, the queue is empty after it
+        """
+        with self._condition:
+            messages = list(self._messages)
+            self._messages.clear()
+        return messages
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self._connect_result = rc
+        if rc == 0:
+            # subscribe again after a reconnection
+            for topic, qos in self._topics.items():
+                client.subscribe(topic, qos)
+        self._connected.set()
+
+    def _on_subscribe(self, client, userdata, mid, granted_qos):
+        with self._subscribed:
+            self._subacks[mid] = granted_qos
+            self._subscribed.notify_all()
+
+    def _on_disconnect(self, client, userdata, rc):
+        if rc != 0:
+            logger.warning("=== MQTT connection lost: " + mqtt.error_string(rc) + ", reconnecting")
+
+    def _on_message(self, client, userdata, msg):
+        with self._condition:
+            self._seq += 1
+            if len(self._messages) >= self.config["queue_size"]:
+                self._messages.popleft()
+                self.dropped += 1
+            self._messages.append(MqttMessage(self._seq, msg.topic, msg.payload, msg.qos, msg.retain))
+            self._condition.notify_all()
@@ -0,0 +1,102 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Paginator:
+    """
+    Iterate the records of a paged API across all its pages, e.g.
+
+        for record in Paginator(lambda page: api.sensor_data(token, device_id, start, end, page_number=page,
+                                                             page_size=500, is_304=True), page_size=500):
+            ...
+
+    The next pages are requested in the background while the current one is consumed, at most "max_in_flight"
+    pages are requested ahead, so the memory stays bounded: the consumed page and max_in_flight pages.
+    The iteration stops at the first page which is shorter than page_size, or at the "total" of the response.
+    """
+
+    # the keys of the records list in the "result" of the response body
+    RECORD_KEYS = ("data", "list", "records", "rows")
+
+    def __init__(self, fetch_page, page_size=100, max_in_flight=1, first_page=1, records=None):
+        """
+        :param fetch_page: callable(page_number) which sends the request of the page and returns the ApiResponse
+        :param page_size: the page size of the requests, a shorter page is the last one
+        :param max_in_flight: the max number of pages requested ahead of the consumed one, 0 means no prefetch
+        :param first_page: the number of the first page
+        :param records: (optional) callable(response body) which returns (records list, total or None),
+            default is Paginator.page_records
+        """
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.max_in_flight = max(max_in_flight, 0)
+        self.first_page = first_page
+        self.records = records or self.page_records
+        self.pages = 0
+
+    @classmethod
+    def page_records(cls, body):
+        """
+        find the records list and the total count in the response body, a 304 body has no record
+        :param body: the json body of a page
+        :return: (list of records, total or None)
+        """
+        if not isinstance(body, dict) or body.get("code") == 304:
+            return [], None
+        result = body.get("result", body)
+        if isinstance(result, list):
+            return result, None
+        if not isinstance(result, dict):
+            return [], None
+        total = result.get("total")
+        for key in cls.RECORD_KEYS:
+            if isinstance(result.get(key), list):
+                return result[key], total if isinstance(total, int) else None
+        if isinstance(body.get("data"), list):
+            return body["data"], total if isinstance(total, int) else None
+        return [], None
+
+    def __iter__(self):
+        for records in self.iter_pages():
+            for record in records:
+                yield record
+
+    def iter_pages(self):
+        """
+        the same as iterating the records, but yield the records list of every page, e.g. to build a frame per page
+        :return: generator of list
+        """
+        executor = ThreadPoolExecutor(max_workers=max(self.max_in_flight, 1), thread_name_prefix="Paginator")
+        futures = collections.deque()
+        next_page = self.first_page
+        last_page = None
+        try:
+            futures.append(executor.submit(self.fetch_page, next_page))
+            next_page += 1
+            while futures:
+                response = futures.popleft().result()
+                self.pages += 1
+                records, total = self.records(response.body)
+                page_number = next_page - len(futures) - 1
+                if total is not None:
+                    last_page = self.first_page + max((total + self.page_size - 1) // self.page_size, 1) - 1
+                is_last = len(records) < self.page_size or (last_page is not None and page_number >= last_page)
+                if is_last:
+                    # the pages requested ahead are not needed
+                    for future in futures:
+                        future.cancel()
+                    futures.clear()
+                else:
+                    # request the next pages while this one is consumed
+                    while len(futures) < self.max_in_flight and (last_page is None or next_page <= last_page):
+                        futures.append(executor.submit(self.fetch_page, next_page))
+                        next_page += 1
+                yield records
+                if not is_last and not futures:
+                    # no prefetch, request the next page after this one is consumed
+                    futures.append(executor.submit(self.fetch_page, next_page))
+                    next_page += 1
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
@@ -0,0 +1,521 @@
+import collections
+import hashlib
+import json
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+
+
+class _Stop(Exception):
+    """
+    stop the validation at the first error in the fail fast mode
+    """
+
+
+class ExpectedXml:
+    """
+    An expected xml compiled once into a reusable validator, the rules of JsonUtils.dict_compare applied to the xml:
+
+    - the expected xml is a subset of the actual one: every element and attribute of the expected xml should be
+      in the actual xml, the extra elements and attributes of the actual xml are not checked
+    - an expected attribute value or text is a regular expression which should match the whole actual one,
+      e.g. "\\d+", an empty expected text means any text
+    - the child elements with the same tag are compared one by one, or with ignore_order, every expected element
+      should match a different actual element
+    - exclude_paths are the paths of the elements or the attributes which are not compared, e.g.
+      "/feed/entry[2]/updated", or without the indexes for all of them, e.g. "/feed/entry/@id"
+    - the expected tags and attributes without a namespace match the local names, e.g. <feed> matches
+      <feed xmlns="http://www.w3.org/2005/Atom">, the ones with a namespace should be the same
+
+    The expected xml can also be a dict of the XPath-like selectors and the expected values, e.g.
+
+        ExpectedXml.get({"entry[1]/title": "a", "entry/@id": "\\d+", "/feed/author/name": None}).assert_match(response)
+
+    a selector is a path of the tags from the root element, it starts with the root tag if it starts with "/",
+    "*" is any tag, [n] is the n-th element of the tag (from 1), and the last step can be @attribute or text().
+    Every selected value should match the expected value, and every selector should select a value at least,
+    None means any value. The tags without a namespace match the local names, e.g. "entry" matches
+    "{http://www.w3.org/2005/Atom}entry".
+
+    The response is parsed incrementally, the body of an ApiStreamResponse is read chunk by chunk, the elements
+    are compared when they end and then cleared, so only the open elements are in memory. With ignore_order an
+    element is kept until its end to be compared with the candidates.
+    The validators are cached by the content hash of the expected xml and the options, e.g.
+
+        expected = ExpectedXml.get(expected_xml, ignore_order=True)
+        for response in responses:
+            expected.assert_match(response)
+    """
+
+    STEP = re.compile(r"^(\*|(?:\{[^}]*\})?[^\[\]/@{}*]+)(?:\[(\d+)\])?$")
+    INDEX = re.compile(r"\[\d+\]")
+
+    CACHE_SIZE = 64
+    _cache = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, expected, ignore_order=False, ignore_string_case=False, exclude_paths=None):
+        """
+        :param expected: the expected xml as str, bytes or an Element, or a dict of the selectors and the values
+        :param ignore_order: ignore the order of the child elements with the same tag
+        :param ignore_string_case: match the attribute values and the texts case insensitively
+        :param exclude_paths: (optional) list of the paths of the elements and the attributes which are not compared
+        """
+        self.expected = expected
+        self.ignore_order = ignore_order
+        self.flags = re.I if ignore_string_case else 0
+        self.excluded = set(exclude_paths or [])
+        if isinstance(expected, dict):
+            self.root = None
+            self.selectors = [_Selector(str(path), value, self.flags) for path, value in expected.items()]
+        else:
+            element = expected if ElementTree.iselement(expected) else ElementTree.fromstring(expected)
+            self.root = _XmlNode(element, self.flags)
+            self.selectors = []
+
+    @classmethod
+    def get(cls, expected, ignore_order=False, ignore_string_case=False, exclude_paths=None):
+        """
+        get the compiled validator from the cache, compile it if missing
+        :return: ExpectedXml
+        """
+        key = cls.content_hash(expected, ignore_order, ignore_string_case, exclude_paths)
+        with cls._cache_lock:
+            validator = cls._cache.get(key)
+            if validator is not None:
+                cls._cache.move_to_end(key)
+                return validator
+        validator = cls(expected, ignore_order=ignore_order, ignore_string_case=ignore_string_case,
+                        exclude_paths=exclude_paths)
+        with cls._cache_lock:
+            cls._cache[key] = validator
+            if len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return validator
+
+    @staticmethod
+    def content_hash(expected, *options):
+        if ElementTree.iselement(expected):
+            expected = ElementTree.tostring(expected)
+        if isinstance(expected, bytes):
+            expected = expected.decode("utf-8", "replace")
+        content = json.dumps([expected, options], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def local_name(tag):
+        """
+        :param tag: the tag of an element, e.g. "{http://www.w3.org/2005/Atom}entry"
+        :return: the tag without the namespace, e.g. "entry"
+        """
+        return tag.rsplit("}", 1)[-1] if tag[:1] == "{" else tag
+
+    @staticmethod
+    def tag_matches(expected, tag):
+        """
+        :param expected: the expected tag, without a namespace it matches the local name
+        :param tag: the actual tag, e.g. "{http://www.w3.org/2005/Atom}entry"
+        """
+        return expected == tag or (expected[:1] != "{" and ExpectedXml.local_name(tag) == expected)
+
+    @staticmethod
+    def attribute_of(element, name):
+        """
+        :param element: the actual element
+        :param name: the attribute name, without a namespace it matches the local name
+        :return: the attribute value, None if it is missing
+        """
+        value = element.get(name)
+        if value is None and name[:1] != "{":
+            for key, item in element.attrib.items():
+                if ExpectedXml.local_name(key) == name:
+                    return item
+        return value
+
+    def is_excluded(self, path):
+        return path in self.excluded or self.INDEX.sub("", path) in self.excluded
+
+    def validate(self, actual, fail_fast=False):
+        """
+        :param actual: ApiStreamResponse, ApiResponse, bytes, str, a binary file or an iterable of chunks
+        :param fail_fast: stop at the first error
+        :return: list of the error messages, empty if the actual xml matches, ValueError if it is not a valid xml
+        """
+        return _Validation(self, fail_fast).run(actual)
+
+    def assert_match(self, actual, fail_fast=False):
+        """
+        Assert the actual xml or the body of the response matches the expected xml
+        :return: the validator itself
+        """
+        errors = self.validate(actual, fail_fast)
+        if len(errors) > 0:
+            raise AssertionError(errors)
+        return self
+
+
+class _Value:
+    """
+    an expected attribute value or text
+    """
+
+    _NOT_COMPILED = object()
+
+    def __init__(self, expected, flags):
+        self.expected = str(expected)
+        self.flags = flags
+        # most of the values are matched by equality, the pattern is compiled by the first mismatch and kept
+        self._pattern = self._NOT_COMPILED
+
+    @property
+    def pattern(self):
+        if self._pattern is self._NOT_COMPILED:
+            try:
+                self._pattern = re.compile("^" + self.expected + "$", self.flags)
+            except re.error:
+                # not a valid regular expression, only the equal value matches
+                self._pattern = None
+        return self._pattern
+
+    def matches(self, actual):
+        if actual == self.expected or (self.flags and actual.lower() == self.expected.lower()):
+            return True
+        return self.pattern is not None and self.pattern.match(actual) is not None
+
+
+class _XmlNode:
+    """
+    an expected element
+    """
+
+    def __init__(self, element, flags):
+        self.tag = element.tag
+        self.attributes = [(name, _Value(value, flags)) for name, value in element.attrib.items()]
+        text = (element.text or "").strip()
+        self.text = _Value(text, flags) if text else None
+        # the tag -> the expected child elements of the tag, in the document order
+        self.children = collections.OrderedDict()
+        for child in element:
+            if isinstance(child.tag, str):
+                self.children.setdefault(child.tag, []).append(_XmlNode(child, flags))
+        self.source = ElementTree.tostring(element, encoding="unicode").strip()
+
+    def key_of(self, tag, name):
+        """
+        :param tag: the tag of an actual child element
+        :param name: the local name of the tag
+        :return: the tag of the expected children it is compared with, None if there is not one
+        """
+        if tag in self.children:
+            return tag
+        if name != tag and name in self.children:
+            return name
+        return None
+
+
+class _Selector:
+    """
+    an XPath-like selector and its expected value
+    """
+
+    def __init__(self, expression, expected, flags):
+        self.expression = expression
+        self.expected = None if expected is None else _Value(expected, flags)
+        self.attribute = None
+        self.text = False
+        text = expression.strip()
+        self.absolute = text.startswith("/")
+        if "//" in re.sub(r"\{[^}]*\}", "", text):
+            raise ValueError("Invalid selector: " + expression + ", // is not supported")
+        parts = re.findall(r"(?:\{[^}]*\}|[^/{])+", text)
+        if parts and parts[-1].startswith("@"):
+            self.attribute = parts.pop()[1:]
+        elif parts and parts[-1] == "text()":
+            parts.pop()
+            self.text = True
+        # list of (tag, index), the index is from 1 or None for all the elements of the tag
+        self.steps = []
+        for part in parts:
+            match = ExpectedXml.STEP.match(part)
+            if match is None:
+                raise ValueError("Invalid selector: " + expression + ", at: " + part)
+            self.steps.append((match.group(1), int(match.group(2)) if match.group(2) else None))
+        if self.absolute and not self.steps:
+            raise ValueError("Invalid selector: " + expression + ", the root tag is missing")
+
+    def step_matches(self, position, tag, name, index, total):
+        """
+        :param position: the position of the step
+        :param tag: the tag of the element
+        :param name: the local name of the tag
+        :param index: the index of the element in the elements of its tag, from 1
+        :param total: the index of the element in all the child elements, from 1
+        """
+        step, expected_index = self.steps[position]
+        if step == "*":
+            return expected_index is None or expected_index == total
+        if step != tag and ("}" in step or step != name):
+            return False
+        return expected_index is None or expected_index == index
+
+    def value_of(self, element):
+        """
+        :return: the selected attribute value or text of the element, None if the attribute is missing
+        """
+        if self.attribute is not None:
+            return ExpectedXml.attribute_of(element, self.attribute)
+        return (element.text or "").strip()
+
+
+class _Frame:
+    """
+    an open element of the actual xml
+    """
+
+    __slots__ = ("element", "parent", "name", "index", "key", "node", "counts", "matched", "total", "states", "hold",
+                 "unmatched")
+
+    def __init__(self, element, parent, name, index, key, node, states, hold):
+        self.element = element
+        self.parent = parent
+        self.name = name
+        # the index of the element in the elements of its tag, from 1
+        self.index = index
+        # the tag of the expected elements of the parent which the element is compared with
+        self.key = key
+        # the expected element, None if the element is not compared
+        self.node = node
+        # the tag -> the number of the child elements of the tag so far
+        self.counts = {}
+        # the tag of the expected children -> the number of the actual child elements compared with them so far
+        self.matched = {}
+        self.total = 0
+        # list of (selector, the number of the matched steps)
+        self.states = states
+        # the subtree is kept until the end of the element
+        self.hold = hold
+        # with ignore_order, the tag -> the expected child elements which are not matched yet
+        self.unmatched = None
+
+    @property
+    def path(self):
+        """
+        the path of the element, e.g. "/feed/entry[2]/title[1]", it is only built for the compared elements and
+        the errors
+        """
+        if self.parent is None:
+            return "/" + self.name
+        return self.parent.path + "/" + self.name + "[" + str(self.index) + "]"
+
+
+class _Validation:
+    """
+    the state of one validation
+    """
+
+    def __init__(self, schema, fail_fast):
+        self.schema = schema
+        self.fail_fast = fail_fast
+        self.errors = []
+        self.frames = []
+        self.selected = dict.fromkeys(schema.selectors, 0)
+        # the tag -> its local name
+        self.names = {}
+
+    def run(self, source):
+        parser = ElementTree.XMLPullParser(events=("start", "end"))
+        chunks = self._chunks(source)
+        try:
+            for chunk in chunks:
+                parser.feed(chunk)
+                self._read(parser)
+            parser.close()
+            self._read(parser)
+        except _Stop:
+            return self.errors
+        except ElementTree.ParseError as e:
+            raise ValueError("The response body is not a valid xml: " + str(e))
+        finally:
+            if hasattr(chunks, "close"):
+                # release the connection of a streamed response
+                chunks.close()
+        for selector, count in self.selected.items():
+            if count == 0:
+                self.errors.append("Element in the response body is missing: " + selector.expression)
+        return self.errors
+
+    @staticmethod
+    def _chunks(source):
+        if hasattr(source, "iter_chunks"):
+            return source.iter_chunks()
+        if hasattr(source, "content") and not isinstance(source, (bytes, str)):
+            source = source.content
+        if isinstance(source, (bytes, str)):
+            # the parser builds the elements of a chunk before its events are read, so a loaded body is fed in
+            # slices to clear them as they end
+            return (source[start:start + 64 * 1024] for start in range(0, len(source), 64 * 1024))
+        if hasattr(source, "read"):
+            return iter(lambda: source.read(64 * 1024), b"")
+        return iter(source)
+
+    def _read(self, parser):
+        for event, element in parser.read_events():
+            if event == "start":
+                self._start(element)
+            else:
+                self._end(element)
+
+    def error(self, message):
+        self.errors.append(message)
+        if self.fail_fast:
+            raise _Stop()
+
+    def _start(self, element):
+        schema = self.schema
+        tag = element.tag
+        name = self.names.get(tag)
+        if name is None:
+            name = self.names[tag] = ExpectedXml.local_name(tag)
+        parent = self.frames[-1] if self.frames else None
+        node = key = None
+        hold = False
+        if parent is None:
+            index = 1
+            states = [(selector, 0) for selector in schema.selectors if not selector.absolute]
+            states.extend((selector, 1) for selector in schema.selectors
+                          if selector.absolute and selector.step_matches(0, tag, name, 1, 1))
+            if schema.root is not None:
+                if ExpectedXml.tag_matches(schema.root.tag, tag):
+                    node = schema.root
+                else:
+                    self.error("Element in the response body is not matching: /" + name + ", expected: < " +
+                               schema.root.tag + " > but actually: < " + tag + " >")
+        else:
+            index = parent.counts[tag] = parent.counts.get(tag, 0) + 1
+            total = parent.total = parent.total + 1
+            states = [(selector, position + 1) for selector, position in parent.states
+                      if position < len(selector.steps) and selector.step_matches(position, tag, name, index, total)] \
+                if parent.states else parent.states
+            if parent.hold:
+                hold = True
+            elif parent.node is not None:
+                key = parent.node.key_of(tag, name)
+                if key is None:
+                    pass
+                elif parent.unmatched is not None:
+                    hold = bool(parent.unmatched[key])
+                else:
+                    position = parent.matched[key] = parent.matched.get(key, 0) + 1
+                    candidates = parent.node.children[key]
+                    if position <= len(candidates):
+                        node = candidates[position - 1]
+        frame = _Frame(element, parent, name, index, key, node, states, hold)
+        if node is not None and parent is not None and schema.excluded and schema.is_excluded(frame.path):
+            frame.node = node = None
+        if node is not None and schema.ignore_order:
+            path = frame.path
+            frame.unmatched = {child_tag: [child for position, child in enumerate(children)
+                                           if not schema.is_excluded(path + "/" + ExpectedXml.local_name(child_tag) +
+                                                                     "[" + str(position + 1) + "]")]
+                               for child_tag, children in node.children.items()}
+        self.frames.append(frame)
+
+    def _end(self, element):
+        schema = self.schema
+        frame = self.frames.pop()
+        parent = self.frames[-1] if self.frames else None
+        if frame.node is not None:
+            path = frame.path
+            self._check_element(frame.node, element, path, self.error)
+            for tag, children in frame.node.children.items():
+                name = path + "/" + ExpectedXml.local_name(tag)
+                if frame.unmatched is not None:
+                    for child in frame.unmatched[tag]:
+                        self.error("Item in the response body is missing: " + name + ", expected: < " +
+                                   child.source + " >")
+                else:
+                    for position in range(frame.matched.get(tag, 0), len(children)):
+                        child_path = name + "[" + str(position + 1) + "]"
+                        if not schema.is_excluded(child_path):
+                            self.error("Element in the response body is missing: " + child_path)
+        elif frame.hold and parent is not None and not parent.hold:
+            # an element kept for ignore_order, it is matched with the expected elements of its tag
+            candidates = parent.unmatched[frame.key]
+            for position, candidate in enumerate(candidates):
+                if self._is_matching(candidate, element, frame.path):
+                    del candidates[position]
+                    break
+        for selector, position in frame.states:
+            if position == len(selector.steps):
+                self._check_selector(selector, element, frame)
+        if parent is None or not parent.hold:
+            element.clear()
+            if parent is not None:
+                parent.element.remove(element)
+
+    def _check_selector(self, selector, element, frame):
+        value = selector.value_of(element)
+        if value is None:
+            return
+        self.selected[selector] += 1
+        if selector.expected is not None and not selector.expected.matches(value):
+            kind = "Attribute" if selector.attribute is not None else "Element"
+            path = frame.path
+            if selector.attribute is not None:
+                path += "/@" + selector.attribute
+            self.error(kind + " in the response body is not matching: " + path + ", expected: < " +
+                       selector.expected.expected + " > but actually: < " + value + " >")
+
+    def _check_element(self, node, element, path, error):
+        schema = self.schema
+        for name, value in node.attributes:
+            attribute_path = path + "/@" + ExpectedXml.local_name(name)
+            if schema.is_excluded(attribute_path):
+                continue
+            actual = ExpectedXml.attribute_of(element, name)
+            if actual is None:
+                error("Attribute in the response body is missing: " + attribute_path)
+            elif not value.matches(actual):
+                error("Attribute in the response body is not matching: " + attribute_path + ", expected: < " +
+                      value.expected + " > but actually: < " + actual + " >")
+        if node.text is not None:
+            actual = (element.text or "").strip()
+            if not node.text.matches(actual):
+                error("Element in the response body is not matching: " + path + ", expected: < " +
+                      node.text.expected + " > but actually: < " + actual + " >")
+
+    def _compare(self, node, element, path, error):
+        """
+        compare an element which is kept in memory with its subtree
+        """
+        schema = self.schema
+        self._check_element(node, element, path, error)
+        for tag, children in node.children.items():
+            actual = [child for child in element if ExpectedXml.tag_matches(tag, child.tag)]
+            name = path + "/" + ExpectedXml.local_name(tag)
+            used = set()
+            for position, child in enumerate(children):
+                child_path = name + "[" + str(position + 1) + "]"
+                if schema.is_excluded(child_path):
+                    continue
+                if not schema.ignore_order:
+                    if position < len(actual):
+                        self._compare(child, actual[position], child_path, error)
+                    else:
+                        error("Element in the response body is missing: " + child_path)
+                    continue
+                for candidate, item in enumerate(actual):
+                    if candidate not in used and self._is_matching(child, item, name + "[" + str(candidate + 1) + "]"):
+                        used.add(candidate)
+                        break
+                else:
+                    error("Item in the response body is missing: " + name + ", expected: < " + child.source + " >")
+
+    def _is_matching(self, node, element, path):
+        def stop(message):
+            raise _Stop()
+        try:
+            self._compare(node, element, path, stop)
+        except _Stop:
+            return False
+        return True
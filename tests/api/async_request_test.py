@@ -0,0 +1,55 @@
+import asyncio
+import allure
+from libs.common.async_transport import AsyncHttpTransport, AsyncLimiter
+from libs.common.request import ApiRequest
+
+
+def run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await AsyncHttpTransport.close()
+    return asyncio.run(main())
+
+
+@allure.story('Async requests')
+class TestAsyncRequest:
+    """ApiRequest.send_async returns the same ApiResponse as send"""
+
+    def test_send_async(self, local_api):
+        response = run(ApiRequest.get(local_api.url).add_path("device").add_param("id", "D1")
+                       .add_header("idToken", "token").send_async())
+        response.assert_status(200)
+        assert response.body["path"] == "/device"
+        assert response.body["query"] == {"id": "D1", "test": "automation"}
+        assert response.body["headers"]["idToken"] == "token"
+
+    def test_post_json_async(self, local_api):
+        response = run(ApiRequest.post(local_api.url).add_path("device").set_body({"name": "D1"}).send_async())
+        assert response.body["contentType"] == "application/json"
+        assert response.body["body"] == '{"name":"D1"}'
+
+    def test_send_many_async_is_bounded(self, local_api):
+        local_api.max_in_flight = 0
+        requests = [ApiRequest.get(local_api.url).add_path("slow").add_param("t", "0.1").add_param("i", str(index))
+                    for index in range(12)]
+        responses = run(ApiRequest.send_many_async(requests, concurrency=4))
+        assert [response.body["query"]["i"] for response in responses] == [str(index) for index in range(12)]
+        assert local_api.max_in_flight == 4
+
+    def test_limiter_per_loop(self):
+        limiter = AsyncLimiter(2)
+        counts = []
+
+        async def task():
+            async with limiter:
+                counts.append(limiter._semaphore()._value)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(*[task() for _ in range(5)])
+        # the same limiter works on another loop
+        asyncio.run(main())
+        asyncio.run(main())
+        assert min(counts) == 0 and len(counts) == 10
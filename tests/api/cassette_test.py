@@ -0,0 +1,83 @@
+import io
+import pytest
+import allure
+from libs.common.cassette import Cassette, CassetteMode
+from libs.common.request import ApiRequest
+
+
+def recorded_response(body):
+    return Cassette._to_response({"status": 200, "url": "http://localhost/api", "reason": "OK", "encoding": "utf-8",
+                                  "headers": {"Content-Type": "application/json"}, "elapsed": 0.1, "body": body,
+                                  "base64": False})
+
+
+def record(cassette, url, body):
+    cassette._record(Cassette.make_key("GET", url), "GET", url, recorded_response(body))
+
+
+@allure.story('Cassette')
+class TestCassetteWorkers:
+    """The xdist workers record into their own part files, the controller merges them"""
+
+    @pytest.mark.parametrize("mode", [CassetteMode.Record, CassetteMode.NewEpisodes])
+    def test_workers_merge(self, tmp_path, monkeypatch, mode):
+        path = str(tmp_path / "api.jsonl.gz")
+        monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+        old = Cassette(path, CassetteMode.Record)
+        record(old, "http://localhost/old", "old")
+        old.close()
+
+        for worker in ("gw0", "gw1"):
+            monkeypatch.setenv("PYTEST_XDIST_WORKER", worker)
+            cassette = Cassette(path, mode)
+            record(cassette, "http://localhost/" + worker, worker)
+            cassette.close()
+        # the workers don't touch the shared cassette
+        assert len(Cassette(path, CassetteMode.Replay)._index) == 1
+
+        monkeypatch.delenv("PYTEST_XDIST_WORKER")
+        Cassette.merge_workers(path)
+        assert list(tmp_path.iterdir()) == [tmp_path / "api.jsonl.gz"]
+        replay = Cassette(path, CassetteMode.Replay)
+        for worker in ("gw0", "gw1"):
+            response = replay._replay(Cassette.make_key("GET", "http://localhost/" + worker), "GET", worker)
+            assert response.text == worker
+        assert (Cassette.make_key("GET", "http://localhost/old") in replay._index) == (mode != CassetteMode.Record)
+
+
+@allure.story('Cassette')
+class TestCassetteStreaming:
+    """The streamed bodies are recorded while they are read"""
+
+    @pytest.fixture
+    def cassette_path(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+        yield str(tmp_path / "api.jsonl")
+        Cassette.use(None, CassetteMode.Off)
+
+    def test_record_and_replay_a_stream(self, local_api, cassette_path):
+        Cassette.use(cassette_path, CassetteMode.Record)
+        with ApiRequest.get(local_api.url).add_path("bytes").add_param("n", 200000).stream(chunk_size=4096) as response:
+            # the body is still on the connection, it is recorded while the chunks are read
+            assert not response._response._content_consumed
+            chunks = list(response.iter_chunks())
+        assert len(chunks) > 1 and sum(len(chunk) for chunk in chunks) == 200000
+        # a body which is not read to the end is not recorded
+        ApiRequest.get(local_api.url).add_path("bytes").add_param("n", 10).stream().close()
+        Cassette.use(cassette_path, CassetteMode.Replay)
+        with ApiRequest.get(local_api.url).add_path("bytes").add_param("n", 200000).stream() as response:
+            assert b"".join(response.iter_chunks()) == b"x" * 200000
+        with pytest.raises(LookupError):
+            ApiRequest.get(local_api.url).add_path("bytes").add_param("n", 10).send()
+
+    @pytest.mark.parametrize("content", ["café 中文 \"quoted\"\n".encode("utf-8") * 50,
+                                         bytes(range(256)) * 20])
+    def test_body_written_in_pieces(self, cassette_path, monkeypatch, content):
+        # the small blocks split the multi-byte characters and the base64 groups
+        monkeypatch.setattr(Cassette, "BLOCK_SIZE", 7)
+        cassette = Cassette(cassette_path, CassetteMode.Record)
+        key = Cassette.make_key("GET", "http://localhost/body")
+        cassette._record(key, "GET", "http://localhost/body", recorded_response(""), io.BytesIO(content))
+        cassette.close()
+        replay = Cassette(cassette_path, CassetteMode.Replay)
+        assert replay._replay(key, "GET", "http://localhost/body").content == content
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+
+class LocalApiHandler(BaseHTTPRequestHandler):
+    """
+    the endpoints of the local server which the API tests send their requests to:
+    GET /etag answers 304 to the If-None-Match of its ETag, GET /fail answers 503,
+    GET /bytes?n= sends n bytes, GET /slow?t= answers after t seconds and counts the requests in flight,
+    GET /poll?deviceId=&ready= answers the code 304 until the device is polled "ready" times,
+    GET /cookie sets a cookie,
+    any other GET or POST echoes the request as json
+    """
+
+    protocol_version = "HTTP/1.1"
+    ETAG = '"v1"'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.requests.append(("GET", url.path, dict(self.headers)))
+        if url.path == "/etag":
+            if self.headers.get("If-None-Match") == self.ETAG:
+                return self.reply(304, b"", {"ETag": self.ETAG})
+            return self.reply(200, {"code": 200, "version": 1}, {"ETag": self.ETAG})
+        if url.path == "/fail":
+            return self.reply(503, {"code": 503})
+        if url.path == "/slow":
+            with self.server.lock:
+                self.server.in_flight += 1
+                self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            time.sleep(float(query.get("t", 0.1)))
+            with self.server.lock:
+                self.server.in_flight -= 1
+            return self.reply(200, {"code": 200, "query": query})
+        if url.path == "/poll":
+            with self.server.lock:
+                polls = self.server.polls.get(query["deviceId"], 0) + 1
+                self.server.polls[query["deviceId"]] = polls
+            if polls < int(query.get("ready", 1)):
+                return self.reply(200, {"code": 304})
+            return self.reply(200, {"code": 200, "result": {"deviceId": query["deviceId"], "polls": polls}})
+        if url.path == "/cookie":
+            return self.reply(200, {"code": 200}, {"Set-Cookie": "session=abc; Path=/"})
+        if url.path == "/bytes":
+            return self.reply(200, b"x" * int(query.get("n", 0)), {"Content-Type": "application/octet-stream"})
+        self.reply(200, {"code": 200, "path": url.path, "query": query, "headers": dict(self.headers)})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append(("POST", url.path, dict(self.headers)))
+        self.reply(200, {"code": 200, "path": url.path, "length": len(body),
+                         "contentType": self.headers.get("Content-Type"), "body": body.decode("latin1")})
+
+    def reply(self, status, body, headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        headers = dict({"Content-Type": "application/json"}, **(headers or {}))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def local_api():
+    """
+    a local HTTP server on a free port, the requests it received are in local_api.requests
+    :return: the server, its url is local_api.url
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LocalApiHandler)
+    server.requests = []
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    # device id -> the number of its polls
+    server.polls = {}
+    server.url = "http://127.0.0.1:" + str(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
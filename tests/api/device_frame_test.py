@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+import allure
+from libs.utils.device_frame import DeviceFrame
+
+
+def records():
+    return [
+        {"deviceId": "D1", "timestamp": 1700000000000, "value": "21.5", "peopleCnt": 1},
+        {"deviceId": "D1", "timestamp": 1700000060000, "value": "22", "peopleCnt": 2},
+        {"deviceId": "D2", "timestamp": 1700000000000, "value": "19", "peopleCnt": 0},
+        {"deviceId": "D2", "timestamp": 1700000600000, "value": "20", "peopleCnt": 3},
+    ]
+
+
+@allure.story('Device data frame')
+class TestDeviceFrame:
+    """The typed frame of the device data and its vectorized assertions"""
+
+    def test_typed_columns(self):
+        frame = DeviceFrame.from_pages([records()[:2], [], records()[2:]]).frame
+        assert str(frame["timestamp"].dtype) == "datetime64[ns, UTC]"
+        assert frame["deviceId"].dtype == "category"
+        assert pd.api.types.is_float_dtype(frame["value"])
+        assert frame["timestamp"][0] == pd.Timestamp("2023-11-14 22:13:20", tz="UTC")
+
+    def test_range(self):
+        frame = DeviceFrame.from_records(records())
+        frame.assert_not_empty().assert_range("value", min_value=19, max_value=22)
+        with pytest.raises(AssertionError, match="1 values of value are not numbers or out of"):
+            frame.assert_range("value", max_value=21.5)
+
+    @pytest.mark.parametrize("values, failures", [
+        ([1, "2", "x", 3.5], 1),
+        ([1, {"v": 2}, [3], None], 3),
+        (["a", "b"], 2),
+    ])
+    def test_range_of_mixed_values(self, values, failures):
+        frame = DeviceFrame(pd.DataFrame({"value": values}))
+        with pytest.raises(AssertionError, match="^" + str(failures) + " values of value"):
+            frame.assert_range("value", min_value=0)
+        frame = DeviceFrame(pd.DataFrame({"value": [1, "2", None]}))
+        frame.assert_range("value", min_value=0, allow_null=True)
+
+    def test_time_order_and_gaps(self):
+        frame = DeviceFrame.from_records(records())
+        frame.assert_monotonic_time().assert_no_gaps("10min")
+        gaps = frame.gaps("5min")
+        assert list(gaps["device"]) == ["D2"] and list(gaps["duration"]) == [pd.Timedelta("10min")]
+        with pytest.raises(AssertionError, match="earlier than the previous one"):
+            DeviceFrame.from_records(list(reversed(records()))).assert_monotonic_time()
+
+    def test_aggregate(self):
+        frame = DeviceFrame.from_records(records())
+        frame.assert_aggregate("peopleCnt", "sum", expected=6)
+        frame.assert_aggregate("peopleCnt", "count", expected=2, by="deviceId")
+        with pytest.raises(AssertionError, match="Expected the max of peopleCnt"):
+            frame.assert_aggregate("peopleCnt", "max", max_value=2, by="deviceId")
@@ -0,0 +1,56 @@
+import time
+import allure
+from libs.common.request import ApiRequest
+from libs.utils.device_poller import DevicePoller
+
+
+def poller(local_api, ready, **options):
+    options = dict({"min_interval": 0.01, "max_interval": 0.05, "backoff": 2, "rate": 0}, **options)
+    return DevicePoller(lambda sub: ApiRequest.get(local_api.url).add_path("poll")
+                        .add_param("deviceId", sub.device_id).add_param("ready", ready[sub.device_id]), **options)
+
+
+@allure.story('Device poller')
+class TestDevicePoller:
+    """Many devices are polled on one event loop until their data arrives"""
+
+    def test_results_as_they_arrive(self, local_api):
+        local_api.polls.clear()
+        ready = {"P1": 5, "P2": 2, "P3": 1}
+        device_poller = poller(local_api, ready)
+        subscriptions = {device: device_poller.subscribe(device, 1) for device in ready}
+        results = [(subscription.device_id, response.body["result"]["polls"])
+                   for subscription, response in device_poller.poll(timeout=10)]
+        assert results == [("P3", 1), ("P2", 2), ("P1", 5)]
+        for device, subscription in subscriptions.items():
+            assert subscription.done and subscription.polls == ready[device] and subscription.results == 1
+            # the interval goes back to the shortest one after the data arrives
+            assert subscription.interval == 0.01
+        # the request is built once and sent again by every poll
+        assert local_api.polls == ready
+
+    def test_backoff_and_timeout(self, local_api):
+        local_api.polls.clear()
+        device_poller = poller(local_api, {"P4": 1000})
+        subscription = device_poller.subscribe("P4", 1)
+        started = time.monotonic()
+        assert list(device_poller.poll(timeout=0.5)) == []
+        assert 0.5 <= time.monotonic() - started < 2
+        assert not subscription.done and subscription.interval == 0.05
+        # 0.01, 0.02, 0.04 then 0.05 between the polls, about 12 polls in 0.5s
+        assert 5 <= subscription.polls <= 14
+
+    def test_rate_limit(self, local_api):
+        local_api.polls.clear()
+        ready = {"R" + str(index): 2 for index in range(5)}
+        device_poller = poller(local_api, ready, rate=40)
+        for device in ready:
+            device_poller.subscribe(device, 1)
+        started = time.monotonic()
+        assert len(list(device_poller.poll(timeout=10))) == 5
+        # 10 requests at 40 per second
+        assert time.monotonic() - started >= 9 / 40.0
+
+    def test_has_data(self):
+        assert DevicePoller.has_data(type("Response", (), {"text": '{"code": 304}', "body": {"code": 304}})) is False
+        assert DevicePoller.has_data(type("Response", (), {"text": '{"code": 200}', "body": {"code": 200}}))
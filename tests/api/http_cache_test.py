@@ -0,0 +1,37 @@
+import allure
+from libs.common.http_cache import ConditionalCache
+from libs.common.request import ApiRequest
+from libs.common.transport import HttpTransport
+
+
+@allure.story('Conditional cache')
+class TestConditionalCache:
+    """The GET responses are answered from the cache only when a request asks for it"""
+
+    def test_off_by_default(self, local_api):
+        HttpTransport.get_instance().cache.clear()
+        del local_api.requests[:]
+        for _ in range(2):
+            response = ApiRequest.get(local_api.url).add_path("etag").send()
+            assert response.status == 200 and not response.from_cache
+        assert all("If-None-Match" not in headers for _, _, headers in local_api.requests)
+
+    def test_set_cache(self, local_api):
+        HttpTransport.get_instance().cache.clear()
+        del local_api.requests[:]
+        first = ApiRequest.get(local_api.url).add_path("etag").set_cache().send()
+        second = ApiRequest.get(local_api.url).add_path("etag").set_cache().send()
+        assert not first.from_cache
+        assert second.from_cache and second.status == 200 and second.body == {"code": 200, "version": 1}
+        assert local_api.requests[1][2]["If-None-Match"] == '"v1"'
+        # the caller's own conditional request gets the 304 of the server
+        response = ApiRequest.get(local_api.url).add_path("etag").set_cache() \
+            .add_header("If-None-Match", '"v1"').send()
+        assert response.status == 304 and not response.from_cache
+
+    def test_prepare(self):
+        cache = ConditionalCache(enabled=False)
+        assert cache.prepare("GET", "http://host/a") == (None, None)
+        assert cache.prepare("GET", "http://host/a", use_cache=True)[0] is not None
+        assert cache.prepare("POST", "http://host/a", use_cache=True)[0] is None
+        assert ConditionalCache().prepare("GET", "http://host/a", use_cache=False)[0] is None
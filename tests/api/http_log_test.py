@@ -0,0 +1,55 @@
+import itertools
+import pytest
+import allure
+from libs.common.request import ApiRequest, HttpLog
+from libs.utils.json_codec import JsonCodec
+
+
+@pytest.fixture()
+def http_log(monkeypatch):
+    """
+    collect the request/response logs instead of writing them
+    :return: the list of the logged messages
+    """
+    messages = []
+    monkeypatch.setattr(HttpLog, "log", classmethod(lambda cls, message: messages.append(message)))
+    monkeypatch.setattr(HttpLog, "_counter", itertools.count())
+    monkeypatch.setitem(HttpLog.config, "sample_rate", 1)
+    monkeypatch.setitem(HttpLog.config, "max_body_size", 10000)
+    return messages
+
+
+def exchanges(messages):
+    return messages.count("=" * 150)
+
+
+@allure.story('HTTP log')
+class TestHttpLog:
+    """The request/response logs are sampled, truncated and skipped when the level is disabled"""
+
+    def test_sampled(self, local_api, http_log, monkeypatch):
+        monkeypatch.setitem(HttpLog.config, "sample_rate", 3)
+        for _ in range(6):
+            ApiRequest.get(local_api.url).add_path("device").send().assert_status(200)
+        assert exchanges(http_log) == 2
+
+    def test_failures_always_logged(self, local_api, http_log, monkeypatch):
+        monkeypatch.setitem(HttpLog.config, "sample_rate", 100)
+        for _ in range(2):
+            ApiRequest.get(local_api.url).add_path("fail").send().assert_status(503)
+        assert exchanges(http_log) == 2
+        assert "<== Status: 503" in http_log
+
+    def test_truncated(self, local_api, http_log, monkeypatch):
+        monkeypatch.setitem(HttpLog.config, "max_body_size", 50)
+        ApiRequest.get(local_api.url).add_path("bytes").add_param("n", "200").send()
+        assert "<==   " + "x" * 50 + " ... (truncated, 200 chars in total)" in http_log
+
+    def test_disabled_level_skips_formatting(self, local_api, http_log, monkeypatch):
+        pretty = []
+        monkeypatch.setattr(JsonCodec, "pretty", lambda *args, **kwargs: pretty.append(args))
+        # below the DEBUG level of the logger
+        monkeypatch.setattr(HttpLog, "level", 5)
+        ApiRequest.post(local_api.url).set_body({"name": "device"}).send().assert_status(200)
+        ApiRequest.get(local_api.url).add_path("fail").send()
+        assert http_log == [] and pretty == []
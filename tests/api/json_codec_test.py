@@ -0,0 +1,39 @@
+import pytest
+import allure
+from libs.common.request import ApiRequest
+from libs.utils.json_codec import JsonCodec, orjson
+
+
+@allure.story('Json codec')
+class TestJsonCodec:
+    """The backends of JsonCodec parse and encode the same values"""
+
+    @pytest.fixture(params=["orjson", "json"])
+    def backend(self, request):
+        if request.param == "orjson" and orjson is None:
+            pytest.skip("orjson is not installed")
+        previous = JsonCodec.backend
+        JsonCodec.use(request.param)
+        yield request.param
+        JsonCodec.use(previous)
+
+    @pytest.mark.parametrize("text", [
+        '{"id": 18446744073709551616}',
+        '[-9223372036854775809, 123456789012345678901234567890]',
+        '{"id": 18446744073709551615, "name": "a"}',
+    ])
+    def test_long_integers_are_exact(self, backend, text):
+        assert JsonCodec.loads(text) == JsonCodec.loads(text.encode("utf-8"))
+        for value in (JsonCodec.loads(text), JsonCodec.loads(text.encode("utf-8"))):
+            items = value.values() if isinstance(value, dict) else value
+            assert all(type(item) is int for item in items if not isinstance(item, str))
+        assert JsonCodec.dumps(JsonCodec.loads(text)) == text.replace(" ", "")
+
+    def test_json_null_body(self, backend):
+        request = ApiRequest("http://localhost", "POST").set_body("null")
+        assert request.data == "null"
+        assert request.json_body is None
+        assert request.headers["Content-Type"] == "application/json"
+        request = ApiRequest("http://localhost", "POST").add_header("content-type", "text/plain").set_body(b"null")
+        assert request.data == b"null"
+        assert request.headers == {"content-type": "text/plain"}
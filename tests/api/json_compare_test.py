@@ -0,0 +1,97 @@
+import threading
+import pytest
+import allure
+from libs.utils.json_compare import ExpectedSchema
+from libs.utils.json_utils import JsonUtils
+
+
+def compare_errors(actual, expected, **options):
+    try:
+        JsonUtils.dict_compare(actual, expected, **options)
+    except AssertionError as e:
+        return e.args[0]
+    return []
+
+
+@allure.story('Json compare')
+class TestJsonCompare:
+    """The rules of dict_compare, the expected results are the ones of the DeepDiff flow it replaced"""
+
+    @pytest.mark.parametrize("actual, expected, ignore_order, passed", [
+        ([1, 2], [1, 2, 3], False, True),
+        ([1, 2], [1, 2, 3], True, True),
+        ([1, 1, 2], [1, 1, 1], True, True),
+        ([], [{"x": 1}], False, True),
+        ([], [{"x": 1}], True, True),
+        ([2, 1], [1, 2], True, True),
+        ([2, 1], [1, 2], False, False),
+        ([1], [3], False, False),
+        ([1], [3], True, False),
+        ([1, 2, 4], [1, 2, 3], True, False),
+        ([1, 2], [2, 3], True, False),
+        (["b"], [3], True, False),
+        ([3], ["\\d"], True, True),
+        ([{"a": [3, 2]}], [{"a": [2, 3, 4]}], True, True),
+        (["zz", "ab1"], ["ab\\d", "zz"], True, True),
+        ({"a": "1"}, {"a": 1}, False, True),
+    ])
+    def test_deepdiff_parity(self, actual, expected, ignore_order, passed):
+        assert (compare_errors(actual, expected, ignore_order=ignore_order) == []) == passed
+
+    @pytest.mark.parametrize("actual, expected", [
+        ([-2], [-1]),
+        ([{"v": -2}], [{"v": -1}]),
+        ({"a": [-2]}, {"a": [-1]}),
+        ([[-2, 0]], [[-1, 0]]),
+    ])
+    def test_unordered_items_of_the_same_hash(self, actual, expected):
+        # hash(-1) == hash(-2), the items are paired only if they are equal
+        assert hash(-1) == hash(-2)
+        assert compare_errors(actual, expected, ignore_order=True) != []
+
+    def test_unordered_item_reports_field_path(self):
+        errors = compare_errors([{"x": 5, "y": 7}, {"x": 1, "y": 3}], [{"x": 1, "y": 2}, {"x": 5, "y": 6}],
+                                ignore_order=True)
+        assert errors == [
+            "Field in the response body is not matching: root[0]['y'], expected: < 2 > but actually: < 3 >",
+            "Field in the response body is not matching: root[1]['y'], expected: < 6 > but actually: < 7 >",
+        ]
+
+    def test_missing_field(self):
+        assert compare_errors({"result": {}}, {"result": {"code": 200}}) == \
+            ["Field in the response body is missing: root['result']['code']"]
+        assert compare_errors({"a": 1, "b": {"c": "x"}}, {"a": 1, "b": {"c": "x", "d": None}}) == []
+
+    def test_exclude_paths_and_string_case(self):
+        assert compare_errors({"a": "ABC", "b": 2}, {"a": "abc", "b": 3}, ignore_string_case=True,
+                              exclude_paths=["root['b']"]) == []
+
+    def test_cached_schema_keeps_the_expected_content(self):
+        expected = {"code": 200, "data": {"v": 1}}
+        assert compare_errors({"code": 200, "data": {"v": 2}}, expected) != []
+        expected["data"]["v"] = 5
+        assert compare_errors({"code": 200, "data": {"v": 5}}, {"code": 200, "data": {"v": 1}}) != []
+        assert compare_errors({"code": 200, "data": {"v": 2}}, {"code": 200, "data": {"v": 1}}) == [
+            "Field in the response body is not matching: root['data']['v'], expected: < 1 > but actually: < 2 >"]
+        assert compare_errors({"code": 200, "data": {"v": 5}}, expected) == []
+
+    def test_cached_schema_shared_by_threads(self):
+        expected = [{"id": index, "name": "device\\d+"} for index in range(50)]
+        actual = [{"id": index, "name": "device" + str(index)} for index in reversed(range(50))]
+        errors = []
+        for _ in range(20):
+            schema = ExpectedSchema(expected, ignore_order=True)
+            barrier = threading.Barrier(4)
+
+            def validate():
+                barrier.wait()
+                try:
+                    schema.assert_match(actual)
+                except Exception as e:
+                    errors.append(e)
+            threads = [threading.Thread(target=validate) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert errors == []
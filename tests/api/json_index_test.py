@@ -0,0 +1,104 @@
+import random
+import pytest
+import allure
+from libs.utils.json_index import PathIndex
+from libs.utils.json_utils import JsonUtils
+
+
+BODY = {"code": 200, "data": [{"deviceId": "d1", "alert": {"alertType": 1}}, {"deviceId": "d2", "alert": {}}],
+        "tags": []}
+
+
+def recursive_dict_generator(indict, pre=None):
+    """the recursive dict_generator before the explicit stack, the reference of its output"""
+    pre = pre[:] if pre else []
+    if isinstance(indict, list):
+        if len(indict) == 0:
+            yield pre
+        else:
+            for i, v in enumerate(indict):
+                yield from recursive_dict_generator(v, pre + [str(i)])
+    elif isinstance(indict, dict):
+        for key, value in indict.items():
+            if isinstance(value, dict):
+                if len(value) == 0:
+                    yield pre + [key, '{}']
+                else:
+                    yield from recursive_dict_generator(value, pre + [key])
+            elif isinstance(value, list):
+                if len(value) == 0:
+                    yield pre + [key, '[]']
+                else:
+                    for i, v in enumerate(value):
+                        yield from recursive_dict_generator(v, pre + [key] + [str(i)])
+            elif isinstance(value, tuple):
+                if len(value) == 0:
+                    yield pre + [key, '()']
+                else:
+                    for v in value:
+                        yield from recursive_dict_generator(v, pre + [key])
+            else:
+                yield pre + [key, value]
+    else:
+        yield indict
+
+
+def random_json(rng, depth):
+    kind = rng.choice(["dict", "list", "tuple", "scalar"] if depth > 0 else ["scalar"])
+    if kind == "dict":
+        return {"k" + str(i): random_json(rng, depth - 1) for i in range(rng.randint(0, 3))}
+    if kind == "list":
+        return [random_json(rng, depth - 1) for _ in range(rng.randint(0, 3))]
+    if kind == "tuple":
+        return tuple(random_json(rng, depth - 1) for _ in range(rng.randint(0, 2)))
+    return rng.choice([0, 1.5, "s", None, True])
+
+
+@allure.story('Json flattener')
+class TestFlatten:
+    """A json is walked without recursion into (path, value) pairs"""
+
+    def test_paths(self):
+        assert list(JsonUtils.flatten(BODY)) == [
+            (("code",), 200), (("data", 0, "deviceId"), "d1"), (("data", 0, "alert", "alertType"), 1),
+            (("data", 1, "deviceId"), "d2"), (("data", 1, "alert"), {}), (("tags",), [])]
+
+    def test_limits(self):
+        assert [path for path, _ in JsonUtils.flatten(BODY, max_depth=1)] == [("code",), ("data",), ("tags",)]
+        assert [path for path, _ in JsonUtils.flatten(BODY, max_items=3, containers=True)] == [
+            (), ("code",), ("data",)]
+
+    def test_deep_payload(self):
+        value = {"leaf": 1}
+        for _ in range(5000):
+            value = {"child": [value]}
+        path, leaf = next(JsonUtils.flatten(value))
+        assert len(path) == 10001 and leaf == 1
+        assert next(JsonUtils.dict_generator(value))[-2:] == ["leaf", 1]
+
+    def test_dict_generator_same_as_recursive(self):
+        rng = random.Random(21)
+        for _ in range(2000):
+            value = random_json(rng, 4)
+            assert list(JsonUtils.dict_generator(value)) == list(recursive_dict_generator(value))
+
+
+@allure.story('Path index')
+class TestPathIndex:
+    """The fields of a json are looked up by path without walking it again"""
+
+    def test_lookups(self):
+        index = PathIndex(BODY)
+        assert index[("data", 0, "deviceId")] == "d1"
+        assert index["root['data'][1]['deviceId']"] == "d2"
+        assert index.get(["data", 0, "alert"]) == {"alertType": 1}
+        assert index.get(("data", 5), "none") == "none"
+        assert ("tags",) in index and ("tags", 0) not in index
+        with pytest.raises(KeyError, match=r"Field in the response body is missing: root\['data'\]\[2\]"):
+            index[("data", 2)]
+
+    def test_find(self):
+        index = PathIndex(BODY)
+        assert index.find("alertType") == [(("data", 0, "alert", "alertType"), 1)]
+        assert index.find_values("deviceId") == ["d1", "d2"]
+        assert index.find("missing") == []
@@ -0,0 +1,63 @@
+import pytest
+import allure
+from libs.common.request import ApiRequest
+from libs.utils.json_path import JsonPath
+from libs.utils.json_utils import JsonUtils
+
+
+BODY = {"result": {"idToken": "t"},
+        "data": [{"deviceId": "a", "alertType": 1, "level": 3, "value": 10},
+                 {"deviceId": "b", "alertType": 2, "level": 1, "value": 20},
+                 {"deviceId": "c", "alertType": 1, "level": 1, "value": 30}]}
+
+
+@allure.story('Json path')
+class TestJsonPath:
+    """A JSONPath expression is compiled once and cached"""
+
+    @pytest.mark.parametrize("expression, values", [
+        ("root['result']['idToken']", ["t"]),
+        ("data[1].value", [20]),
+        ("$.data[*].value", [10, 20, 30]),
+        ("$.data[-1].deviceId", ["c"]),
+        ("$.data[0:2].deviceId", ["a", "b"]),
+        ("$.data[0,2].deviceId", ["a", "c"]),
+        ("$.result.*", ["t"]),
+        ("$..deviceId", ["a", "b", "c"]),
+        ("$.data[?(@.alertType == 1 && @.level >= 2)].deviceId", ["a"]),
+        ("$.data[?(@.level < 2 || @.value == 10)].deviceId", ["a", "b", "c"]),
+        ("$.data[?(@.deviceId =~ /^[ab]$/)].value", [10, 20]),
+        ("$.missing", []),
+    ])
+    def test_find(self, expression, values):
+        assert JsonPath.get(expression).find(BODY) == values
+
+    def test_first_and_many_documents(self):
+        assert JsonPath.get("$.missing").first(BODY, "default") == "default"
+        assert JsonPath.get("$.data[*].value").find_all([BODY, {"data": []}]) == [[10, 20, 30], []]
+        assert JsonPath.get("$.data[0].value").first_all([BODY, {}], 0) == [10, 0]
+
+    def test_response(self, local_api):
+        response = ApiRequest.get(local_api.url).add_path("device").send()
+        assert JsonPath.get("$.path").first(response) == "/device"
+
+    def test_get_value_by_path(self):
+        assert JsonUtils.get_value_by_path(BODY, "root['data'][0]['deviceId']") == ["a"]
+        assert JsonUtils.get_value_by_path(BODY, "$.missing") is False
+
+    def test_cache(self, monkeypatch):
+        monkeypatch.setattr(JsonPath, "CACHE_SIZE", 2)
+        monkeypatch.setattr(JsonPath, "_cache", type(JsonPath._cache)())
+        path = JsonPath.get("$.a")
+        assert JsonPath.get("$.a") is path and JsonPath.get(path) is path
+        JsonPath.get("$.b")
+        JsonPath.get("$.c")
+        assert list(JsonPath._cache) == ["$.b", "$.c"]
+
+    @pytest.mark.parametrize("expression, message", [
+        ("$.a[", r"Invalid JSONPath: \$\.a\[, at: \["),
+        ("$..", r"Invalid JSONPath: \$\.\., \.\. should be followed by a key"),
+    ])
+    def test_invalid(self, expression, message):
+        with pytest.raises(ValueError, match=message):
+            JsonPath(expression)
@@ -0,0 +1,33 @@
+import json
+import pytest
+import allure
+from libs.utils.json_stream import JsonStream
+
+
+BODY = json.dumps({"result": {"code": 200}, "data": [{"timestamp": index} for index in range(3)]}).encode("utf-8")
+
+
+def chunks(body, size=7):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+@allure.story('Json stream')
+class TestJsonStream:
+    """The path-targeted checks of a json streamed in chunks"""
+
+    def test_count_with_assert_count(self):
+        stream = JsonStream().count("$.data[*]").assert_count("$.data[*]", 3)
+        stream.run(chunks(BODY))
+        assert stream.counts["$.data[*]"] == 3
+
+    def test_assert_count_alone(self):
+        stream = JsonStream().assert_count("$.data[*]", 3).assert_count("$.data[*]", 3)
+        stream.run(BODY)
+        assert stream.counts["$.data[*]"] == 3
+
+    def test_errors(self):
+        stream = JsonStream().assert_equal("$.result.code", 201).assert_count("$.data[*]", 2) \
+            .assert_increasing("$.data[*].timestamp")
+        with pytest.raises(AssertionError) as error:
+            stream.run(chunks(BODY))
+        assert len(error.value.args[0]) == 2
@@ -0,0 +1,59 @@
+import threading
+import time
+import pytest
+import allure
+from libs.common.request import ApiRequest
+from libs.utils.load_runner import LoadRunner
+
+
+@allure.story('Load runner')
+class TestLoadRunner:
+    """The scenarios are started on an open-model schedule and reported per endpoint"""
+
+    def test_arrival_time(self):
+        assert LoadRunner(None, rate=10, duration=5).arrival_time(5) == pytest.approx(0.5)
+        runner = LoadRunner(None, rate=10, duration=5, ramp_up=2)
+        # 10 arrivals in the 2 seconds of the ramp up, then 10 per second
+        assert runner.arrival_time(2.5) == pytest.approx(1)
+        assert runner.arrival_time(10) == pytest.approx(2)
+        assert runner.arrival_time(20) == pytest.approx(3)
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError, match="The rate and the duration should be positive"):
+            LoadRunner(None, rate=0, duration=1)
+
+    def test_report_per_endpoint(self, local_api):
+        def scenario():
+            ApiRequest.get(local_api.url).add_path("device/123").send().assert_status(200)
+            ApiRequest.get(local_api.url).add_path("fail").send().assert_status(200)
+        report = LoadRunner(scenario, rate=20, duration=0.5).run().to_dict()
+        assert report["scheduled"] == 9 and report["completed"] == 9
+        assert report["errors"] == 9 and report["error_rate"] == 1.0
+        assert report["endpoints"]["GET device/{id}"]["requests"] == 9
+        assert report["endpoints"]["GET device/{id}"]["errors"] == 0
+        assert report["endpoints"]["GET fail"]["errors"] == 9
+
+    def test_other_requests_not_counted(self, local_api):
+        def scenario():
+            ApiRequest.get(local_api.url).add_path("device").send()
+
+        def other():
+            while not done.is_set():
+                ApiRequest.get(local_api.url).add_path("other").send()
+        # the requests of another thread are sent while the run is going on
+        done = threading.Event()
+        thread = threading.Thread(target=other)
+        thread.start()
+        try:
+            report = LoadRunner(scenario, rate=10, duration=0.3).run().to_dict()
+        finally:
+            done.set()
+            thread.join()
+        assert list(report["endpoints"]) == ["GET device"]
+
+    def test_queueing_in_latency(self):
+        # one worker and 200ms scenarios every 100ms, the late starts are counted in the latency
+        report = LoadRunner(lambda: time.sleep(0.2), rate=10, duration=0.5, max_workers=1).run().to_dict()
+        assert report["scheduled"] == 4
+        assert report["latency"]["min"] >= 190
+        assert report["latency"]["max"] >= 450
@@ -0,0 +1,62 @@
+import json
+import os
+import allure
+from libs.common.metrics import HttpMetrics, LatencyHistogram, RequestTiming
+from libs.common.request import ApiRequest
+from libs.utils.misc import Misc
+
+
+def timing(total):
+    result = RequestTiming()
+    result.total = total
+    return result
+
+
+@allure.story('HTTP timing metrics')
+class TestHttpMetrics:
+    """The latency histograms of the endpoints, and their summary of the session"""
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        summary = histogram.summary()
+        assert summary["count"] == 1000 and summary["min"] == 1 and summary["max"] == 1000
+        assert abs(summary["p50"] - 500) <= 15 and abs(summary["p99"] - 990) <= 30
+
+    def test_merge_the_exported_buckets(self):
+        first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for value in range(1, 500):
+            first.record(value * 0.7)
+            second.record(value * 3.1)
+            both.record(value * 0.7)
+            both.record(value * 3.1)
+        merged = LatencyHistogram.from_dict(json.loads(json.dumps(first.to_dict())))
+        merged.merge(LatencyHistogram.from_dict(json.loads(json.dumps(second.to_dict()))))
+        assert merged.summary() == both.summary()
+
+    def test_endpoint_template(self):
+        assert HttpMetrics.endpoint("get", "http://host/api/device/123/data?x=1") == "GET api/device/{id}/data"
+
+    def test_request_is_recorded(self, local_api, monkeypatch):
+        monkeypatch.setattr(HttpMetrics, "_histograms", {})
+        ApiRequest.get(local_api.url).add_path("device").add_path("42").send()
+        summary = HttpMetrics.summary()["GET device/{id}"]
+        assert summary["total"]["count"] == 1 and summary["ttfb"]["max"] <= summary["total"]["max"]
+
+    def test_controller_merges_the_workers(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Misc, "get_root_directory", staticmethod(lambda: str(tmp_path)))
+        for worker, values in (("gw0", range(1, 100)), ("gw1", range(100, 200))):
+            monkeypatch.setenv("PYTEST_XDIST_WORKER", worker)
+            monkeypatch.setattr(HttpMetrics, "_histograms", {})
+            for value in values:
+                HttpMetrics.record("GET", "http://host/data", timing(value))
+            HttpMetrics.export()
+        assert len(HttpMetrics.worker_parts()) == 2
+        monkeypatch.delenv("PYTEST_XDIST_WORKER")
+        monkeypatch.setattr(HttpMetrics, "_histograms", {})
+        HttpMetrics.merge_workers()
+        assert HttpMetrics.worker_parts() == []
+        with open(os.path.join(str(tmp_path), "results", "metrics", "http_timing.json")) as f:
+            total = json.load(f)["GET data"]["total"]
+        assert total["count"] == 199 and total["min"] == 1 and total["max"] == 199
@@ -0,0 +1,67 @@
+import threading
+import time
+import pytest
+import allure
+from libs.utils.mqtt_broker import LocalBroker
+
+pytest.importorskip("paho.mqtt.client")
+from libs.utils.mqtt_utils import MQTTUtils  # noqa: E402
+
+
+@pytest.fixture
+def broker():
+    with LocalBroker() as broker:
+        yield broker
+
+
+@allure.story('MQTT subscription')
+class TestMqtt:
+    """The device messages pushed by the local broker"""
+
+    def test_message_after_subscribe_is_received(self, broker):
+        # subscribe returns after the SUBACK, so a message published right after it is not lost
+        for index in range(10):
+            with MQTTUtils(port=broker.port) as mqtt:
+                mqtt.subscribe_device("D1")
+                broker.publish("pxp/iot/device/D1/1", {"index": index})
+                assert mqtt.wait_for(timeout=2).json() == {"index": index}
+
+    def test_wait_for_matching_messages(self, broker):
+        with MQTTUtils(port=broker.port) as mqtt:
+            mqtt.subscribe_device("D1", 3)
+            broker.publish("pxp/iot/device/D1/3", {"code": 304})
+            broker.publish("pxp/iot/device/D1/1", {"code": 500})
+            broker.publish("pxp/iot/device/D2/3", {"code": 500})
+
+            def later():
+                time.sleep(0.2)
+                broker.publish("pxp/iot/device/D1/3", {"code": 200})
+            threading.Thread(target=later).start()
+            message = mqtt.wait_for(lambda m: m.json()["code"] == 200, timeout=5)
+            assert message.topic == "pxp/iot/device/D1/3"
+            assert [m.json() for m in mqtt.drain()] == [{"code": 304}]
+
+    def test_retained_message_and_timeout(self, broker):
+        broker.publish("pxp/iot/device/D9/2", {"retained": 1}, retain=True)
+        with MQTTUtils(port=broker.port) as mqtt:
+            mqtt.subscribe_device("D9")
+            assert mqtt.wait_for(timeout=2).retain
+            with pytest.raises(TimeoutError):
+                mqtt.wait_for(timeout=0.2)
+
+    def test_bounded_queue_drops_the_oldest(self, broker):
+        with MQTTUtils(port=broker.port, queue_size=3) as mqtt:
+            mqtt.subscribe("pxp/#")
+            for index in range(5):
+                broker.publish("pxp/iot/device/D1/1", str(index))
+            deadline = time.monotonic() + 2
+            while mqtt.dropped < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert mqtt.dropped == 2
+            assert [m.text for m in mqtt.drain()] == ["2", "3", "4"]
+
+    def test_topic_filters(self):
+        assert LocalBroker.matches("pxp/iot/device/+/1", "pxp/iot/device/D1/1")
+        assert LocalBroker.matches("pxp/#", "pxp/iot/device/D1/1")
+        assert not LocalBroker.matches("pxp/iot/device/+", "pxp/iot/device/D1/1")
+        assert not LocalBroker.matches("pxp/iot/device/D1/+", "pxp/iot/device/D2/1")
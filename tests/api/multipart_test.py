@@ -0,0 +1,54 @@
+import os
+import pytest
+import allure
+from libs.common.multipart import MultipartEncoder, UploadFile
+from libs.common.request import ApiRequest
+
+
+def open_paths():
+    folder = "/proc/self/fd"
+    paths = []
+    for fd in os.listdir(folder):
+        try:
+            paths.append(os.readlink(os.path.join(folder, fd)))
+        except OSError:
+            pass
+    return paths
+
+
+@allure.story('Multipart upload')
+class TestMultipartUpload:
+    """The files are streamed in the multipart body and closed after the sending"""
+
+    def test_encoder_reads_in_chunks(self, tmp_path):
+        path = tmp_path / "data.bin"
+        path.write_bytes(os.urandom(100000))
+        encoder = MultipartEncoder({"name": "value"}, [UploadFile("file", str(path))], boundary="b")
+        chunks = list(encoder)
+        body = b"".join(chunks)
+        assert len(body) == len(encoder) and max(len(chunk) for chunk in chunks) <= 64 * 1024
+        assert body.startswith(b'--b\r\nContent-Disposition: form-data; name="name"\r\n\r\nvalue\r\n')
+        assert path.read_bytes() in body and body.endswith(b"\r\n--b--\r\n")
+        encoder.rewind()
+        assert encoder.read() == body
+
+    def test_upload_with_form_fields(self, local_api, tmp_path):
+        path = tmp_path / "image.png"
+        path.write_bytes(b"\x89PNG" + b"x" * 5000)
+        response = ApiRequest.post(local_api.url).add_path("upload").add_file("image", str(path)) \
+            .set_body({"deviceId": "D1"}, auto_config=False).send()
+        body = response.body
+        assert body["contentType"].startswith("multipart/form-data; boundary=")
+        assert 'name="deviceId"\r\n\r\nD1\r\n' in body["body"]
+        assert 'name="image"; filename="image.png"\r\nContent-Type: image/png' in body["body"]
+        assert body["length"] > 5004
+        if os.path.isdir("/proc/self/fd"):
+            assert str(path) not in open_paths()
+
+    @pytest.mark.parametrize("body", ["deviceId=D1", b"raw", {"deviceId": "D1"}])
+    def test_body_which_is_not_form_fields(self, local_api, tmp_path, body):
+        path = tmp_path / "data.txt"
+        path.write_text("data")
+        request = ApiRequest.post(local_api.url).add_file("file", str(path)).set_body(body)
+        with pytest.raises(ValueError, match="form fields"):
+            request.send()
@@ -0,0 +1,72 @@
+import threading
+import time
+import allure
+from libs.utils.paginator import Paginator
+
+
+class FakePages:
+    """
+    the pages of "count" records, the fetches and the fetches in flight are counted
+    """
+
+    def __init__(self, count, page_size, total=True, delay=0.0):
+        self.count = count
+        self.page_size = page_size
+        self.total = total
+        self.delay = delay
+        self.fetched = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, page):
+        with self.lock:
+            self.fetched.append(page)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        start = (page - 1) * self.page_size
+        records = [{"value": value} for value in range(start, min(start + self.page_size, self.count))]
+        result = {"data": records, "total": self.count} if self.total else {"data": records}
+        return type("Response", (), {"body": {"code": 200, "result": result}})
+
+
+@allure.story('Paginator')
+class TestPaginator:
+    """The records of all the pages, the next pages are requested while one is consumed"""
+
+    def test_stop_at_the_total(self):
+        pages = FakePages(250, 100)
+        paginator = Paginator(pages, page_size=100, max_in_flight=3)
+        assert [record["value"] for record in paginator] == list(range(250))
+        assert sorted(pages.fetched) == [1, 2, 3] and paginator.pages == 3
+
+    def test_stop_at_a_short_page(self):
+        pages = FakePages(200, 100, total=False)
+        paginator = Paginator(pages, page_size=100, max_in_flight=0)
+        assert [len(records) for records in paginator.iter_pages()] == [100, 100, 0]
+        # without prefetch the pages are requested one by one
+        assert pages.fetched == [1, 2, 3] and pages.max_in_flight == 1
+
+    def test_prefetch_is_bounded(self):
+        pages = FakePages(1000, 50, delay=0.02)
+        consumed = 0
+        for _ in Paginator(pages, page_size=50, max_in_flight=3):
+            consumed += 1
+        assert consumed == 1000 and len(pages.fetched) == 20
+        assert 1 < pages.max_in_flight <= 3
+
+    def test_stop_early(self):
+        pages = FakePages(10000, 10)
+        records = Paginator(pages, page_size=10, max_in_flight=2).iter_pages()
+        next(records)
+        records.close()
+        assert len(pages.fetched) <= 3
+
+    def test_page_records(self):
+        assert Paginator.page_records({"code": 304}) == ([], None)
+        assert Paginator.page_records({"result": [1, 2]}) == ([1, 2], None)
+        assert Paginator.page_records({"result": {"rows": [1], "total": 5}}) == ([1], 5)
+        assert Paginator.page_records({"result": {"total": "5"}, "data": [1]}) == ([1], None)
@@ -0,0 +1,38 @@
+import allure
+from libs.common.request_template import RequestTemplate
+from libs.common.retry import RetryPolicy
+
+
+@allure.story('Request template')
+class TestRequestTemplate:
+    """The requests stamped out of a prepared endpoint"""
+
+    def test_stamped_request(self, local_api):
+        template = RequestTemplate.get(local_api.url + "/", "/pxp/device.json", headers={"App": "test", "X": None},
+                                       params={"size": 10, "page": None}, timeout=5)
+        response = template.send(headers={"idToken": "token"}, deviceId="D1", skipped=None)
+        response.assert_status(200)
+        assert response.body["path"] == "/pxp/device.json"
+        assert response.body["query"] == {"size": "10", "deviceId": "D1", "test": "automation"}
+        assert response.body["headers"]["App"] == "test" and response.body["headers"]["idToken"] == "token"
+        assert "X" not in response.body["headers"]
+
+    def test_bind_keeps_the_parent(self):
+        template = RequestTemplate.post("http://host", "api", headers={"App": "test"}, params={"a": 1})
+        bound = template.bind(headers={"idToken": "token"}, params={"b": 2})
+        assert template.headers == {"App": "test"} and template.params == {"a": 1}
+        assert bound.headers == {"App": "test", "idToken": "token"} and bound.params == {"a": 1, "b": 2}
+        request = bound.request(json_body={"x": 1}, c=3)
+        assert request.method == "post" and request.url == "http://host/api"
+        assert request.params == {"a": 1, "b": 2, "c": 3} and request.json_body == {"x": 1}
+        # the stamped requests don't share their headers and params
+        request.headers["idToken"] = "other"
+        assert bound.request().headers["idToken"] == "token"
+
+    def test_request_sent_again(self, local_api):
+        policy = RetryPolicy(max_attempts=1)
+        request = RequestTemplate.get(local_api.url, "poll/again", retry_policy=policy).request(id="1")
+        assert request.retry_policy is policy
+        first = request.send()
+        second = request.send()
+        assert first.url == second.url and first.body["path"] == second.body["path"] == "/poll/again"
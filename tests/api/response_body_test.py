@@ -0,0 +1,46 @@
+import pytest
+import allure
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from libs.common.request import ApiResponse
+from libs.utils.json_codec import JsonCodec
+
+
+def api_response(content, content_type="application/json", encoding="utf-8"):
+    response = Response()
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+    response.encoding = encoding
+    response._content = content
+    return ApiResponse(response)
+
+
+@allure.story('Response body')
+class TestResponseBody:
+    """The json body of a response is parsed once and shared by the callers"""
+
+    def test_parsed_once(self, monkeypatch):
+        calls = []
+        loads = JsonCodec.loads
+
+        def counting(text):
+            calls.append(text)
+            return loads(text)
+        monkeypatch.setattr(JsonCodec, "loads", counting)
+        response = api_response(b'{"code": 200, "result": {"total": 2}}')
+        assert response.body is response.json()
+        response.assert_body({"code": 200})
+        assert response.path_index() is response.path_index()
+        assert len(calls) == 1
+
+    def test_invalid_json_error_is_cached(self):
+        response = api_response(b"<html>error</html>", "text/html")
+        for _ in range(2):
+            with pytest.raises(ValueError, match=r"not a valid json \(status: 200, Content-Type: text/html\): "
+                                                 r"<html>error</html>"):
+                response.body
+        assert response.text == "<html>error</html>"
+
+    def test_other_charset(self):
+        response = api_response('{"name": "café"}'.encode("latin-1"), encoding="latin-1")
+        assert response.body == {"name": "café"}
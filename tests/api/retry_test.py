@@ -0,0 +1,25 @@
+import time
+import allure
+from libs.common.request import ApiRequest
+from libs.common.retry import RetryPolicy
+
+
+@allure.story('Retry policy')
+class TestRetryPolicy:
+    """The requests are retried only when the retry is turned on"""
+
+    def test_no_retry_by_default(self):
+        started = time.monotonic()
+        assert RetryPolicy.default().max_attempts == 1
+        assert not RetryPolicy.default().should_retry(1, "GET", started, status=503)
+        assert ApiRequest("http://localhost", "GET").retry_policy is None
+
+    def test_set_retry_uses_config(self):
+        started = time.monotonic()
+        policy = ApiRequest("http://localhost", "GET").set_retry().retry_policy
+        assert policy.max_attempts == RetryPolicy.configured().max_attempts > 1
+        assert policy.should_retry(1, "GET", started, status=503)
+        assert not policy.should_retry(1, "POST", started, status=503)
+        policy = ApiRequest("http://localhost", "GET").set_retry(statuses={500}).retry_policy
+        assert policy.should_retry(1, "GET", started, status=500)
+        assert not policy.should_retry(1, "GET", started, status=503)
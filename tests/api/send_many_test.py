@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import pytest
+import allure
+from libs.common.request import ApiRequest
+
+
+def slow_requests(local_api, count, seconds="0.1"):
+    return [ApiRequest.get(local_api.url).add_path("slow").add_param("t", seconds).add_param("i", str(index))
+            for index in range(count)]
+
+
+@allure.story('Parallel batches')
+class TestSendMany:
+    """A batch of requests is sent in parallel, the results are in the input order"""
+
+    def test_bounded_and_ordered(self, local_api):
+        local_api.max_in_flight = 0
+        started = time.monotonic()
+        responses = ApiRequest.send_many(slow_requests(local_api, 12), concurrency=4)
+        assert [response.body["query"]["i"] for response in responses] == [str(index) for index in range(12)]
+        assert local_api.max_in_flight == 4
+        # 3 rounds of 4 requests
+        assert time.monotonic() - started < 1.2
+
+    def test_errors_in_place(self, local_api):
+        requests = slow_requests(local_api, 2, "0.01")
+        requests.insert(1, ApiRequest.get("http://127.0.0.1:1"))
+        results = ApiRequest.send_many(requests, concurrency=3, fail_fast=False)
+        assert results[0].status == 200 and results[2].status == 200
+        assert isinstance(results[1], Exception)
+        with pytest.raises(Exception):
+            ApiRequest.send_many(slow_requests(local_api, 1, "0.01") + [ApiRequest.get("http://127.0.0.1:1")])
+
+    def test_deadline(self, local_api):
+        results = ApiRequest.send_many(slow_requests(local_api, 1, "0.01") + slow_requests(local_api, 1, "0.5"),
+                                       deadline=0.2, fail_fast=False)
+        assert results[0].status == 200 and isinstance(results[1], FutureTimeoutError)
+        with pytest.raises(FutureTimeoutError, match="1 of 1 requests are not finished in 0.2 seconds"):
+            ApiRequest.send_many(slow_requests(local_api, 1, "0.5"), deadline=0.2)
+        # the late requests are not waited for, let them finish before the server of the module stops
+        time.sleep(0.5)
+
+    def test_empty_batch(self):
+        assert ApiRequest.send_many([]) == []
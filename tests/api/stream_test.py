@@ -0,0 +1,40 @@
+import allure
+from libs.common.request import ApiRequest, ApiStreamResponse, HttpLog
+from libs.common.transport import HttpTransport
+
+
+def misses(local_api):
+    return HttpTransport.get_instance().stats().get(HttpTransport.host_key(local_api.url), {}).get("misses", 0)
+
+
+@allure.story('Stream mode')
+class TestStream:
+    """The body of a streamed response is read in chunks, not buffered"""
+
+    def test_iter_chunks(self, local_api):
+        response = ApiRequest.get(local_api.url).add_path("bytes").add_param("n", "1000").stream(chunk_size=256)
+        assert isinstance(response, ApiStreamResponse)
+        response.assert_status(200).assert_header("Content-Length", "1000")
+        assert [len(chunk) for chunk in response.iter_chunks()] == [256, 256, 256, 232]
+
+    def test_save_to(self, local_api, tmp_path):
+        path = tmp_path / "export.bin"
+        with ApiRequest.get(local_api.url).add_path("bytes").add_param("n", "100000").stream() as response:
+            response.assert_status(200).save_to(path)
+        assert path.read_bytes() == b"x" * 100000
+
+    def test_connection_back_to_pool(self, local_api):
+        ApiRequest.get(local_api.url).add_path("device").send()
+        before = misses(local_api)
+        for _ in range(3):
+            with ApiRequest.get(local_api.url).add_path("bytes").add_param("n", "10").stream() as response:
+                assert b"".join(response.iter_chunks()) == b"x" * 10
+        ApiRequest.get(local_api.url).add_path("device").send()
+        assert misses(local_api) == before
+
+    def test_body_on_demand(self, local_api, monkeypatch):
+        messages = []
+        monkeypatch.setattr(HttpLog, "log", classmethod(lambda cls, message: messages.append(message)))
+        response = ApiRequest.get(local_api.url).add_path("device").stream()
+        assert "<==   (streamed body, Content-Length: " + response.headers["Content-Length"] + ")" in messages
+        assert response.body["path"] == "/device"
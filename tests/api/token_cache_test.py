@@ -0,0 +1,52 @@
+import os
+import stat
+import threading
+import allure
+from libs.common.token_cache import TokenCache
+
+
+@allure.story('Token cache')
+class TestTokenCache:
+    """The cached tokens, and the tokens which the server rejects"""
+
+    def test_store_is_private(self, tmp_path):
+        path = str(tmp_path / "token_cache" / "tokens.json")
+        cache = TokenCache(path)
+        assert cache.get("host", "secret", lambda: "token-1") == "token-1"
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(path + ".lock").st_mode) == 0o600
+        assert "secret" not in open(path).read()
+
+    def test_refresh_rejected_token(self, tmp_path):
+        tokens = iter(["token-1", "token-2", "token-3"])
+        cache = TokenCache(str(tmp_path / "tokens.json"))
+        assert cache.get("host", "secret", lambda: next(tokens)) == "token-1"
+        assert cache.refresh("token-1") == "token-2"
+        # a stale token is rejected again, the current token is kept
+        assert cache.refresh("token-1") == "token-2"
+        assert cache.get("host", "secret", lambda: next(tokens)) == "token-2"
+        # another process reads the new token from the store
+        assert TokenCache(str(tmp_path / "tokens.json")).get("host", "secret", lambda: next(tokens)) == "token-2"
+        assert cache.refresh("unknown") is None
+
+    def test_concurrent_rejections_fetch_once(self):
+        fetched = []
+
+        def fetch():
+            fetched.append(1)
+            return "token-" + str(len(fetched))
+        cache = TokenCache()
+        cache.get("host", "secret", fetch)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def reject():
+            barrier.wait()
+            results.append(cache.refresh("token-1"))
+        threads = [threading.Thread(target=reject) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(fetched) == 2
+        assert results == ["token-2"] * 8
@@ -0,0 +1,43 @@
+import time
+import allure
+from libs.common.transport import HttpTransport
+
+
+@allure.story('HTTP transport')
+class TestHttpTransport:
+    """The kept-alive connections of a host are reused by the requests"""
+
+    def test_connections_are_reused(self, local_api):
+        transport = HttpTransport()
+        for _ in range(3):
+            assert transport.request("GET", local_api.url + "/device").status_code == 200
+        assert transport.stats() == {HttpTransport.host_key(local_api.url): {"hits": 2, "misses": 1}}
+        transport.close()
+        # the counters of the closed sessions are kept
+        assert transport.stats() == {HttpTransport.host_key(local_api.url): {"hits": 2, "misses": 1}}
+
+    def test_idle_session_is_rebuilt(self, local_api):
+        transport = HttpTransport(keep_alive=0.05)
+        transport.request("GET", local_api.url + "/device")
+        session = transport.session(local_api.url)
+        time.sleep(0.1)
+        assert transport.session(local_api.url) is not session
+        transport.close()
+
+    def test_no_cookies_between_requests(self, local_api):
+        transport = HttpTransport()
+        transport.request("GET", local_api.url + "/cookie")
+        headers = transport.request("GET", local_api.url + "/device").json()["headers"]
+        assert "Cookie" not in headers
+        transport.close()
+
+    def test_one_transport_per_process(self, monkeypatch):
+        transport = HttpTransport.get_instance()
+        assert HttpTransport.get_instance() is transport
+        # e.g. a forked xdist worker builds its own one, the sockets are not shared
+        monkeypatch.setattr(transport, "_pid", -1)
+        assert HttpTransport.get_instance() is not transport
+
+    def test_host_key(self):
+        assert HttpTransport.host_key("https://host/api?x=1") == "https://host:443"
+        assert HttpTransport.host_key("http://host:8080/api") == "http://host:8080"
@@ -0,0 +1,43 @@
+import pytest
+import allure
+from libs.utils.xml_compare import ExpectedXml
+
+
+ATOM = b"<?xml version='1.0'?><feed xmlns='http://www.w3.org/2005/Atom' xmlns:x='urn:x' version='2'>" \
+       b"<title>feed</title><entry x:id='1'><title>a</title></entry><entry x:id='2'><title>b</title></entry></feed>"
+
+
+def chunks(body, size=16):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+@allure.story('Xml compare')
+class TestXmlCompareNamespaces:
+    """The expected tags without a namespace match the local names of a namespaced body"""
+
+    @pytest.mark.parametrize("ignore_order", [False, True])
+    def test_non_namespaced_expected(self, ignore_order):
+        expected = "<feed version='2'><entry id='\\d'><title>[ab]</title></entry><entry id='2'/></feed>"
+        assert ExpectedXml(expected, ignore_order=ignore_order).validate(chunks(ATOM)) == []
+
+    def test_namespaced_expected(self):
+        expected = "<a:feed xmlns:a='http://www.w3.org/2005/Atom'><a:entry><a:title>a</a:title></a:entry></a:feed>"
+        assert ExpectedXml(expected).validate(ATOM) == []
+
+    def test_other_namespace_is_reported_with_the_full_tag(self):
+        errors = ExpectedXml("<feed xmlns='urn:other'/>").validate(ATOM)
+        assert errors == ["Element in the response body is not matching: /feed, expected: < {urn:other}feed > "
+                          "but actually: < {http://www.w3.org/2005/Atom}feed >"]
+
+    def test_missing_and_mismatching(self):
+        errors = ExpectedXml("<feed><entry><title>b</title></entry><entry/><entry/></feed>").validate(chunks(ATOM))
+        assert errors == [
+            "Element in the response body is not matching: /feed/entry[1]/title[1], expected: < b > "
+            "but actually: < a >",
+            "Element in the response body is missing: /feed/entry[3]",
+        ]
+
+    def test_selectors(self):
+        assert ExpectedXml({"entry[2]/title": "b", "entry/@id": "\\d", "/feed/@version": "2"}).validate(ATOM) == []
+        assert ExpectedXml({"entry/author": None}).validate(ATOM) == \
+            ["Element in the response body is missing: entry/author"]